@@ -142,3 +142,34 @@ AUTH_USER_MODEL = 'core.User'
 
 # CORS HEADERS
 CORS_ALLOW_ALL_ORIGINS = True
+
+# Leaderboard
+LEADERBOARD_SIZE = 100
+
+# Keywords
+KEYWORD_MATCHER_TTL = 300
+KEYWORD_SOURCE = 'core.ingestion.DatamuseSource'
+KEYWORD_SOURCE_OPTIONS = {}
+KEYWORD_INGESTION_ASYNC = True
+KEYWORD_INGESTION_WORKERS = 2
+
+# Question feed
+QUESTION_FEED_ASYNC = True
+QUESTION_FEED_WORKERS = 2
+
+# Mentor pairing
+MENTOR_POOLS_TTL = 300
+MENTOR_DEFAULT_RATING = 3
+MENTOR_PAIR_WEIGHTED = False
+MENTOR_MATCH_CAPACITY = 5
+MENTOR_MATCH_CANDIDATES = 20
+MENTOR_MATCHES_PER_STUDENT = 3
+
+# Appointments
+FREE_SLOTS_MAX_DAYS = 31
+APPOINTMENT_REMINDER_LEAD = 15 * 60
+REMINDER_LOOKAHEAD = 60 * 60
+REMINDER_CATCHUP = 24 * 60 * 60
+REMINDER_REFILL_INTERVAL = 60
+CALENDAR_FEED_PAST_DAYS = 90
+CALENDAR_FEED_REFRESH_MINUTES = 60
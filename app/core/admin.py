@@ -1,7 +1,7 @@
 from django.contrib import admin
 
 from . import models
-import requests
+from .ingestion import schedule_ingestion
 
 
 class DegreeAdmin(admin.ModelAdmin):
@@ -11,21 +11,12 @@ class DegreeAdmin(admin.ModelAdmin):
             request, obj, form, change
         )
         if not change:
-            response = requests.get(
-                f'http://api.datamuse.com/words?ml={obj.name.lower()}&topics=education,career&max=1000')
-
-            keywords = []
-            for word in response.json():
-                word_text = word['word']
-                keywords.append(models.Keyword(
-                    name=word_text,
-                    degree=obj
-                ))
-
-            models.Keyword.objects.bulk_create(keywords)
+            schedule_ingestion(obj)
+            self.message_user(request, f'Keywords for {obj.name} are being imported in the background')
 
 
 admin.site.register(models.Keyword)
+admin.site.register(models.DegreeKeyword)
 admin.site.register(models.Degree, DegreeAdmin)
 admin.site.register(models.University)
 admin.site.register(models.User)
@@ -39,3 +30,7 @@ admin.site.register(models.FeedbackForm)
 admin.site.register(models.PairSession)
 admin.site.register(models.Appointment)
 admin.site.register(models.Notification)
+admin.site.register(models.PointsEntry)
+admin.site.register(models.LeaderboardEntry)
+admin.site.register(models.QuestionFeedEntry)
+admin.site.register(models.SearchDocument)
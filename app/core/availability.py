@@ -0,0 +1,94 @@
+POSTGRES_SETUP = (
+    'CREATE EXTENSION IF NOT EXISTS btree_gist',
+    # Half-open ranges so back to back appointments do not overlap
+    '''
+    ALTER TABLE core_appointment ADD CONSTRAINT core_appointment_no_overlap
+    EXCLUDE USING gist (mentor_id WITH =, tstzrange(start_datetime, end_datetime, '[)') WITH &&)
+    ''',
+)
+
+POSTGRES_TEARDOWN = (
+    'ALTER TABLE core_appointment DROP CONSTRAINT IF EXISTS core_appointment_no_overlap',
+)
+
+# SQLite runs one writer at a time, so checking in a trigger is as atomic as
+# the exclusion constraint; the (mentor, start) index serves the lookup.
+# Migrations that rebuild core_appointment on SQLite drop the triggers, and
+# have to run these again.
+SQLITE_SETUP = (
+    '''
+    CREATE TRIGGER core_appointment_no_overlap_insert BEFORE INSERT ON core_appointment
+    WHEN EXISTS (
+        SELECT 1 FROM core_appointment
+        WHERE mentor_id = NEW.mentor_id
+        AND start_datetime < NEW.end_datetime AND end_datetime > NEW.start_datetime
+    ) BEGIN
+        SELECT RAISE(ABORT, 'core_appointment_no_overlap');
+    END
+    ''',
+    '''
+    CREATE TRIGGER core_appointment_no_overlap_update
+    BEFORE UPDATE OF mentor_id, start_datetime, end_datetime ON core_appointment
+    WHEN EXISTS (
+        SELECT 1 FROM core_appointment
+        WHERE mentor_id = NEW.mentor_id AND id != NEW.id
+        AND start_datetime < NEW.end_datetime AND end_datetime > NEW.start_datetime
+    ) BEGIN
+        SELECT RAISE(ABORT, 'core_appointment_no_overlap');
+    END
+    ''',
+)
+
+SQLITE_TEARDOWN = (
+    'DROP TRIGGER IF EXISTS core_appointment_no_overlap_insert',
+    'DROP TRIGGER IF EXISTS core_appointment_no_overlap_update',
+)
+
+
+def get_setup_statements(vendor):
+    """SQL rejecting overlapping appointments of a mentor on a backend"""
+    if vendor == 'postgresql':
+        return POSTGRES_SETUP
+    elif vendor == 'sqlite':
+        return SQLITE_SETUP
+    raise NotImplementedError(f'Appointment overlap checks are not supported on {vendor}')
+
+
+def get_teardown_statements(vendor):
+    """SQL dropping what get_setup_statements created"""
+    if vendor == 'postgresql':
+        return POSTGRES_TEARDOWN
+    elif vendor == 'sqlite':
+        return SQLITE_TEARDOWN
+    raise NotImplementedError(f'Appointment overlap checks are not supported on {vendor}')
+
+
+def merge(intervals):
+    """Return the union of (start, end) intervals as sorted disjoint intervals"""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def subtract(intervals, removed):
+    """Return the parts of sorted disjoint intervals not covered by any removed interval"""
+    removed = merge(removed)
+    result = []
+    index = 0
+    for start, end in intervals:
+        # Skip what ends before this interval, it cannot overlap later ones either
+        while index < len(removed) and removed[index][1] <= start:
+            index += 1
+        position = index
+        while position < len(removed) and removed[position][0] < end:
+            if removed[position][0] > start:
+                result.append((start, removed[position][0]))
+            start = max(start, removed[position][1])
+            position += 1
+        if start < end:
+            result.append((start, end))
+    return result
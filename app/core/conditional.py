@@ -0,0 +1,156 @@
+import hashlib
+import json
+
+from django.db.models import Count, IntegerField, Max, Q, Value
+from django.utils.decorators import method_decorator
+from django.utils.http import quote_etag
+from django.views.decorators.http import condition
+
+from .models import User, Mentor, Student, Degree, University, Question, Answer, \
+    Comment, Upvote, FeedbackForm
+
+
+def get_table_state(querysets):
+    """Return (latest updated_at, row count) of every queryset in one query"""
+    parts = [
+        queryset.order_by().
+        annotate(table=Value(index, output_field=IntegerField())).values('table').
+        annotate(modified=Max('updated_at'), count=Count('pk')).
+        values_list('table', 'modified', 'count')
+        for index, queryset in enumerate(querysets)
+    ]
+    rows = parts[0].union(*parts[1:], all=True) if len(parts) > 1 else parts[0]
+    state = dict.fromkeys(range(len(parts)), (None, 0))
+    for table, modified, count in rows:
+        state[table] = (modified, count)
+    return [state[index] for index in range(len(parts))]
+
+
+def get_page_rows(request):
+    """Return the (id, updated_at) rows of the page a list request renders and whether more follow
+
+    Returns None for lists without pagination. The page is read with the
+    view's own queryset and paginator, as value rows.
+    """
+    view = request.parser_context['view']
+    if view.pagination_class is None:
+        return None
+    paginator = view.pagination_class()
+    fields = {field.lstrip('-') for field in paginator.ordering} | {'id', 'updated_at'}
+    rows = paginator.paginate_queryset(
+        view.get_queryset().prefetch_related(None).values(*fields), request, view=view
+    )
+    return [(row['id'], row['updated_at']) for row in rows], paginator.has_next
+
+
+def get_representation(request):
+    """Return the normalized fields and expand tree a list request selects, or None for full payloads"""
+    view = request.parser_context['view']
+    if not hasattr(view, 'get_sparse_fieldset'):
+        return None
+    fields, expand = view.get_sparse_fieldset()
+    if fields is None and expand is None:
+        return None
+    # Fields render in the serializer's order, whatever order they were asked in
+    return json.dumps([sorted(set(fields)) if fields is not None else None, expand], sort_keys=True)
+
+
+def get_validators(querysets, user=None, page=None, representation=None):
+    """Return the ETag and Last-Modified of a payload built from querysets and a page of rows
+
+    Counts are part of the ETag so deletions change it too, and so are the
+    page rows, in order, and the representation the payload is rendered in;
+    the Last-Modified date only moves forward on writes.
+    """
+    state = get_table_state(querysets) if querysets else []
+
+    digest = hashlib.md5()
+    if user is not None:
+        digest.update(str(user.pk).encode('utf-8'))
+    if representation is not None:
+        digest.update(f'|{representation}'.encode('utf-8'))
+    for modified, count in state:
+        digest.update(f'|{modified.isoformat() if modified else ""}:{count}'.encode('utf-8'))
+
+    modified = [modified for modified, _ in state if modified is not None]
+    if page is not None:
+        rows, has_next = page
+        for row_id, row_modified in rows:
+            digest.update(f'|{row_id}@{row_modified.isoformat()}'.encode('utf-8'))
+        digest.update(f'|{has_next}'.encode('utf-8'))
+        modified += [row_modified for _, row_modified in rows]
+    return quote_etag(digest.hexdigest()), max(modified) if modified else None
+
+
+def conditional_list(get_querysets, per_user=False):
+    """Answer GET and HEAD with 304 while the rows behind a list are unchanged
+
+    For paginated lists only the rows of the requested page are read, and
+    get_querysets is called with the request and their ids to return the
+    querysets of what the page embeds; for other lists the ids are None.
+    Querysets are only aggregated, never serialized, and views with sparse
+    fieldsets get a validator per fields and expand. Set per_user when the
+    payload depends on the requesting user.
+    """
+    def get_request_validators(request):
+        if not hasattr(request, '_conditional_validators'):
+            page = get_page_rows(request)
+            ids = None if page is None else [row_id for row_id, _ in page[0]]
+            request._conditional_validators = get_validators(
+                get_querysets(request, ids), request.user if per_user else None, page,
+                get_representation(request)
+            )
+        return request._conditional_validators
+
+    def etag(request, *args, **kwargs):
+        return get_request_validators(request)[0]
+
+    def last_modified(request, *args, **kwargs):
+        return get_request_validators(request)[1]
+
+    return method_decorator(condition(etag_func=etag, last_modified_func=last_modified))
+
+
+def get_user_querysets(users=None):
+    """Querysets behind UserSerializer output, for all users or a queryset of them"""
+    if users is None:
+        return [User.objects.all(), Mentor.objects.all(), Student.objects.all(),
+                University.objects.all(), Degree.objects.all()]
+    return [
+        users,
+        Mentor.objects.filter(user__in=users),
+        Student.objects.filter(user__in=users),
+        University.objects.filter(mentors__user__in=users),
+        Degree.objects.all(),
+    ]
+
+
+def get_question_list_querysets(request, ids):
+    """Querysets behind a page of questions: their answers, comments, votes and authors"""
+    answers = Answer.objects.filter(question_id__in=ids)
+    comments = Comment.objects.filter(answer__question_id__in=ids)
+    users = User.objects.filter(
+        Q(pk__in=Question.objects.filter(pk__in=ids).values('user_id')) |
+        Q(pk__in=answers.values('user_id')) | Q(pk__in=comments.values('user_id'))
+    )
+    upvotes = Upvote.objects.filter(user=request.user).filter(
+        Q(question_id__in=ids) | Q(answer_id__in=answers.values('id'))
+    )
+    return [answers, comments, upvotes] + get_user_querysets(users)
+
+
+def get_notification_list_querysets(request, ids):
+    """Querysets behind a page of notifications: their feedback forms and the user"""
+    return [FeedbackForm.objects.filter(notifications__in=ids)] + \
+        get_user_querysets(User.objects.filter(pk=request.user.pk))
+
+
+def get_university_list_querysets(request, ids):
+    return [University.objects.all(), Degree.objects.all()]
+
+
+def get_calendar_querysets(appointments):
+    """Querysets behind a calendar feed of appointments, whose events name both users"""
+    return [appointments,
+            User.objects.filter(Q(mentor_id__in=appointments.values('mentor_id')) |
+                                Q(student_id__in=appointments.values('student_id')))]
@@ -0,0 +1,69 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections, transaction
+
+logger = logging.getLogger(__name__)
+
+QUESTION = 'question'
+MENTOR = 'mentor'
+
+_executor = None
+_pending = set()
+_lock = threading.Lock()
+
+
+def index(kind, object_id):
+    """Rescore the feed entries of one question or one mentor's user"""
+    from .models import User, Question, QuestionFeedEntry
+
+    if kind == QUESTION:
+        question = Question.objects.filter(pk=object_id).first()
+        if question is not None:
+            QuestionFeedEntry.objects.index_question(question)
+    else:
+        user = User.objects.filter(pk=object_id).select_related('mentor').first()
+        if user is not None:
+            QuestionFeedEntry.objects.index_mentor(user)
+
+
+def _run_index(kind, object_id):
+    # Drop the job from pending as it starts, so writes made while it runs
+    # queue another run
+    with _lock:
+        _pending.discard((kind, object_id))
+    try:
+        index(kind, object_id)
+    except Exception:
+        logger.exception('Question feed indexing failed for %s %s', kind, object_id)
+    finally:
+        connections.close_all()
+
+
+def _submit_index(kind, object_id):
+    global _executor
+    with _lock:
+        if (kind, object_id) in _pending:
+            return
+        _pending.add((kind, object_id))
+        if _executor is None:
+            _executor = ThreadPoolExecutor(settings.QUESTION_FEED_WORKERS,
+                                           thread_name_prefix='question-feed')
+    _executor.submit(_run_index, kind, object_id)
+
+
+def schedule_index(kind, object_ids):
+    """Rescore the feed of questions or mentors in the background once the transaction commits
+
+    The feed of a question or mentor is stale from the write until its job
+    runs, which is bounded by the QUESTION_FEED_WORKERS queue. Without
+    QUESTION_FEED_ASYNC the indexing runs inline.
+    """
+    object_ids = list(object_ids)
+    if not settings.QUESTION_FEED_ASYNC:
+        for object_id in object_ids:
+            index(kind, object_id)
+        return
+    transaction.on_commit(lambda: [_submit_index(kind, object_id) for object_id in object_ids])
@@ -0,0 +1,269 @@
+from collections import OrderedDict
+
+from django.db.models import Q
+
+from rest_framework import serializers
+
+from .models import User, University, Answer, Comment
+from .serializers import QuestionSerializer, UserSerializer, get_upvoted_ids, \
+    get_expansion, is_expanded
+
+_datetime = serializers.DateTimeField()
+
+QUESTION_FIELDS = ('id', 'title', 'text', 'created_at', 'user_id', 'upvotes_count')
+
+ANSWER_FIELDS = ('id', 'text', 'created_at', 'user_id', 'question_id',
+                 'question__title', 'question__user_id', 'upvotes_count')
+
+NOTIFICATION_FIELDS = (
+    'id', 'title', 'user_id', 'is_seen', 'created_at', 'feedback_form_id',
+    'feedback_form__student_satisfied_rating', 'feedback_form__mentor_satisfied_rating',
+    'feedback_form__has_student_reported', 'feedback_form__has_mentor_reported',
+    'feedback_form__student_comment', 'feedback_form__mentor_comment',
+)
+
+USER_FIELDS = (
+    'id', 'email', 'name', 'mentor_id', 'mentor__is_professional', 'mentor__points',
+    'mentor__university_id', 'mentor__university__name', 'mentor__university__location',
+    'student_id', 'student__degree1_id', 'student__degree1__name',
+    'student__degree2_id', 'student__degree2__name',
+    'student__degree3_id', 'student__degree3__name',
+)
+
+
+def _datetime_representation(value):
+    return None if value is None else _datetime.to_representation(value)
+
+
+def _degree(row, prefix):
+    if row[f'{prefix}_id'] is None:
+        return None
+    return OrderedDict([
+        ('id', str(row[f'{prefix}_id'])),
+        ('name', row[f'{prefix}__name']),
+    ])
+
+
+def load_users(user_ids, mentor=True, student=True):
+    """Return UserSerializer-shaped dicts by id, two queries for any number of users
+
+    The nested mentor and student are left out unless asked for, which saves
+    their joins and the university degrees query.
+    """
+    fields = [field for field in USER_FIELDS
+              if (mentor or not field.startswith('mentor__')) and
+              (student or not field.startswith('student__'))]
+    rows = list(User.objects.filter(id__in=set(user_ids)).values(*fields))
+
+    university_ids = {row['mentor__university_id'] for row in rows} - {None} if mentor else ()
+    degrees = {}
+    if university_ids:
+        through = University.degrees.through.objects.filter(university_id__in=university_ids). \
+            order_by('degree__name', 'degree_id'). \
+            values_list('university_id', 'degree_id', 'degree__name')
+        for university_id, degree_id, degree_name in through:
+            degrees.setdefault(university_id, []).append(
+                OrderedDict([('id', str(degree_id)), ('name', degree_name)])
+            )
+
+    users = {}
+    for row in rows:
+        user = OrderedDict([('id', str(row['id'])), ('email', row['email'])])
+
+        if mentor:
+            user['mentor'] = None
+            if row['mentor_id'] is not None:
+                university = None
+                if row['mentor__university_id'] is not None:
+                    university = OrderedDict([
+                        ('id', str(row['mentor__university_id'])),
+                        ('name', row['mentor__university__name']),
+                        ('location', row['mentor__university__location']),
+                        ('degrees', degrees.get(row['mentor__university_id'], [])),
+                    ])
+                user['mentor'] = OrderedDict([
+                    ('id', str(row['mentor_id'])),
+                    ('is_professional', row['mentor__is_professional']),
+                    ('points', row['mentor__points']),
+                    ('university', university),
+                ])
+
+        if student:
+            user['student'] = None
+            if row['student_id'] is not None:
+                user['student'] = OrderedDict([
+                    ('id', str(row['student_id'])),
+                    ('degree1', _degree(row, 'student__degree1')),
+                    ('degree2', _degree(row, 'student__degree2')),
+                    ('degree3', _degree(row, 'student__degree3')),
+                ])
+
+        user['is_mentor'] = row['mentor_id'] is not None
+        user['name'] = row['name']
+        users[row['id']] = user
+    return users
+
+
+def _user(user, expand):
+    """Leave out the relations of a loaded user that expand does not name"""
+    if expand is None:
+        return user
+    return OrderedDict([
+        (name, value) for name, value in user.items()
+        if name not in UserSerializer.expandable_fields or name in expand
+    ])
+
+
+def _load_comments(answer_ids):
+    comments = {}
+    rows = Comment.objects.filter(answer_id__in=answer_ids).order_by('created_at', 'id'). \
+        values('id', 'text', 'created_at', 'user_id', 'answer_id')
+    for row in rows:
+        comments.setdefault(row['answer_id'], []).append(row)
+    return comments
+
+
+def _answer(row, comments, users, upvoted_ids, expand=None):
+    answer = OrderedDict([
+        ('id', str(row['id'])),
+        ('text', row['text']),
+        ('created_at', _datetime_representation(row['created_at'])),
+        ('user', _user(users[row['user_id']], get_expansion(expand, 'user'))),
+        ('question', OrderedDict([
+            ('id', str(row['question_id'])),
+            ('title', row['question__title']),
+            ('user', _user(users[row['question__user_id']],
+                           get_expansion(get_expansion(expand, 'question'), 'user'))),
+        ])),
+    ])
+    if is_expanded(expand, 'comments'):
+        comment_expand = get_expansion(get_expansion(expand, 'comments'), 'user')
+        answer['comments'] = [
+            OrderedDict([
+                ('id', str(comment['id'])),
+                ('text', comment['text']),
+                ('created_at', _datetime_representation(comment['created_at'])),
+                ('user', _user(users[comment['user_id']], comment_expand)),
+            ])
+            for comment in comments.get(row['id'], [])
+        ]
+    answer['is_upvoted'] = row['id'] in upvoted_ids
+    answer['upvotes_count'] = row['upvotes_count']
+    return answer
+
+
+def _user_expansions(expand, paths):
+    """Return if any of the user expand trees at paths nests a mentor, a student"""
+    trees = []
+    for path in paths:
+        tree = expand
+        for name in path:
+            tree = get_expansion(tree, name)
+        trees.append(tree)
+    return any(is_expanded(tree, 'mentor') for tree in trees), \
+        any(is_expanded(tree, 'student') for tree in trees)
+
+
+def serialize_questions(rows, user, fields=None, expand=None):
+    """QuestionSerializer output for a page of QUESTION_FIELDS rows
+
+    fields and expand select the output as they do for QuestionSerializer,
+    and nothing that is left out is queried.
+    """
+    fields = QuestionSerializer.Meta.fields if fields is None else fields
+    question_ids = [row['id'] for row in rows]
+    with_user = 'user' in fields
+    with_answers = 'answers' in fields and is_expanded(expand, 'answers')
+    answer_expand = get_expansion(expand, 'answers')
+    with_comments = with_answers and is_expanded(answer_expand, 'comments')
+
+    answer_rows = list(
+        Answer.objects.filter(question_id__in=question_ids).
+        order_by('created_at', 'id').values(*ANSWER_FIELDS)
+    ) if with_answers and question_ids else []
+    comments = _load_comments([row['id'] for row in answer_rows]) if with_comments else {}
+
+    user_ids, user_paths = [], []
+    if with_user:
+        user_ids += [row['user_id'] for row in rows]
+        user_paths.append(('user',))
+    if with_answers:
+        user_ids += [row['user_id'] for row in answer_rows] + [row['user_id'] for row in rows]
+        user_paths += [('answers', 'user'), ('answers', 'question', 'user')]
+    if with_comments:
+        user_ids += [comment['user_id'] for answer_comments in comments.values() for comment in answer_comments]
+        user_paths.append(('answers', 'comments', 'user'))
+    mentor, student = _user_expansions(expand, user_paths)
+    users = load_users(user_ids, mentor, student) if user_ids else {}
+
+    upvote_query = None
+    if 'is_upvoted' in fields:
+        upvote_query = Q(question_id__in=question_ids)
+    if with_answers:
+        answers_query = Q(answer__question_id__in=question_ids)
+        upvote_query = answers_query if upvote_query is None else upvote_query | answers_query
+    upvoted_ids = get_upvoted_ids(user, upvote_query) if upvote_query is not None and question_ids else set()
+
+    answers = {}
+    for row in answer_rows:
+        answers.setdefault(row['question_id'], []).append(
+            _answer(row, comments, users, upvoted_ids, answer_expand)
+        )
+
+    questions = []
+    for row in rows:
+        question = OrderedDict([
+            ('id', str(row['id'])),
+            ('title', row['title']),
+            ('text', row['text']),
+            ('created_at', _datetime_representation(row['created_at'])),
+            ('user', _user(users[row['user_id']], get_expansion(expand, 'user')) if with_user else None),
+            ('answers', answers.get(row['id']) or None),
+            ('upvotes_count', row['upvotes_count']),
+            ('is_upvoted', row['id'] in upvoted_ids),
+        ])
+        questions.append(OrderedDict([
+            (name, value) for name, value in question.items()
+            if name in fields and (name != 'answers' or with_answers)
+        ]))
+    return questions
+
+
+def serialize_answers(rows, user):
+    """AnswerSerializer output for a page of ANSWER_FIELDS rows"""
+    answer_ids = [row['id'] for row in rows]
+
+    comments = _load_comments(answer_ids)
+    users = load_users(
+        [row['user_id'] for row in rows] +
+        [row['question__user_id'] for row in rows] +
+        [comment['user_id'] for answer_comments in comments.values() for comment in answer_comments]
+    )
+    upvoted_ids = get_upvoted_ids(user, Q(answer_id__in=answer_ids)) if answer_ids else set()
+
+    return [_answer(row, comments, users, upvoted_ids) for row in rows]
+
+
+def serialize_notifications(rows):
+    """NotificationSerializer output for a page of NOTIFICATION_FIELDS rows"""
+    users = load_users([row['user_id'] for row in rows])
+
+    return [
+        OrderedDict([
+            ('id', str(row['id'])),
+            ('title', row['title']),
+            ('feedback_form', OrderedDict([
+                ('id', str(row['feedback_form_id'])),
+                ('student_satisfied_rating', row['feedback_form__student_satisfied_rating']),
+                ('mentor_satisfied_rating', row['feedback_form__mentor_satisfied_rating']),
+                ('has_student_reported', row['feedback_form__has_student_reported']),
+                ('has_mentor_reported', row['feedback_form__has_mentor_reported']),
+                ('student_comment', row['feedback_form__student_comment']),
+                ('mentor_comment', row['feedback_form__mentor_comment']),
+            ])),
+            ('user', users[row['user_id']]),
+            ('is_seen', row['is_seen']),
+            ('created_at', _datetime_representation(row['created_at'])),
+        ])
+        for row in rows
+    ]
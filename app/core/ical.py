@@ -0,0 +1,79 @@
+import secrets
+from datetime import timezone as dt_timezone
+
+from django.conf import settings
+
+PRODUCT_ID = '-//ConnectU//Appointments//EN'
+# Fields read for each event, so rows stream without building model instances
+EVENT_FIELDS = ('id', 'start_datetime', 'end_datetime', 'created_at', 'updated_at', 'url',
+                'mentor__user__name', 'student__user__name')
+
+
+def generate_token():
+    return secrets.token_urlsafe(32)
+
+
+def escape(text):
+    """Escape a TEXT value as RFC 5545 section 3.3.11 asks"""
+    return text.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,'). \
+        replace('\r\n', '\\n').replace('\n', '\\n')
+
+
+def format_datetime(value):
+    return value.astimezone(dt_timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def fold(line):
+    """Return a content line split into lines of at most 75 octets, with CRLF"""
+    encoded = line.encode('utf-8')
+    parts = []
+    while len(encoded) > 75:
+        # Never split inside a multi-byte character
+        cut = 75
+        while encoded[cut] & 0xC0 == 0x80:
+            cut -= 1
+        parts.append(encoded[:cut])
+        # Continuation lines start with a space
+        encoded = b' ' + encoded[cut:]
+    parts.append(encoded)
+    return b'\r\n'.join(parts) + b'\r\n'
+
+
+def get_event(row, is_mentor):
+    """Return the VEVENT of an EVENT_FIELDS row, as seen by its mentor or student"""
+    appointment_id, start, end, created_at, updated_at, url, mentor_name, student_name = row
+    other = (student_name if is_mentor else mentor_name) or 'a deleted user'
+    lines = (
+        'BEGIN:VEVENT',
+        f'UID:{appointment_id}@connectu',
+        f'DTSTAMP:{format_datetime(updated_at)}',
+        f'CREATED:{format_datetime(created_at)}',
+        f'LAST-MODIFIED:{format_datetime(updated_at)}',
+        f'DTSTART:{format_datetime(start)}',
+        f'DTEND:{format_datetime(end)}',
+        f'SUMMARY:{escape(f"Appointment with {other}")}',
+        f'LOCATION:{escape(url)}',
+        'END:VEVENT',
+    )
+    return b''.join(fold(line) for line in lines)
+
+
+def stream_calendar(rows, name, is_mentor, chunk_size=100):
+    """Yield an iCalendar document in chunks of events from an iterator of EVENT_FIELDS rows"""
+    yield b''.join(fold(line) for line in (
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        f'PRODID:{PRODUCT_ID}',
+        'CALSCALE:GREGORIAN',
+        'METHOD:PUBLISH',
+        f'X-WR-CALNAME:{escape(name)}',
+        f'REFRESH-INTERVAL;VALUE=DURATION:PT{settings.CALENDAR_FEED_REFRESH_MINUTES}M',
+    ))
+    chunk = []
+    for row in rows:
+        chunk.append(get_event(row, is_mentor))
+        if len(chunk) == chunk_size:
+            yield b''.join(chunk)
+            chunk = []
+    chunk.append(fold('END:VCALENDAR'))
+    yield b''.join(chunk)
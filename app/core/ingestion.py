@@ -0,0 +1,179 @@
+import csv
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils.module_loading import import_string
+
+from . import feed
+from .keywords import invalidate_matcher, normalize
+
+logger = logging.getLogger(__name__)
+
+
+class KeywordSource:
+    """Where the keyword terms of a degree come from"""
+
+    def fetch(self, degree_name):
+        """Return the raw terms for degree_name, or (term, weight) pairs"""
+        raise NotImplementedError
+
+
+class DatamuseSource(KeywordSource):
+    """Terms related to the degree name from the Datamuse API"""
+
+    url = 'https://api.datamuse.com/words'
+
+    def __init__(self, max_results=1000, timeout=10):
+        self.max_results = max_results
+        self.timeout = timeout
+
+    def fetch(self, degree_name):
+        response = requests.get(self.url, params={
+            'ml': degree_name.lower(), 'topics': 'education,career', 'max': self.max_results
+        }, timeout=self.timeout)
+        response.raise_for_status()
+        words = response.json()
+        # Datamuse scores are only comparable within one response
+        top_score = max([word.get('score', 0) for word in words] + [1])
+        return [(word['word'], word.get('score', top_score) / top_score) for word in words]
+
+
+class FileSource(KeywordSource):
+    """Terms of many degrees from a local file
+
+    JSON files map degree names to lists of terms or to objects of term
+    weights, CSV files have a degree, a keyword and an optional weight column.
+    Degree names match case-insensitively.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._terms = None
+
+    def load(self):
+        """Return the terms of the file by normalized degree name"""
+        if self._terms is None:
+            terms = {}
+            with open(self.path, newline='', encoding='utf-8') as file:
+                if os.path.splitext(self.path)[1].lower() == '.csv':
+                    for row in csv.DictReader(file):
+                        terms.setdefault(normalize(row['degree']), []).append(
+                            (row['keyword'], float(row.get('weight') or 1))
+                        )
+                else:
+                    for degree_name, degree_terms in json.load(file).items():
+                        if isinstance(degree_terms, dict):
+                            degree_terms = [(term, float(weight)) for term, weight in degree_terms.items()]
+                        terms.setdefault(normalize(degree_name), []).extend(degree_terms)
+            self._terms = terms
+        return self._terms
+
+    def fetch(self, degree_name):
+        return self.load().get(normalize(degree_name), [])
+
+
+def get_keyword_source():
+    """Return the configured KEYWORD_SOURCE"""
+    return import_string(settings.KEYWORD_SOURCE)(**settings.KEYWORD_SOURCE_OPTIONS)
+
+
+def ingest_keywords(terms_by_degree, batch_size=500):
+    """Normalize, deduplicate and upsert terms for degrees, returning how many links were new or reweighted
+
+    terms_by_degree maps degree ids to raw terms or (term, weight) pairs.
+    Terms join the shared vocabulary once whatever the number of degrees, and
+    existing links take the new weight, so ingesting the same terms twice
+    changes nothing.
+    """
+    from .models import User, Keyword, DegreeKeyword
+
+    weights_by_degree = {}
+    for degree_id, terms in terms_by_degree.items():
+        weights = weights_by_degree.setdefault(degree_id, {})
+        for term in terms:
+            term, weight = (term, 1.0) if isinstance(term, str) else term
+            # Truncating can leave a trailing space the lookup would normalize away
+            name = normalize(term)[:255].rstrip()
+            if name:
+                weights[name] = max(weight, weights.get(name, 0))
+
+    names = sorted({name for weights in weights_by_degree.values() for name in weights})
+    keyword_ids = {}
+    for start in range(0, len(names), batch_size):
+        batch = names[start:start + batch_size]
+        with transaction.atomic():
+            Keyword.objects.bulk_create([Keyword(name=name) for name in batch], ignore_conflicts=True)
+        keyword_ids.update(Keyword.objects.lookup(batch).values_list('name', 'id'))
+
+    links = [
+        DegreeKeyword(degree_id=degree_id, keyword_id=keyword_ids[name], weight=weight)
+        for degree_id, weights in weights_by_degree.items() for name, weight in weights.items()
+    ]
+    changed = 0
+    for start in range(0, len(links), batch_size):
+        with transaction.atomic():
+            changed += DegreeKeyword.objects.upsert(links[start:start + batch_size])
+
+    if changed:
+        invalidate_matcher()
+        # Mentors match the questions of their degree's keywords
+        feed.schedule_index(feed.MENTOR, User.objects.filter(mentor__degree_id__in=weights_by_degree).
+                            values_list('id', flat=True))
+    return changed
+
+
+def ingest_degree(degree_id, source=None):
+    """Fetch and store the keywords of one degree"""
+    from .models import Degree
+
+    degree = Degree.objects.filter(pk=degree_id).first()
+    if degree is None:
+        return 0
+    terms = (source or get_keyword_source()).fetch(degree.name)
+    return ingest_keywords({degree.pk: terms})
+
+
+_executor = None
+_pending = set()
+_lock = threading.Lock()
+
+
+def _run_ingestion(degree_id):
+    try:
+        created = ingest_degree(degree_id)
+        logger.info('Ingested %s keywords for degree %s', created, degree_id)
+    except Exception:
+        logger.exception('Keyword ingestion failed for degree %s', degree_id)
+    finally:
+        with _lock:
+            _pending.discard(degree_id)
+        connections.close_all()
+
+
+def _submit_ingestion(degree_id):
+    global _executor
+    with _lock:
+        if degree_id in _pending:
+            return
+        _pending.add(degree_id)
+        if _executor is None:
+            _executor = ThreadPoolExecutor(settings.KEYWORD_INGESTION_WORKERS,
+                                           thread_name_prefix='keyword-ingestion')
+    _executor.submit(_run_ingestion, degree_id)
+
+
+def schedule_ingestion(degree):
+    """Ingest the keywords of degree in the background once the transaction commits
+
+    A degree already waiting for ingestion is not queued twice. Without
+    KEYWORD_INGESTION_ASYNC the ingestion runs inline.
+    """
+    if not settings.KEYWORD_INGESTION_ASYNC:
+        return ingest_degree(degree.pk)
+    transaction.on_commit(lambda: _submit_ingestion(degree.pk))
@@ -0,0 +1,110 @@
+import re
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.core.cache import cache
+
+MATCHER_VERSION_KEY = 'core:keyword_matcher_version'
+
+# Symbols ending a word are kept, so 'C++', 'C#' and 'C' stay apart
+_NON_WORD = re.compile(r'(?:[^\w+#]|_|(?<![\w+#])[+#])+')
+
+
+def normalize(text):
+    """Lowercase text and collapse everything but letters, digits and trailing + or # to single spaces"""
+    return _NON_WORD.sub(' ', text.lower()).strip()
+
+
+class KeywordMatcher:
+    """Aho-Corasick automaton over normalized keyword names
+
+    Names only match on word boundaries, so 'art' does not match 'start'.
+    """
+
+    def __init__(self, keywords):
+        # Node 0 is the root; each node has its transitions, failure link
+        # and the keyword ids ending there
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+
+        for keyword_id, name in keywords:
+            name = normalize(name)
+            if name:
+                self.add(f' {name} ', keyword_id)
+        self.link()
+
+    def add(self, pattern, keyword_id):
+        node = 0
+        for char in pattern:
+            next_node = self.goto[node].get(char)
+            if next_node is None:
+                next_node = len(self.goto)
+                self.goto[node][char] = next_node
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append([])
+            node = next_node
+        self.output[node].append(keyword_id)
+
+    def link(self):
+        """Compute failure links breadth first and merge their outputs"""
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, next_node in self.goto[node].items():
+                queue.append(next_node)
+                fail = self.fail[node]
+                while fail and char not in self.goto[fail]:
+                    fail = self.fail[fail]
+                self.fail[next_node] = self.goto[fail].get(char, 0)
+                self.output[next_node] = self.output[next_node] + self.output[self.fail[next_node]]
+
+    def match(self, text):
+        """Return the ids of the keywords found in text"""
+        found = set()
+        node = 0
+        for char in f' {normalize(text)} ':
+            while node and char not in self.goto[node]:
+                node = self.fail[node]
+            node = self.goto[node].get(char, 0)
+            if self.output[node]:
+                found.update(self.output[node])
+        return found
+
+
+_lock = threading.Lock()
+_matcher = None
+_matcher_version = None
+_matcher_built_at = 0
+
+
+def invalidate_matcher():
+    """Make every worker rebuild its matcher and degree recommender on next use"""
+    cache.set(MATCHER_VERSION_KEY, time.time(), None)
+
+
+def get_matcher():
+    """Return this worker's matcher, building it on first use or after a change
+
+    Changes are announced through the cache, so workers only see each other's
+    invalidations with a shared cache backend; KEYWORD_MATCHER_TTL bounds how
+    stale a matcher can get otherwise.
+    """
+    global _matcher, _matcher_version, _matcher_built_at
+    from .models import Keyword
+
+    version = cache.get(MATCHER_VERSION_KEY)
+    is_expired = time.monotonic() - _matcher_built_at > settings.KEYWORD_MATCHER_TTL
+    if _matcher is not None and version == _matcher_version and not is_expired:
+        return _matcher
+
+    with _lock:
+        if _matcher is None or version != _matcher_version or \
+                time.monotonic() - _matcher_built_at > settings.KEYWORD_MATCHER_TTL:
+            _matcher = KeywordMatcher(Keyword.objects.values_list('id', 'name').iterator())
+            _matcher_version = version
+            _matcher_built_at = time.monotonic()
+        return _matcher
@@ -0,0 +1,89 @@
+import random
+import statistics
+import string
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from core.keywords import invalidate_matcher
+from core.models import Degree, Keyword, DegreeKeyword
+from core.recommender import get_recommender, recommend_degrees
+
+
+class Command(BaseCommand):
+    """Compare the former per-word keyword queries with recommend_degrees
+
+    Generates degrees and keywords in a transaction that is rolled back,
+    then times, for the same text, the icontains query per word that
+    AboutMeViewSet.update used to run and the TF-IDF recommender.
+    """
+
+    help = 'Benchmark degree recommendations against the former per-word keyword queries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--degrees', type=int, default=60)
+        parser.add_argument('--keywords', type=int, default=20000)
+        parser.add_argument('--words', type=int, default=80, help='Number of words in the answers')
+        parser.add_argument('--runs', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        generator = random.Random(options['seed'])
+        with transaction.atomic():
+            vocabulary = self.generate(generator, options['degrees'], options['keywords'])
+            # Real answers mix keyword words with common ones that match nothing
+            words = generator.sample(vocabulary, options['words'] // 2)
+            words += generator.choices(['the', 'and', 'i', 'like', 'to'], k=options['words'] - len(words))
+            text = ' '.join(words)
+
+            per_word = self.measure(lambda: self.recommend_per_word(text), options['runs'])
+            # Keep the model this generated data builds from being served after the rollback
+            invalidate_matcher()
+            start = time.perf_counter()
+            get_recommender()
+            build = time.perf_counter() - start
+            recommender = self.measure(lambda: recommend_degrees(text), options['runs'])
+            transaction.set_rollback(True)
+        invalidate_matcher()
+
+        self.stdout.write(f'{options["keywords"]} keywords over {options["degrees"]} degrees, '
+                          f'{options["words"]} words of answers')
+        self.stdout.write(f'Per-word queries: {per_word * 1000:.2f} ms')
+        self.stdout.write(f'Recommender: {build * 1000:.2f} ms to build, {recommender * 1000:.2f} ms to recommend, '
+                          f'{per_word / recommender:.0f}x')
+
+    def generate(self, generator, degree_count, keyword_count):
+        """Create degrees with keywords of one or two words, returning the words"""
+        vocabulary = list({
+            ''.join(generator.choices(string.ascii_lowercase, k=generator.randint(4, 10)))
+            for _ in range(keyword_count // 2)
+        })
+        degrees = Degree.objects.bulk_create([Degree(name=f'Benchmark {index}') for index in range(degree_count)])
+        names = {' '.join(generator.sample(vocabulary, generator.randint(1, 2))) for _ in range(keyword_count)}
+        keywords = Keyword.objects.bulk_create([Keyword(name=name) for name in sorted(names)])
+        DegreeKeyword.objects.bulk_create([
+            DegreeKeyword(degree=generator.choice(degrees), keyword=keyword, weight=generator.uniform(0.5, 2))
+            for keyword in keywords
+        ])
+        return vocabulary
+
+    def recommend_per_word(self, text):
+        """The degree counts AboutMeViewSet.update used to build, one query per word"""
+        result = {}
+        for word in text.split(' '):
+            keywords = Keyword.objects.filter(name__icontains=word). \
+                values('degrees').annotate(total=Count('id')).order_by('-total')[:3]
+            for keyword in keywords:
+                result[keyword['degrees']] = result.get(keyword['degrees'], 0) + keyword['total']
+        return Degree.objects.filter(id__in=list(result))[:3]
+
+    def measure(self, recommend, runs):
+        """Return the median seconds of recommend"""
+        timings = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            list(recommend())
+            timings.append(time.perf_counter() - start)
+        return statistics.median(timings)
@@ -0,0 +1,107 @@
+import statistics
+import time
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from core import flat, serializers
+from core.models import User, Student, Mentor, Degree, University, Question, Answer, Comment, Upvote, \
+    Notification, FeedbackForm
+
+
+class Command(BaseCommand):
+    """Compare the nested DRF serializers with the flat ones of core.flat
+
+    Generates questions with answers, comments, upvotes and notifications in
+    a transaction that is rolled back, then renders the same list pages both
+    ways, queries included, and prints the median rows per second.
+    """
+
+    help = 'Benchmark the nested and flat serializers of the question, answer and notification lists'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--questions', type=int, default=100)
+        parser.add_argument('--page-sizes', type=int, nargs='+', default=[20, 100])
+        parser.add_argument('--runs', type=int, default=15)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            viewer = self.generate(options['questions'])
+            for size in options['page_sizes']:
+                for name, (nested, flattened) in self.get_cases(viewer, size).items():
+                    nested_rate, nested_queries = self.measure(nested, size, options['runs'])
+                    flat_rate, flat_queries = self.measure(flattened, size, options['runs'])
+                    self.stdout.write(
+                        f'{name:12} page {size:4}: nested {nested_rate:9.0f} rows/s ({nested_queries} queries), '
+                        f'flat {flat_rate:9.0f} rows/s ({flat_queries} queries), {flat_rate / nested_rate:.1f}x'
+                    )
+            transaction.set_rollback(True)
+
+    def generate(self, count):
+        """Create count questions with three answers each, and the viewer's notifications"""
+        degree = Degree.objects.create(name='Benchmark')
+        university = University.objects.create(name='Benchmark', location='Benchmark')
+        university.degrees.add(degree)
+        viewer = User.objects.create_user(
+            'viewer@benchmark.connectu.ml', 'password', name='Viewer',
+            student=Student.objects.create(degree1=degree, degree2=degree, degree3=degree)
+        )
+        authors = [
+            User.objects.create_user(
+                f'author{index}@benchmark.connectu.ml', 'password', name=f'Author {index}',
+                mentor=Mentor.objects.create(degree=degree, university=university)
+            )
+            for index in range(50)
+        ]
+        for index in range(count):
+            question = Question.objects.create(title=f'Question {index}', text='Text',
+                                               user=authors[index % len(authors)])
+            for offset in range(3):
+                answer = Answer.objects.create(text='Answer', question=question,
+                                               user=authors[(index + offset) % len(authors)])
+                Comment.objects.create(text='Comment', user=viewer, answer=answer)
+                Upvote.objects.create(user=viewer, answer=answer, has_upvoted=offset % 2 == 0)
+            Notification.objects.create(user=viewer, title='Notification', feedback_form=FeedbackForm.objects.create())
+        return viewer
+
+    def get_cases(self, viewer, size):
+        """Map each list to its nested and flat rendering of one page"""
+        context = {'request': SimpleNamespace(user=viewer)}
+        questions = Question.objects.order_by('-created_at', '-id')
+        answers = Answer.objects.order_by('-created_at', '-id')
+        notifications = Notification.objects.filter(user=viewer).order_by('-created_at', '-id')
+        return {
+            'question': (
+                lambda: serializers.QuestionSerializer(
+                    list(serializers.QuestionSerializer.setup_eager_loading(questions)[:size]),
+                    many=True, context=context
+                ).data,
+                lambda: flat.serialize_questions(list(questions.values(*flat.QUESTION_FIELDS)[:size]), viewer),
+            ),
+            'answer': (
+                lambda: serializers.AnswerSerializer(
+                    list(serializers.AnswerSerializer.setup_eager_loading(answers)[:size]),
+                    many=True, context=context
+                ).data,
+                lambda: flat.serialize_answers(list(answers.values(*flat.ANSWER_FIELDS)[:size]), viewer),
+            ),
+            'notification': (
+                lambda: serializers.NotificationSerializer(
+                    list(serializers.NotificationSerializer.setup_eager_loading(notifications)[:size]),
+                    many=True
+                ).data,
+                lambda: flat.serialize_notifications(list(notifications.values(*flat.NOTIFICATION_FIELDS)[:size])),
+            ),
+        }
+
+    def measure(self, render, size, runs):
+        """Return the median rows per second of render and the queries of one run"""
+        timings = []
+        for _ in range(runs):
+            with CaptureQueriesContext(connection) as context:
+                start = time.perf_counter()
+                rows = len(render())
+                timings.append(time.perf_counter() - start)
+        return min(rows, size) / statistics.median(timings), len(context.captured_queries)
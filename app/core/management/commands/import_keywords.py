@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.ingestion import FileSource, ingest_keywords
+from core.keywords import normalize
+from core.models import Degree
+
+
+class Command(BaseCommand):
+    """Load keyword files for many degrees at once"""
+
+    help = 'Import keywords from JSON or CSV files keyed by degree name'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help='JSON or CSV keyword files')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--create-degrees', action='store_true',
+                            help='Create degrees named in the files that do not exist yet')
+
+    def handle(self, *args, **options):
+        terms = {}
+        for path in options['paths']:
+            try:
+                for degree_name, degree_terms in FileSource(path).load().items():
+                    terms.setdefault(degree_name, []).extend(degree_terms)
+            except (OSError, ValueError, KeyError) as error:
+                raise CommandError(f'Cannot read {path}: {error}')
+
+        degrees = {normalize(degree.name): degree for degree in Degree.objects.all()}
+        terms_by_degree = {}
+        for degree_name, degree_terms in terms.items():
+            degree = degrees.get(degree_name)
+            if degree is None and options['create_degrees']:
+                degree = Degree.objects.create(name=degree_name.title())
+            if degree is None:
+                self.stderr.write(f'Skipping unknown degree {degree_name}')
+                continue
+            terms_by_degree.setdefault(degree.pk, []).extend(degree_terms)
+
+        changed = ingest_keywords(terms_by_degree, batch_size=options['batch_size'])
+        self.stdout.write(f'Imported or reweighted {changed} keywords for {len(terms_by_degree)} degrees')
@@ -0,0 +1,55 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.matching import MatchingEngine
+from core.models import MentorMatch, Student
+
+
+class Command(BaseCommand):
+    """Match waiting students with mentors in capacity-aware batches
+
+    Meant to run on a schedule, from cron or with --every; students wait from
+    signing up or changing degrees until the next run, which tries each of
+    them once whether or not a mentor is found.
+    """
+
+    help = 'Precompute the mentor matches of students waiting for them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200)
+        parser.add_argument('--all', action='store_true',
+                            help='Rematch every student, not only the waiting ones')
+        parser.add_argument('--every', type=int, default=None,
+                            help='Keep running, matching again after this many seconds')
+
+    def match(self, batch_size, everyone):
+        students = Student.objects.filter(degree1__isnull=False, user__isnull=False) \
+            if everyone else MentorMatch.objects.get_waiting_students()
+        engine = MatchingEngine(students)
+
+        start = time.monotonic()
+        count = matched = 0
+        # Students changed while the batch runs are matched again next time
+        matched_at = timezone.now()
+        rows = list(students.order_by('pk').values_list('pk', 'degree1_id', 'degree2_id', 'degree3_id'))
+        for offset in range(0, len(rows), batch_size):
+            batch = [(student_id, degree_ids) for student_id, *degree_ids in rows[offset:offset + batch_size]]
+            matches = engine.match(batch)
+            MentorMatch.objects.replace([student_id for student_id, _ in batch], [
+                MentorMatch(student_id=student_id, mentor_id=mentor_id, rank=rank, score=score)
+                for student_id, mentor_id, rank, score in matches
+            ], matched_at)
+            count += len(batch)
+            matched += len({student_id for student_id, *_ in matches})
+
+        elapsed = time.monotonic() - start
+        self.stdout.write(f'Matched {matched} of {count} students in {elapsed:.1f}s '
+                          f'({count / max(elapsed, 1e-9):.0f} students/s)')
+
+    def handle(self, *args, **options):
+        self.match(options['batch_size'], options['all'])
+        while options['every'] is not None:
+            time.sleep(options['every'])
+            self.match(options['batch_size'], False)
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from core.models import LeaderboardEntry
+
+
+class Command(BaseCommand):
+    """Recompute every mentor leaderboard from Mentor.points"""
+
+    help = 'Rebuild the precomputed mentor leaderboards'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        boards = LeaderboardEntry.objects.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(f'Rebuilt {boards} leaderboards')
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from core.models import LeaderboardEntry, Mentor, PointsEntry
+
+
+class Command(BaseCommand):
+    """Recompute the mentor point totals from the points ledger, then the leaderboards"""
+
+    help = 'Rebuild Mentor.points from the points ledger and the leaderboards from Mentor.points'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        totals = PointsEntry.objects.filter(mentor=OuterRef('pk')). \
+            values('mentor').annotate(total=Sum('delta')).values('total')
+
+        ids = list(Mentor.objects.order_by('pk').values_list('pk', flat=True))
+        for start in range(0, len(ids), batch_size):
+            with transaction.atomic():
+                Mentor.objects.filter(pk__in=ids[start:start + batch_size]).update(
+                    points=Coalesce(Subquery(totals), Value(0)), updated_at=timezone.now()
+                )
+
+        self.stdout.write(f'Rebuilt points for {len(ids)} mentors')
+
+        # Totals moved behind update_mentor's back
+        boards = LeaderboardEntry.objects.rebuild(batch_size=batch_size)
+        self.stdout.write(f'Rebuilt {boards} leaderboards')
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from core.models import MentorStats
+
+
+class Command(BaseCommand):
+    """Recompute the stats of every mentor from their sessions and feedback"""
+
+    help = 'Rebuild MentorStats from pair sessions, appointments and feedback forms'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        count = MentorStats.objects.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(f'Rebuilt the stats of {count} mentors')
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from core.models import User, QuestionFeedEntry
+
+
+class Command(BaseCommand):
+    """Recompute the keyword question feed of every mentor"""
+
+    help = 'Rebuild the keyword-indexed question feed of mentors'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        mentors = User.objects.filter(mentor__isnull=False).select_related('mentor')
+        count = 0
+        for user in mentors.iterator():
+            QuestionFeedEntry.objects.index_mentor(user, batch_size=options['batch_size'])
+            count += 1
+        self.stdout.write(f'Rebuilt the question feed of {count} mentors')
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.models import Question, Answer, Comment, SearchDocument
+from core.search import strip_markers
+
+
+class Command(BaseCommand):
+    """Recreate the search documents of every question, answer and comment"""
+
+    help = 'Rebuild the full-text search documents'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        with transaction.atomic():
+            SearchDocument.objects.all().delete()
+
+            documents = [
+                SearchDocument(kind=SearchDocument.QUESTION, question=question,
+                               title=strip_markers(question.title), body=strip_markers(question.text),
+                               created_at=question.created_at)
+                for question in Question.objects.iterator()
+            ]
+            documents += [
+                SearchDocument(kind=SearchDocument.ANSWER, question_id=answer.question_id,
+                               answer=answer, body=strip_markers(answer.text), created_at=answer.created_at)
+                for answer in Answer.objects.iterator()
+            ]
+            documents += [
+                SearchDocument(kind=SearchDocument.COMMENT, question_id=comment.answer.question_id,
+                               answer_id=comment.answer_id, comment=comment,
+                               body=strip_markers(comment.text), created_at=comment.created_at)
+                for comment in Comment.objects.select_related('answer').iterator()
+            ]
+            SearchDocument.objects.bulk_create(documents, batch_size=batch_size)
+
+        self.stdout.write(f'Indexed {len(documents)} search documents')
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from core.models import Question, Answer, Upvote
+
+
+class Command(BaseCommand):
+    """Recompute the stored upvote counters from the upvote table"""
+
+    help = 'Rebuild Question.upvotes_count and Answer.upvotes_count from upvotes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        for model, target in ((Question, 'question'), (Answer, 'answer')):
+            counts = Upvote.objects.filter(
+                has_upvoted=True, **{target: OuterRef('pk')}
+            ).values(target).annotate(total=Count('id')).values('total')
+
+            ids = list(model.objects.order_by('pk').values_list('pk', flat=True))
+            for start in range(0, len(ids), batch_size):
+                with transaction.atomic():
+                    model.objects.filter(pk__in=ids[start:start + batch_size]).update(
+                        upvotes_count=Coalesce(Subquery(counts), Value(0)), updated_at=timezone.now()
+                    )
+
+            self.stdout.write(f'Rebuilt upvote counts for {len(ids)} {model._meta.verbose_name_plural}')
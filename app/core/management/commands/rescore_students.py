@@ -0,0 +1,106 @@
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from core.models import Degree, DegreeKeyword, Student
+from core.recommender import init_worker, score_students
+
+
+class Command(BaseCommand):
+    """Recompute the recommended degrees of students from their stored answers"""
+
+    help = 'Re-score the degrees of every student with about me answers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help='Scoring processes, 1 scores in this process')
+        parser.add_argument('--after', default=None,
+                            help='Resume after this student id, as printed by an interrupted run')
+
+    def get_batches(self, batch_size, after):
+        """Yield (student id, answers, degree ids) batches in id order"""
+        students = Student.objects.exclude(
+            about_me_answer_1='', about_me_answer_2='', about_me_answer_3=''
+        ).order_by('pk')
+        while True:
+            page = students if after is None else students.filter(pk__gt=after)
+            batch = [
+                (student_id, ' '.join(fields[:3]), fields[3:])
+                for student_id, *fields in page.values_list(
+                    'pk', 'about_me_answer_1', 'about_me_answer_2', 'about_me_answer_3',
+                    'degree1_id', 'degree2_id', 'degree3_id'
+                )[:batch_size]
+            ]
+            if not batch:
+                return
+            yield batch
+            after = batch[-1][0]
+
+    def get_results(self, batches, workers, initargs):
+        """Yield scored batches in order, keeping a few in flight per process"""
+        if workers <= 1:
+            init_worker(*initargs)
+            for batch in batches:
+                yield score_students(batch)
+            return
+
+        # Spawned workers share no database connection with this process
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(workers, mp_context=context, initializer=init_worker,
+                                 initargs=initargs) as executor:
+            pending = deque()
+            for batch in batches:
+                pending.append(executor.submit(score_students, batch))
+                if len(pending) >= 2 * workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+    def handle(self, *args, **options):
+        keywords = list(DegreeKeyword.objects.get_weighted_names())
+        degree_ids = list(Degree.objects.values_list('id', flat=True))
+        if len(degree_ids) < 3:
+            self.stderr.write('Not enough degrees to recommend')
+            return
+
+        batches = self.get_batches(options['batch_size'], options['after'])
+        start = time.monotonic()
+        count = changed = 0
+        for results in self.get_results(batches, options['workers'], (keywords, degree_ids)):
+            with transaction.atomic():
+                current = {
+                    student_id: tuple(degrees)
+                    for student_id, *degrees in Student.objects.filter(
+                        pk__in=[student_id for student_id, _ in results]
+                    ).values_list('pk', 'degree1_id', 'degree2_id', 'degree3_id')
+                }
+                # Only students whose degrees changed are touched, so the
+                # others stay out of the mentor match queue
+                now = timezone.now()
+                students = [
+                    Student(pk=student_id, degree1_id=degree1_id, degree2_id=degree2_id,
+                            degree3_id=degree3_id, updated_at=now)
+                    for student_id, (degree1_id, degree2_id, degree3_id) in results
+                    if current.get(student_id, (degree1_id, degree2_id, degree3_id)) !=
+                    (degree1_id, degree2_id, degree3_id)
+                ]
+                Student.objects.bulk_update(
+                    students, ['degree1', 'degree2', 'degree3', 'updated_at']
+                )
+
+            count += len(results)
+            changed += len(students)
+            rate = count / max(time.monotonic() - start, 1e-9)
+            self.stdout.write(f'Re-scored {count} students ({rate:.0f} students/s), '
+                              f'resume with --after {results[-1][0]}')
+
+        elapsed = time.monotonic() - start
+        self.stdout.write(f'Re-scored {count} students in {elapsed:.1f}s '
+                          f'({count / max(elapsed, 1e-9):.0f} students/s), {changed} changed')
@@ -0,0 +1,41 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.reminders import ReminderScheduler
+
+
+class Command(BaseCommand):
+    """Send appointment reminders and feedback prompts as they come due
+
+    Runs as a long-lived worker. Deadlines are kept in memory, so only the
+    appointments of the next REMINDER_LOOKAHEAD seconds are read, and a
+    restart resends nothing already sent.
+    """
+
+    help = 'Send appointment reminders before they start and feedback prompts after they end'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='Send what is due and exit, for running from cron')
+
+    def handle(self, *args, **options):
+        scheduler = ReminderScheduler()
+        refill_at = timezone.now()
+        while True:
+            now = timezone.now()
+            if now >= refill_at:
+                scheduler.refill(now)
+                refill_at = now + timedelta(seconds=settings.REMINDER_REFILL_INTERVAL)
+
+            count = scheduler.send_due(now)
+            if count:
+                self.stdout.write(f'Sent the notifications of {count} deadlines, {len(scheduler)} queued')
+            if options['once']:
+                break
+
+            wake_at = min(filter(None, (scheduler.next_due(), refill_at)))
+            time.sleep(max((wake_at - timezone.now()).total_seconds(), 0))
@@ -0,0 +1,207 @@
+import math
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .sampling import get_ratings
+
+# How much a mentor of the student's first, second and third degree is worth
+DEGREE_WEIGHTS = (1.0, 0.8, 0.6)
+# Bonus when the mentor's university offers one of the student's degrees
+UNIVERSITY_WEIGHT = 0.2
+RATING_WEIGHT = 0.3
+POINTS_WEIGHT = 0.2
+# Penalty per open appointment or session of the mentor
+LOAD_WEIGHT = 0.05
+
+# Cost of pairs that must not be matched; finite so potentials stay exact
+FORBIDDEN = 1e9
+
+
+def solve_assignment(cost):
+    """Return the column of every row in a minimum cost assignment
+
+    Shortest augmenting path form of the Hungarian algorithm, O(rows² ×
+    columns) with the inner loop over columns vectorized. cost must have at
+    least as many columns as rows.
+    """
+    rows, columns = cost.shape
+    # 1-based like the textbook algorithm, column 0 is where every search starts
+    u = np.zeros(rows + 1)
+    v = np.zeros(columns + 1)
+    row_of = np.zeros(columns + 1, dtype=int)
+    way = np.zeros(columns + 1, dtype=int)
+
+    for row in range(1, rows + 1):
+        row_of[0] = row
+        column = 0
+        min_slack = np.full(columns + 1, np.inf)
+        used = np.zeros(columns + 1, dtype=bool)
+        while True:
+            used[column] = True
+            current_row = row_of[column]
+            free = ~used[1:]
+
+            slack = cost[current_row - 1] - u[current_row] - v[1:]
+            better = free & (slack < min_slack[1:])
+            min_slack[1:][better] = slack[better]
+            way[1:][better] = column
+
+            candidates = np.where(free, min_slack[1:], np.inf)
+            next_column = int(np.argmin(candidates)) + 1
+            delta = candidates[next_column - 1]
+
+            u[row_of[used]] += delta
+            v[used] -= delta
+            min_slack[~used] -= delta
+
+            column = next_column
+            if row_of[column] == 0:
+                break
+
+        # Flip the augmenting path back to the start
+        while column:
+            previous = way[column]
+            row_of[column] = row_of[previous]
+            column = previous
+
+    assignment = np.full(rows, -1)
+    matched = np.nonzero(row_of[1:])[0]
+    assignment[row_of[matched + 1] - 1] = matched
+    return assignment
+
+
+class MatchingEngine:
+    """Assigns students to mentors in batches under per-mentor capacities
+
+    Mentors, the degrees their universities offer, ratings, points and open
+    appointments are loaded once; capacities then go down as batches are
+    matched. Students only match mentors of one of their degrees or from a
+    university offering one.
+    """
+
+    def __init__(self, students, capacity=None, candidates=None, per_student=None):
+        """students is the queryset about to be matched, so their current matches free up capacity"""
+        from .models import Appointment, Mentor, MentorMatch, PairSession, University
+
+        self.capacity_limit = settings.MENTOR_MATCH_CAPACITY if capacity is None else capacity
+        self.candidates = settings.MENTOR_MATCH_CANDIDATES if candidates is None else candidates
+        self.per_student = settings.MENTOR_MATCHES_PER_STUDENT if per_student is None else per_student
+
+        self.degree_index = {}
+        mentors = list(Mentor.objects.filter(user__isnull=False).order_by('id').
+                       values_list('id', 'degree_id', 'university_id', 'points'))
+        self.mentor_ids = [mentor_id for mentor_id, *_ in mentors]
+        mentor_index = {mentor_id: index for index, mentor_id in enumerate(self.mentor_ids)}
+        self.mentor_degrees = np.array([
+            -1 if degree_id is None else self.degree_index.setdefault(degree_id, len(self.degree_index))
+            for _, degree_id, _, _ in mentors
+        ], dtype=int)
+
+        university_degrees = {}
+        for university_id, degree_id in University.degrees.through.objects.values_list('university_id', 'degree_id'):
+            university_degrees.setdefault(university_id, []).append(
+                self.degree_index.setdefault(degree_id, len(self.degree_index))
+            )
+        self.offers = np.zeros((len(mentors), len(self.degree_index)), dtype=bool)
+        for index, (_, _, university_id, _) in enumerate(mentors):
+            self.offers[index, university_degrees.get(university_id, [])] = True
+
+        load = np.zeros(len(mentors))
+        open_sessions = (
+            Appointment.objects.filter(end_datetime__gte=timezone.now()),
+            PairSession.objects.filter(Q(feedback_session__isnull=True) | Q(
+                feedback_session__student_satisfied_rating__isnull=True,
+                feedback_session__mentor_satisfied_rating__isnull=True
+            )),
+        )
+        for queryset in open_sessions:
+            for mentor_id, count in queryset.order_by().values('mentor_id'). \
+                    annotate(count=Count('id')).values_list('mentor_id', 'count'):
+                if mentor_id in mentor_index:
+                    load[mentor_index[mentor_id]] += count
+
+        held = np.zeros(len(mentors))
+        for mentor_id, count in MentorMatch.objects.exclude(student__in=students.values('pk')). \
+                order_by().values('mentor_id').annotate(count=Count('id')).values_list('mentor_id', 'count'):
+            if mentor_id in mentor_index:
+                held[mentor_index[mentor_id]] += count
+        self.capacity = np.maximum(self.capacity_limit - load - held, 0).astype(int)
+
+        ratings = get_ratings()
+        rating = np.array([ratings.get(mentor_id, settings.MENTOR_DEFAULT_RATING) for mentor_id in self.mentor_ids])
+        points = np.log1p(np.maximum([points for *_, points in mentors], 0)) if mentors else np.zeros(0)
+        self.base_score = RATING_WEIGHT * rating / 5 + \
+            POINTS_WEIGHT * points / max(points.max(initial=0), math.log1p(1)) - LOAD_WEIGHT * load
+
+    def score(self, student_degrees):
+        """Return the score of every (student, mentor) pair, -inf where not allowed"""
+        degrees = np.array([
+            [-1 if degree_id is None else self.degree_index.get(degree_id, -1) for degree_id in row]
+            for row in student_degrees
+        ], dtype=int).reshape(len(student_degrees), 3)
+
+        degree_score = np.zeros((len(degrees), len(self.mentor_ids)))
+        offered = np.zeros((len(degrees), len(self.mentor_ids)), dtype=bool)
+        for preference, weight in enumerate(DEGREE_WEIGHTS):
+            column = degrees[:, preference, np.newaxis]
+            is_known = column >= 0
+            degree_score = np.maximum(degree_score, weight * ((self.mentor_degrees == column) & is_known))
+            if self.offers.shape[1]:
+                offered |= self.offers[:, np.maximum(degrees[:, preference], 0)].T & is_known
+
+        score = degree_score + UNIVERSITY_WEIGHT * offered + self.base_score
+        score[(degree_score == 0) & ~offered] = -np.inf
+        return score
+
+    def match(self, students):
+        """Return (student id, mentor id, rank, score) of the matches of (student id, degree ids) rows
+
+        Every round gives each student at most one more mentor by solving an
+        assignment between the students and one column per free place of
+        their best candidate mentors.
+        """
+        if not students or not self.mentor_ids:
+            return []
+
+        score = self.score([degree_ids for _, degree_ids in students])
+        is_allowed = np.isfinite(score)
+        count = min(self.candidates, score.shape[1])
+
+        matches = [[] for _ in students]
+        for _ in range(self.per_student):
+            # Candidates are the best mentors of each student with a place left
+            is_available = is_allowed & (self.capacity > 0)
+            top = np.argpartition(-np.where(is_available, score, -np.inf), count - 1, axis=1)[:, :count]
+            is_candidate = np.zeros(score.shape, dtype=bool)
+            np.put_along_axis(is_candidate, top, True, axis=1)
+            is_candidate &= is_available
+
+            rows = np.nonzero(is_candidate.any(axis=1))[0]
+            if not len(rows):
+                break
+            mentors = np.nonzero(is_candidate[rows].any(axis=0))[0]
+            # No mentor can take more students than want them this round
+            places = np.minimum(self.capacity[mentors], is_candidate[rows][:, mentors].sum(axis=0))
+            column_mentors = np.repeat(mentors, places)
+
+            cost = np.where(is_candidate[np.ix_(rows, column_mentors)],
+                            -score[np.ix_(rows, column_mentors)], FORBIDDEN)
+            if cost.shape[1] < cost.shape[0]:
+                cost = np.hstack([cost, np.full((len(rows), len(rows) - cost.shape[1]), FORBIDDEN)])
+
+            for position, column in enumerate(solve_assignment(cost)):
+                if column >= len(column_mentors) or cost[position, column] >= FORBIDDEN:
+                    continue
+                row, mentor = rows[position], column_mentors[column]
+                self.capacity[mentor] -= 1
+                is_allowed[row, mentor] = False
+                matches[row].append((score[row, mentor], mentor))
+
+        results = []
+        for (student_id, _), student_matches in zip(students, matches):
+            for rank, (pair_score, mentor) in enumerate(sorted(student_matches, key=lambda match: -match[0]), 1):
+                results.append((student_id, self.mentor_ids[mentor], rank, float(pair_score)))
+        return results
@@ -0,0 +1,54 @@
+# Generated by Django 3.1.14 on 2026-10-18 09:48
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def drop_filler_upvotes(apps, schema_editor):
+    """Remove the rows pre-created for every user and collapse duplicates"""
+    Upvote = apps.get_model('core', 'Upvote')
+    Upvote.objects.filter(has_upvoted=False).delete()
+
+    for target in ('question', 'answer'):
+        duplicates = Upvote.objects.filter(**{f'{target}__isnull': False}). \
+            values('user', target).annotate(total=models.Count('id')). \
+            filter(total__gt=1)
+        for duplicate in duplicates:
+            ids = list(Upvote.objects.filter(
+                user=duplicate['user'], **{target: duplicate[target]}
+            ).values_list('id', flat=True))
+            Upvote.objects.filter(id__in=ids[1:]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_notification_is_seen'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_filler_upvotes, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='user',
+            name='keywords',
+            field=models.ManyToManyField(blank=True, to='core.Keyword'),
+        ),
+        migrations.AlterField(
+            model_name='user',
+            name='mentor',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='core.mentor'),
+        ),
+        migrations.AlterField(
+            model_name='user',
+            name='student',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='core.student'),
+        ),
+        migrations.AddConstraint(
+            model_name='upvote',
+            constraint=models.UniqueConstraint(fields=('user', 'question'), name='unique_question_upvote'),
+        ),
+        migrations.AddConstraint(
+            model_name='upvote',
+            constraint=models.UniqueConstraint(fields=('user', 'answer'), name='unique_answer_upvote'),
+        ),
+    ]
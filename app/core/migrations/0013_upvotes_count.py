@@ -0,0 +1,37 @@
+# Generated by Django 3.1.14 on 2026-10-18 09:49
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def populate_upvotes_count(apps, schema_editor):
+    """Fill the new counters from the existing upvotes"""
+    Upvote = apps.get_model('core', 'Upvote')
+    for model_name, target in (('Question', 'question'), ('Answer', 'answer')):
+        counts = Upvote.objects.filter(
+            has_upvoted=True, **{target: models.OuterRef('pk')}
+        ).values(target).annotate(total=models.Count('id')).values('total')
+        apps.get_model('core', model_name).objects.update(
+            upvotes_count=Coalesce(models.Subquery(counts), models.Value(0))
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_sparse_upvotes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='answer',
+            name='upvotes_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='upvotes_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(populate_upvotes_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 3.1.14 on 2026-10-18 09:50
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+
+
+def open_points_ledger(apps, schema_editor):
+    """Carry the current totals into the ledger as opening balances"""
+    Mentor = apps.get_model('core', 'Mentor')
+    PointsEntry = apps.get_model('core', 'PointsEntry')
+    PointsEntry.objects.bulk_create([
+        PointsEntry(mentor_id=mentor_id, reason='opening_balance', delta=points)
+        for mentor_id, points in Mentor.objects.filter(points__gt=0).values_list('id', 'points')
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_upvotes_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PointsEntry',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('reason', models.CharField(choices=[('opening_balance', 'Opening balance'), ('upvote', 'Upvote'), ('feedback', 'Feedback')], max_length=31)),
+                ('delta', models.IntegerField()),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('answer', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='points_entries', to='core.answer')),
+                ('feedback_form', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='points_entries', to='core.feedbackform')),
+                ('mentor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='points_entries', to='core.mentor')),
+                ('question', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='points_entries', to='core.question')),
+            ],
+            options={
+                'default_related_name': 'points_entries',
+            },
+        ),
+        migrations.RunPython(open_points_ledger, migrations.RunPython.noop),
+    ]
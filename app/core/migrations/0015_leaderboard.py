@@ -0,0 +1,89 @@
+# Generated by Django 3.1.14 on 2026-10-18 09:51
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+def build_leaderboards(apps, schema_editor):
+    """Rank the existing mentors on every scope they belong to"""
+    Mentor = apps.get_model('core', 'Mentor')
+    LeaderboardEntry = apps.get_model('core', 'LeaderboardEntry')
+    size = settings.LEADERBOARD_SIZE
+
+    boards = {}
+    mentors = Mentor.objects.filter(points__gt=0).order_by('-points', 'id'). \
+        values_list('id', 'points', 'degree_id', 'university_id')
+    for mentor_id, points, degree_id, university_id in mentors.iterator():
+        scopes = {(None, None)}
+        if degree_id is not None:
+            scopes.add((degree_id, None))
+        if university_id is not None:
+            scopes.add((None, university_id))
+        if degree_id is not None and university_id is not None:
+            scopes.add((degree_id, university_id))
+
+        for scope in scopes:
+            board = boards.setdefault(scope, [])
+            if len(board) < size:
+                board.append(LeaderboardEntry(
+                    mentor_id=mentor_id, points=points,
+                    degree_id=scope[0], university_id=scope[1]
+                ))
+
+    LeaderboardEntry.objects.bulk_create(
+        [entry for board in boards.values() for entry in board], batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_points_entry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardEntry',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('points', models.PositiveIntegerField()),
+            ],
+            options={
+                'default_related_name': 'leaderboard_entries',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='mentor',
+            index=models.Index(fields=['points'], name='mentor_points_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mentor',
+            index=models.Index(fields=['degree', 'points'], name='mentor_degree_points_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mentor',
+            index=models.Index(fields=['university', 'points'], name='mentor_university_points_idx'),
+        ),
+        migrations.AddField(
+            model_name='leaderboardentry',
+            name='degree',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='leaderboard_entries', to='core.degree'),
+        ),
+        migrations.AddField(
+            model_name='leaderboardentry',
+            name='mentor',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leaderboard_entries', to='core.mentor'),
+        ),
+        migrations.AddField(
+            model_name='leaderboardentry',
+            name='university',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='leaderboard_entries', to='core.university'),
+        ),
+        migrations.AddIndex(
+            model_name='leaderboardentry',
+            index=models.Index(fields=['degree', 'university', '-points'], name='leaderboard_scope_idx'),
+        ),
+        migrations.RunPython(build_leaderboards, migrations.RunPython.noop),
+    ]
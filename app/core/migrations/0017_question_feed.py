@@ -0,0 +1,37 @@
+# Generated by Django 3.1.14 on 2026-10-18 09:56
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_created_at_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuestionFeedEntry',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('score', models.PositiveSmallIntegerField()),
+                ('created_at', models.DateTimeField()),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_entries', to='core.question')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'default_related_name': 'feed_entries',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='questionfeedentry',
+            index=models.Index(fields=['user', '-score', '-created_at', '-question'], name='question_feed_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='questionfeedentry',
+            constraint=models.UniqueConstraint(fields=('user', 'question'), name='unique_question_feed_entry'),
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 3.1.14 on 2026-10-18 09:58
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+from core.search import get_setup_statements, get_teardown_statements
+
+
+def create_search_index(apps, schema_editor):
+    """Create the full-text index and fill it with the existing posts"""
+    for statement in get_setup_statements(schema_editor.connection.vendor):
+        schema_editor.execute(statement)
+
+    SearchDocument = apps.get_model('core', 'SearchDocument')
+    Question = apps.get_model('core', 'Question')
+    Answer = apps.get_model('core', 'Answer')
+    Comment = apps.get_model('core', 'Comment')
+
+    documents = [
+        SearchDocument(kind='question', question_id=question_id, title=title,
+                       body=text, created_at=created_at)
+        for question_id, title, text, created_at in
+        Question.objects.values_list('id', 'title', 'text', 'created_at').iterator()
+    ]
+    documents += [
+        SearchDocument(kind='answer', question_id=question_id, answer_id=answer_id,
+                       body=text, created_at=created_at)
+        for answer_id, question_id, text, created_at in
+        Answer.objects.values_list('id', 'question_id', 'text', 'created_at').iterator()
+    ]
+    documents += [
+        SearchDocument(kind='comment', question_id=question_id, answer_id=answer_id,
+                       comment_id=comment_id, body=text, created_at=created_at)
+        for comment_id, answer_id, question_id, text, created_at in
+        Comment.objects.values_list('id', 'answer_id', 'answer__question_id',
+                                    'text', 'created_at').iterator()
+    ]
+    SearchDocument.objects.bulk_create(documents, batch_size=1000)
+
+
+def drop_search_index(apps, schema_editor):
+    for statement in get_teardown_statements(schema_editor.connection.vendor):
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_question_feed'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('kind', models.CharField(choices=[('question', 'Question'), ('answer', 'Answer'), ('comment', 'Comment')], max_length=15)),
+                ('title', models.CharField(blank=True, max_length=255)),
+                ('body', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField()),
+                ('answer', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='search_documents', to='core.answer')),
+                ('comment', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='search_documents', to='core.comment')),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_documents', to='core.question')),
+            ],
+            options={
+                'default_related_name': 'search_documents',
+            },
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 3.1.14 on 2026-10-18 10:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='student',
+            name='about_me_answer_1',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='student',
+            name='about_me_answer_2',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='student',
+            name='about_me_answer_3',
+            field=models.TextField(blank=True, default=''),
+        ),
+    ]
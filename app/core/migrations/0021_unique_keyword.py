@@ -0,0 +1,60 @@
+# Generated by Django 3.1.14 on 2026-10-18 10:18
+
+from django.db import migrations, models
+
+from core.keywords import normalize
+
+
+def normalize_keywords(apps, schema_editor):
+    """Normalize keyword names and merge the keywords of a degree that collide"""
+    Keyword = apps.get_model('core', 'Keyword')
+    Question = apps.get_model('core', 'Question')
+    User = apps.get_model('core', 'User')
+
+    kept, renamed, merged = {}, [], {}
+    for keyword in Keyword.objects.order_by('degree_id', 'name', 'id').iterator():
+        name = normalize(keyword.name)[:255]
+        key = (keyword.degree_id, name)
+        if not name:
+            merged[keyword.id] = None
+        elif key in kept:
+            merged[keyword.id] = kept[key]
+        else:
+            kept[key] = keyword.id
+            if name != keyword.name:
+                keyword.name = name
+                renamed.append(keyword)
+
+    # Move tags and interests over to the surviving keyword before deleting
+    for through in (Question.keywords.through, User.keywords.through):
+        owner = 'question_id' if through is Question.keywords.through else 'user_id'
+        rows = through.objects.filter(keyword_id__in=merged).values_list(owner, 'keyword_id')
+        through.objects.bulk_create([
+            through(**{owner: owner_id, 'keyword_id': merged[keyword_id]})
+            for owner_id, keyword_id in rows if merged[keyword_id] is not None
+        ], ignore_conflicts=True)
+
+    merged = list(merged)
+    for start in range(0, len(merged), 1000):
+        Keyword.objects.filter(id__in=merged[start:start + 1000]).delete()
+    Keyword.objects.bulk_update(renamed, ['name'], batch_size=1000)
+
+    # PostgreSQL refuses to alter core_keyword below while the deferred
+    # foreign key checks of these deletes are still pending
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0020_about_me_answers'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_keywords, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='keyword',
+            constraint=models.UniqueConstraint(fields=('degree', 'name'), name='unique_degree_keyword'),
+        ),
+    ]
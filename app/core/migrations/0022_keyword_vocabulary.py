@@ -0,0 +1,107 @@
+# Generated by Django 3.1.14 on 2026-10-18 10:21
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+def fold_keywords(apps, schema_editor):
+    """Keep one keyword per name and link it to every degree that had the name"""
+    Keyword = apps.get_model('core', 'Keyword')
+    DegreeKeyword = apps.get_model('core', 'DegreeKeyword')
+    Question = apps.get_model('core', 'Question')
+    User = apps.get_model('core', 'User')
+
+    survivors, merged, associations = {}, {}, []
+    for keyword_id, name, degree_id in Keyword.objects.order_by('name', 'id'). \
+            values_list('id', 'name', 'degree_id').iterator():
+        survivor = survivors.setdefault(name, keyword_id)
+        associations.append(DegreeKeyword(degree_id=degree_id, keyword_id=survivor))
+        if survivor != keyword_id:
+            merged[keyword_id] = survivor
+    DegreeKeyword.objects.bulk_create(associations, batch_size=1000, ignore_conflicts=True)
+
+    # Move tags and interests over to the surviving keyword before deleting
+    for through in (Question.keywords.through, User.keywords.through):
+        owner = 'question_id' if through is Question.keywords.through else 'user_id'
+        rows = through.objects.filter(keyword_id__in=merged).values_list(owner, 'keyword_id')
+        through.objects.bulk_create([
+            through(**{owner: owner_id, 'keyword_id': merged[keyword_id]})
+            for owner_id, keyword_id in rows
+        ], batch_size=1000, ignore_conflicts=True)
+
+    merged = list(merged)
+    for start in range(0, len(merged), 1000):
+        Keyword.objects.filter(id__in=merged[start:start + 1000]).delete()
+
+    # PostgreSQL refuses to alter core_keyword below while the deferred
+    # foreign key checks of these inserts and deletes are still pending
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
+
+def create_prefix_index(apps, schema_editor):
+    """Let PostgreSQL serve prefix lookups on names from an index whatever the collation"""
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE INDEX core_keyword_name_prefix_idx ON core_keyword (name varchar_pattern_ops)'
+        )
+
+
+def drop_prefix_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS core_keyword_name_prefix_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0021_unique_keyword'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DegreeKeyword',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('weight', models.FloatField(default=1.0)),
+            ],
+            options={
+                'default_related_name': 'degree_keywords',
+            },
+        ),
+        migrations.AddField(
+            model_name='degreekeyword',
+            name='degree',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='degree_keywords', to='core.degree'),
+        ),
+        migrations.AddField(
+            model_name='degreekeyword',
+            name='keyword',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='degree_keywords', to='core.keyword'),
+        ),
+        migrations.AddConstraint(
+            model_name='degreekeyword',
+            constraint=models.UniqueConstraint(fields=('degree', 'keyword'), name='unique_keyword_degree'),
+        ),
+        migrations.RunPython(fold_keywords, migrations.RunPython.noop),
+        migrations.RemoveConstraint(
+            model_name='keyword',
+            name='unique_degree_keyword',
+        ),
+        migrations.RemoveField(
+            model_name='keyword',
+            name='degree',
+        ),
+        migrations.AlterField(
+            model_name='keyword',
+            name='name',
+            field=models.CharField(max_length=255, unique=True),
+        ),
+        migrations.AddField(
+            model_name='keyword',
+            name='degrees',
+            field=models.ManyToManyField(related_name='keywords', through='core.DegreeKeyword', to='core.Degree'),
+        ),
+        migrations.RunPython(create_prefix_index, drop_prefix_index),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 3.1.14 on 2026-10-18 10:29
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0022_keyword_vocabulary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MentorMatch',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('score', models.FloatField()),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('mentor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='mentor_matches', to='core.mentor')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='mentor_matches', to='core.student')),
+            ],
+            options={
+                'default_related_name': 'mentor_matches',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='mentormatch',
+            index=models.Index(fields=['student', 'rank'], name='mentor_match_rank_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='mentormatch',
+            constraint=models.UniqueConstraint(fields=('student', 'mentor'), name='unique_mentor_match'),
+        ),
+    ]
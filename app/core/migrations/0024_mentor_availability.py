@@ -0,0 +1,85 @@
+# Generated by Django 3.1.14 on 2026-10-18 10:35
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.db.models.expressions
+import uuid
+
+from core.availability import get_setup_statements, get_teardown_statements
+
+
+def check_appointments(apps, schema_editor):
+    """Refuse to migrate while appointments would break the new constraints"""
+    Appointment = apps.get_model('core', 'Appointment')
+
+    conflicts = []
+    previous = None
+    for appointment in Appointment.objects.order_by('mentor_id', 'start_datetime'). \
+            values('id', 'mentor_id', 'start_datetime', 'end_datetime').iterator():
+        if appointment['end_datetime'] <= appointment['start_datetime']:
+            conflicts.append(appointment['id'])
+        if previous is not None and previous['mentor_id'] == appointment['mentor_id'] and \
+                appointment['start_datetime'] < previous['end_datetime']:
+            conflicts.append(appointment['id'])
+        if previous is None or previous['mentor_id'] != appointment['mentor_id'] or \
+                appointment['end_datetime'] > previous['end_datetime']:
+            previous = appointment
+    if conflicts:
+        raise RuntimeError(
+            f'Reschedule or delete these appointments, they end before they start or overlap '
+            f'an earlier one of the same mentor: {", ".join(str(pk) for pk in conflicts)}'
+        )
+
+
+def create_overlap_constraint(apps, schema_editor):
+    for statement in get_setup_statements(schema_editor.connection.vendor):
+        schema_editor.execute(statement)
+
+
+def drop_overlap_constraint(apps, schema_editor):
+    for statement in get_teardown_statements(schema_editor.connection.vendor):
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0023_mentor_match'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_appointments, migrations.RunPython.noop),
+        migrations.CreateModel(
+            name='MentorAvailability',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('start_datetime', models.DateTimeField()),
+                ('end_datetime', models.DateTimeField()),
+            ],
+            options={
+                'default_related_name': 'availabilities',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['mentor', 'start_datetime'], name='appointment_mentor_start_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='appointment',
+            constraint=models.CheckConstraint(check=models.Q(end_datetime__gt=django.db.models.expressions.F('start_datetime')), name='appointment_ends_after_start'),
+        ),
+        migrations.AddField(
+            model_name='mentoravailability',
+            name='mentor',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='availabilities', to='core.mentor'),
+        ),
+        migrations.AddIndex(
+            model_name='mentoravailability',
+            index=models.Index(fields=['mentor', 'start_datetime'], name='availability_mentor_start_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='mentoravailability',
+            constraint=models.CheckConstraint(check=models.Q(end_datetime__gt=django.db.models.expressions.F('start_datetime')), name='availability_ends_after_start'),
+        ),
+        migrations.RunPython(create_overlap_constraint, drop_overlap_constraint),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 3.1.14 on 2026-10-18 10:39
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+def fill_mentor_stats(apps, schema_editor):
+    """Compute the stats of existing mentors from their session history"""
+    Mentor = apps.get_model('core', 'Mentor')
+    MentorStats = apps.get_model('core', 'MentorStats')
+    PairSession = apps.get_model('core', 'PairSession')
+    Appointment = apps.get_model('core', 'Appointment')
+
+    fields = ('session_count', 'revenue', 'rating_count', 'rating_total', 'report_count')
+    totals = {mentor_id: dict.fromkeys(fields, 0) for mentor_id in Mentor.objects.values_list('id', flat=True)}
+    for model, feedback in ((PairSession, 'feedback_session'), (Appointment, 'feedback_form')):
+        rows = model.objects.order_by().values('mentor_id').annotate(
+            session_count=models.Count('id'),
+            revenue=models.Sum('price'),
+            rating_count=models.Count(f'{feedback}__student_satisfied_rating'),
+            rating_total=models.Sum(f'{feedback}__student_satisfied_rating'),
+            report_count=models.Count('id', filter=models.Q(**{f'{feedback}__has_student_reported': True})),
+        )
+        for row in rows:
+            for name in fields:
+                totals[row['mentor_id']][name] += row[name] or 0
+
+    MentorStats.objects.bulk_create([
+        MentorStats(mentor_id=mentor_id, **stats) for mentor_id, stats in totals.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0024_mentor_availability'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MentorStats',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('session_count', models.PositiveIntegerField(default=0)),
+                ('revenue', models.FloatField(default=0)),
+                ('rating_count', models.PositiveIntegerField(default=0)),
+                ('rating_total', models.PositiveIntegerField(default=0)),
+                ('report_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('mentor', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='stats', to='core.mentor')),
+            ],
+            options={
+                'default_related_name': 'stats',
+            },
+        ),
+        migrations.RunPython(fill_mentor_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 3.1.14 on 2026-10-18 10:43
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0025_mentor_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='appointment',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to='core.appointment'),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='kind',
+            field=models.CharField(blank=True, choices=[('reminder', 'Reminder'), ('feedback_prompt', 'Feedback prompt')], max_length=31, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['start_datetime'], name='appointment_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['end_datetime'], name='appointment_end_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='notification',
+            constraint=models.UniqueConstraint(fields=('appointment', 'user', 'kind'), name='unique_appointment_notification'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 3.1.14 on 2026-10-18 10:46
+
+from django.db import migrations, models
+
+from core.availability import get_setup_statements
+
+
+def populate_updated_at(apps, schema_editor):
+    """Start appointments as last modified when they were created"""
+    apps.get_model('core', 'Appointment').objects.update(updated_at=models.F('created_at'))
+
+
+def restore_overlap_triggers(apps, schema_editor):
+    """SQLite rebuilt core_appointment to add the column, dropping the triggers"""
+    if schema_editor.connection.vendor == 'sqlite':
+        for statement in get_setup_statements('sqlite'):
+            schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0026_appointment_reminders'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='appointment',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.RunPython(populate_updated_at, migrations.RunPython.noop),
+        migrations.RunPython(restore_overlap_triggers, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='user',
+            name='calendar_token',
+            field=models.CharField(blank=True, max_length=43, null=True, unique=True),
+        ),
+    ]
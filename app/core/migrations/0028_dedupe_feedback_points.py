@@ -0,0 +1,46 @@
+# Generated by Django 3.1.14 on 2026-10-18 11:01
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def dedupe_feedback_points(apps, schema_editor):
+    """Keep the first feedback award of each form and take the others back"""
+    PointsEntry = apps.get_model('core', 'PointsEntry')
+    Mentor = apps.get_model('core', 'Mentor')
+    LeaderboardEntry = apps.get_model('core', 'LeaderboardEntry')
+
+    seen, duplicates, refunds = set(), [], {}
+    entries = PointsEntry.objects.filter(reason='feedback', feedback_form__isnull=False). \
+        order_by('feedback_form_id', 'created_at', 'id'). \
+        values_list('id', 'feedback_form_id', 'mentor_id', 'delta')
+    for entry_id, feedback_form_id, mentor_id, delta in entries.iterator():
+        if feedback_form_id in seen:
+            duplicates.append(entry_id)
+            refunds[mentor_id] = refunds.get(mentor_id, 0) + delta
+        seen.add(feedback_form_id)
+
+    for start in range(0, len(duplicates), 1000):
+        PointsEntry.objects.filter(id__in=duplicates[start:start + 1000]).delete()
+    # Boards keep their members, rebuild_leaderboard re-ranks them
+    for mentor_id, refund in refunds.items():
+        Mentor.objects.filter(pk=mentor_id).update(
+            points=models.F('points') - refund, updated_at=timezone.now()
+        )
+        LeaderboardEntry.objects.filter(mentor_id=mentor_id).update(points=models.F('points') - refund)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0027_appointment_calendar'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='mentor',
+            name='points',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(dedupe_feedback_points, migrations.RunPython.noop),
+    ]
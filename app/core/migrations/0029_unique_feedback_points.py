@@ -0,0 +1,18 @@
+# Generated by Django 3.1.14 on 2026-10-18 11:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """Separate from the dedupe so the table is not altered in the transaction that deleted from it"""
+
+    dependencies = [
+        ('core', '0028_dedupe_feedback_points'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='pointsentry',
+            constraint=models.UniqueConstraint(condition=models.Q(reason='feedback'), fields=('feedback_form',), name='unique_feedback_points'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 3.1.14 on 2026-10-18 11:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0029_unique_feedback_points'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='answer',
+            index=models.Index(fields=['question', 'updated_at'], name='answer_question_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['answer', 'updated_at'], name='comment_answer_updated_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 3.1.14 on 2026-10-18 11:29
+
+from django.db import migrations, models
+
+
+def populate_matched_at(apps, schema_editor):
+    """Start students as matched when their current matches were made"""
+    Student = apps.get_model('core', 'Student')
+    MentorMatch = apps.get_model('core', 'MentorMatch')
+    Student.objects.update(matched_at=models.Subquery(
+        MentorMatch.objects.filter(student=models.OuterRef('pk')).
+        values('student').annotate(latest=models.Max('created_at')).values('latest')
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0030_page_validator_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='student',
+            name='matched_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(populate_matched_at, migrations.RunPython.noop),
+    ]
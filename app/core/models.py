@@ -1,15 +1,43 @@
-from django.db import models
+from django.conf import settings
+from django.db import models, connections, transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin, \
     BaseUserManager
 from django.utils import timezone
 from uuid import uuid4
 
+from . import feed
+from .availability import merge, subtract
+from .keywords import invalidate_matcher, normalize
+from .sampling import invalidate_mentor_pools
+from .search import strip_markers
+
+
+class KeywordManager(models.Manager):
+
+    def lookup(self, words, prefix=False):
+        """Return the keywords whose normalized name is, or starts with, one of words
+
+        Both are lookups on the unique name index rather than scans.
+        """
+        names = {name for name in map(normalize, words) if name}
+        if not prefix:
+            return self.filter(name__in=names)
+        query = models.Q()
+        for name in names:
+            query |= models.Q(name__startswith=name)
+        return self.filter(query) if names else self.none()
+
 
 class Keyword(models.Model):
+    """A normalized term of the keyword vocabulary"""
 
     id = models.UUIDField(default=uuid4, editable=False, primary_key=True)
-    name = models.CharField(max_length=255)
-    degree = models.ForeignKey('Degree', on_delete=models.CASCADE)
+    name = models.CharField(max_length=255, unique=True)
+    degrees = models.ManyToManyField('Degree', through='DegreeKeyword')
+
+    objects = KeywordManager()
 
     class Meta:
         app_label = 'core'
@@ -18,11 +46,108 @@ class Keyword(models.Model):
     def __str__(self):
         return self.name
 
+    def save(self, force_insert=False, force_update=False, using=None,
+             update_fields=None):
+        """Normalize the name and rebuild the keyword matchers after changing a keyword"""
+        self.name = normalize(self.name)
+        super(Keyword, self).save(
+            force_insert=force_insert, force_update=force_update, using=using,
+            update_fields=update_fields
+        )
+        invalidate_matcher()
+
+    def delete(self, using=None, keep_parents=False):
+        """Rebuild the keyword matchers after deleting a keyword"""
+        result = super(Keyword, self).delete(using=using, keep_parents=keep_parents)
+        invalidate_matcher()
+        return result
+
+
+class DegreeKeywordManager(models.Manager):
+
+    def get_weighted_names(self):
+        """Return (degree id, keyword name, weight) of every association in a stable order"""
+        return self.order_by('degree_id', 'keyword__name').values_list('degree_id', 'keyword__name', 'weight')
+
+    def upsert(self, links):
+        """Insert links, or set the weight of existing ones, in a single statement
+
+        Returns how many links were inserted or had their weight changed.
+        """
+        if not links:
+            return 0
+        connection = connections[self.db]
+        opts = self.model._meta
+        qn = connection.ops.quote_name
+        table = qn(opts.db_table)
+        weight = qn(opts.get_field('weight').column)
+        degree = qn(opts.get_field('degree').column)
+        keyword = qn(opts.get_field('keyword').column)
+
+        sql = (
+            f'INSERT INTO {table} ({qn("id")}, {weight}, {degree}, {keyword}) '
+            f'VALUES {", ".join(["(%s, %s, %s, %s)"] * len(links))} '
+            f'ON CONFLICT ({degree}, {keyword}) '
+            f'DO UPDATE SET {weight} = EXCLUDED.{weight} '
+            f'WHERE {table}.{weight} <> EXCLUDED.{weight}'
+        )
+        params = []
+        for link in links:
+            params += [
+                opts.pk.get_db_prep_value(link.pk, connection),
+                link.weight,
+                opts.get_field('degree').target_field.get_db_prep_value(link.degree_id, connection),
+                opts.get_field('keyword').target_field.get_db_prep_value(link.keyword_id, connection),
+            ]
+
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.rowcount
+
+
+class DegreeKeyword(models.Model):
+    """How strongly a keyword points to a degree"""
+
+    id = models.UUIDField(default=uuid4, editable=False, primary_key=True)
+    weight = models.FloatField(default=1.0)
+
+    # The unique constraint's index already leads with degree
+    degree = models.ForeignKey('Degree', on_delete=models.CASCADE, db_index=False)
+    keyword = models.ForeignKey(Keyword, on_delete=models.CASCADE)
+
+    objects = DegreeKeywordManager()
+
+    class Meta:
+        app_label = 'core'
+        default_related_name = 'degree_keywords'
+        constraints = [
+            models.UniqueConstraint(fields=['degree', 'keyword'], name='unique_keyword_degree'),
+        ]
+
+    def __str__(self):
+        return f'{self.keyword.name} for {self.degree.name}'
+
+    def save(self, force_insert=False, force_update=False, using=None,
+             update_fields=None):
+        """Rebuild the degree recommenders after changing an association"""
+        super(DegreeKeyword, self).save(
+            force_insert=force_insert, force_update=force_update, using=using,
+            update_fields=update_fields
+        )
+        invalidate_matcher()
+
+    def delete(self, using=None, keep_parents=False):
+        """Rebuild the degree recommenders after deleting an association"""
+        result = super(DegreeKeyword, self).delete(using=using, keep_parents=keep_parents)
+        invalidate_matcher()
+        return result
+
 
 class Degree(models.Model):
 
     id = models.UUIDField(primary_key=True, default=uuid4, editable=False)
     name = models.CharField(max_length=255)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         app_label = 'core'
@@ -37,6 +162,7 @@ class University(models.Model):
     id = models.UUIDField(primary_key=True, editable=False, default=uuid4)
     name = models.CharField(max_length=255)
     location = models.CharField(max_length=255)
+    updated_at = models.DateTimeField(auto_now=True)
 
     degrees = models.ManyToManyField(Degree)
 
@@ -48,6 +174,20 @@ class University(models.Model):
         return self.name
 
 
+@receiver(m2m_changed, sender=University.degrees.through)
+def touch_university_degrees(sender, instance, action, reverse, pk_set, **kwargs):
+    """Mark universities as modified when degrees are added or removed"""
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        universities = University.objects.filter(pk=instance.pk)
+    elif pk_set is not None:
+        universities = University.objects.filter(pk__in=pk_set)
+    else:
+        universities = University.objects.filter(degrees=instance)
+    universities.update(updated_at=timezone.now())
+
+
 class UserManager(BaseUserManager):
 
     def create_user(self, email, password, **kwargs):
@@ -79,6 +219,10 @@ class User(AbstractBaseUser, PermissionsMixin):
     name = models.CharField(max_length=255)
 
     is_staff = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    # Secret of the appointment calendar feed URL, see core.ical
+    calendar_token = models.CharField(max_length=43, unique=True, null=True, blank=True)
 
     keywords = models.ManyToManyField('Keyword', blank=True)
     mentor = models.OneToOneField('Mentor', on_delete=models.CASCADE, null=True, blank=True)
@@ -90,7 +234,7 @@ class User(AbstractBaseUser, PermissionsMixin):
 
     @property
     def is_mentor(self):
-        return self.mentor is not None
+        return self.mentor_id is not None
 
     class Meta:
         app_label = 'core'
@@ -99,11 +243,26 @@ class User(AbstractBaseUser, PermissionsMixin):
         return self.email
 
 
+@receiver(m2m_changed, sender=User.keywords.through)
+def rescore_user_keywords(sender, instance, action, reverse, pk_set, **kwargs):
+    """Rescore the question feed of mentors whose keywords changed"""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        if instance.is_mentor:
+            feed.schedule_index(feed.MENTOR, [instance.pk])
+    elif pk_set:
+        feed.schedule_index(feed.MENTOR, User.objects.filter(pk__in=pk_set, mentor__isnull=False).
+                            values_list('id', flat=True))
+
+
 class Mentor(models.Model):
 
     id = models.UUIDField(primary_key=True, editable=False, default=uuid4)
     is_professional = models.BooleanField(default=False)
-    points = models.PositiveIntegerField(default=0)
+    # Mirrors the points ledger, whose reversals may take it below zero
+    points = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
 
     degree = models.ForeignKey(Degree, on_delete=models.CASCADE, null=True)
     university = models.ForeignKey(University, on_delete=models.CASCADE, null=True)
@@ -111,19 +270,53 @@ class Mentor(models.Model):
     class Meta:
         app_label = 'core'
         default_related_name = 'mentors'
+        indexes = [
+            models.Index(fields=['points'], name='mentor_points_idx'),
+            models.Index(fields=['degree', 'points'], name='mentor_degree_points_idx'),
+            models.Index(fields=['university', 'points'], name='mentor_university_points_idx'),
+        ]
 
     def __str__(self):
         return f'{self.user.email} Mentor'
 
+    def save(self, force_insert=False, force_update=False, using=None,
+             update_fields=None):
+        """Rebuild the mentor pools, move the mentor's boards and rescore their feed after changing a mentor"""
+        super(Mentor, self).save(
+            force_insert=force_insert, force_update=force_update, using=using,
+            update_fields=update_fields
+        )
+        invalidate_mentor_pools()
+        LeaderboardEntry.objects.update_mentor(self.pk)
+        # Matches follow the degree; a mentor saved before its user is indexed on sign up
+        feed.schedule_index(feed.MENTOR, User.objects.filter(mentor=self).values_list('id', flat=True))
+
+    def delete(self, using=None, keep_parents=False):
+        """Rebuild the mentor pools and refill the mentor's boards after deleting a mentor"""
+        scopes = list(LeaderboardEntry.objects.filter(mentor_id=self.pk).values_list('degree_id', 'university_id'))
+        result = super(Mentor, self).delete(using=using, keep_parents=keep_parents)
+        invalidate_mentor_pools()
+        for scope in scopes:
+            LeaderboardEntry.objects.refill(scope, settings.LEADERBOARD_SIZE)
+        return result
+
 
 class Student(models.Model):
 
     id = models.UUIDField(primary_key=True, editable=False, default=uuid4)
+    updated_at = models.DateTimeField(auto_now=True)
 
     degree1 = models.ForeignKey(Degree, related_name='degree1', on_delete=models.SET_NULL, null=True)
     degree2 = models.ForeignKey(Degree, related_name='degree2', on_delete=models.SET_NULL, null=True)
     degree3 = models.ForeignKey(Degree, related_name='degree3', on_delete=models.SET_NULL, null=True)
 
+    about_me_answer_1 = models.TextField(blank=True, default='')
+    about_me_answer_2 = models.TextField(blank=True, default='')
+    about_me_answer_3 = models.TextField(blank=True, default='')
+
+    # When the matching engine last read the student, matched or not
+    matched_at = models.DateTimeField(null=True, blank=True)
+
     class Meta:
         app_label = 'core'
         default_related_name = 'students'
@@ -137,40 +330,30 @@ class Question(models.Model):
     text = models.TextField(blank=True)
 
     created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+    upvotes_count = models.PositiveIntegerField(default=0)
 
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     keywords = models.ManyToManyField(Keyword)
 
-    @property
-    def upvotes_count(self):
-        return self.upvotes.filter(has_upvoted=True).count()
-
     class Meta:
         app_label = 'core'
         default_related_name = 'questions'
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='question_created_at_idx'),
+        ]
 
     def __str__(self):
         return f'{self.title} by {self.user.email}'
 
     def save(self, force_insert=False, force_update=False, using=None,
              update_fields=None):
-        """Create Upvote objects after creating new Question"""
+        """Index the question for full-text search after saving"""
         super(Question, self).save(
             force_insert=force_insert, force_update=force_update, using=using,
             update_fields=update_fields
         )
-
-        if len(self.upvotes.all()) == 0:
-
-            for user in User.objects.all():
-                Upvote.objects.get_or_create(
-                    question=self,
-                    user=user,
-                    answer=None
-                )
-
-        else:
-            raise AssertionError
+        SearchDocument.objects.index(self)
 
 
 class Answer(models.Model):
@@ -180,40 +363,32 @@ class Answer(models.Model):
     text = models.TextField()
 
     created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+    upvotes_count = models.PositiveIntegerField(default=0)
 
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     question = models.ForeignKey(Question, on_delete=models.CASCADE)
 
-    @property
-    def upvotes_count(self):
-        return self.upvotes.filter(has_upvoted=True).count()
-
     class Meta:
         app_label = 'core'
         default_related_name = 'answers'
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='answer_created_at_idx'),
+            # Covers the validators of a page of questions, see core.conditional
+            models.Index(fields=['question', 'updated_at'], name='answer_question_updated_idx'),
+        ]
 
     def __str__(self):
         return f'{self.text} by {self.user.email}'
 
     def save(self, force_insert=False, force_update=False, using=None,
              update_fields=None):
-        """Create Upvote objects after creating new Answer"""
+        """Index the answer for full-text search after saving"""
         super(Answer, self).save(
             force_insert=force_insert, force_update=force_update, using=using,
             update_fields=update_fields
         )
-
-        if len(self.upvotes.all()) == 0:
-
-            for user in User.objects.all():
-                Upvote.objects.get_or_create(
-                    answer=self,
-                    user=user,
-                    question=None
-                )
-
-        else:
-            raise AssertionError
+        SearchDocument.objects.index(self)
 
 
 class Comment(models.Model):
@@ -223,6 +398,7 @@ class Comment(models.Model):
     text = models.TextField()
 
     created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
 
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     answer = models.ForeignKey(Answer, on_delete=models.CASCADE)
@@ -230,24 +406,94 @@ class Comment(models.Model):
     class Meta:
         app_label = 'core'
         default_related_name = 'comments'
+        indexes = [
+            models.Index(fields=['answer', 'updated_at'], name='comment_answer_updated_idx'),
+        ]
 
     def __str__(self):
         return f'{self.text} by {self.user.email}'
 
+    def save(self, force_insert=False, force_update=False, using=None,
+             update_fields=None):
+        """Index the comment for full-text search after saving"""
+        super(Comment, self).save(
+            force_insert=force_insert, force_update=force_update, using=using,
+            update_fields=update_fields
+        )
+        SearchDocument.objects.index(self)
+
+
+class UpvoteManager(models.Manager):
+
+    def toggle(self, user, has_upvoted, question=None, answer=None):
+        """Set the vote of user on question or answer in a single statement
+
+        Rows are only created once a user actually upvotes, so un-upvoting
+        something that was never upvoted touches nothing. Returns True if the
+        stored vote changed state.
+        """
+        if (question is None) == (answer is None):
+            raise ValueError('Please specify either question or answer!')
+
+        target_field = 'question' if question is not None else 'answer'
+        target = question if question is not None else answer
+
+        if not has_upvoted:
+            return self.filter(
+                user=user, has_upvoted=True, **{target_field: target}
+            ).update(has_upvoted=False, updated_at=timezone.now()) > 0
+
+        connection = connections[self.db]
+        opts = self.model._meta
+        qn = connection.ops.quote_name
+        target_column = opts.get_field(target_field).column
+        table = qn(opts.db_table)
+
+        sql = (
+            f'INSERT INTO {table} '
+            f'({qn("id")}, {qn("has_upvoted")}, {qn("updated_at")}, {qn("user_id")}, {qn(target_column)}) '
+            f'VALUES (%s, %s, %s, %s, %s) '
+            f'ON CONFLICT ({qn("user_id")}, {qn(target_column)}) '
+            f'DO UPDATE SET {qn("has_upvoted")} = EXCLUDED.{qn("has_upvoted")}, '
+            f'{qn("updated_at")} = EXCLUDED.{qn("updated_at")} '
+            f'WHERE {table}.{qn("has_upvoted")} = %s'
+        )
+        params = [
+            opts.pk.get_db_prep_value(uuid4(), connection),
+            True,
+            opts.get_field('updated_at').get_db_prep_value(timezone.now(), connection),
+            opts.get_field('user').target_field.get_db_prep_value(user.pk, connection),
+            opts.get_field(target_field).target_field.get_db_prep_value(target.pk, connection),
+            False,
+        ]
+
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.rowcount > 0
+
 
 class Upvote(models.Model):
 
     id = models.UUIDField(primary_key=True, editable=False, default=uuid4)
 
     has_upvoted = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
 
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     question = models.ForeignKey(Question, on_delete=models.CASCADE, null=True)
     answer = models.ForeignKey(Answer, on_delete=models.CASCADE, null=True)
 
+    objects = UpvoteManager()
+
     class Meta:
         app_label = 'core'
         default_related_name = 'upvotes'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'question'],
+                                    name='unique_question_upvote'),
+            models.UniqueConstraint(fields=['user', 'answer'],
+                                    name='unique_answer_upvote'),
+        ]
 
     def __str__(self):
         return f'Upvote by {self.user.email}'
@@ -266,6 +512,8 @@ class FeedbackForm(models.Model):
     student_comment = models.TextField(blank=True)
     mentor_comment = models.TextField(blank=True)
 
+    updated_at = models.DateTimeField(auto_now=True)
+
     class Meta:
         app_label = 'core'
         default_related_name = 'feedback_forms'
@@ -326,6 +574,7 @@ class Appointment(models.Model):
     start_datetime = models.DateTimeField()
     end_datetime = models.DateTimeField()
     created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
 
     price = models.FloatField(default=0)
 
@@ -335,6 +584,18 @@ class Appointment(models.Model):
     class Meta:
         app_label = 'core'
         default_related_name = 'appointments'
+        constraints = [
+            # Overlapping appointments are rejected by core.availability
+            models.CheckConstraint(check=models.Q(end_datetime__gt=models.F('start_datetime')),
+                                   name='appointment_ends_after_start'),
+        ]
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='appointment_created_at_idx'),
+            models.Index(fields=['mentor', 'start_datetime'], name='appointment_mentor_start_idx'),
+            # Range scans of the reminder scheduler
+            models.Index(fields=['start_datetime'], name='appointment_start_idx'),
+            models.Index(fields=['end_datetime'], name='appointment_end_idx'),
+        ]
 
     def __str__(self):
         return f'{self.mentor.user.email} paired with {self.student.user.email}'
@@ -356,20 +617,712 @@ class Appointment(models.Model):
             return AssertionError
 
 
+class MentorAvailabilityManager(models.Manager):
+
+    WINDOW = 0
+    APPOINTMENT = 1
+    MENTOR = 2
+    MENTOR_WITH_WINDOWS = 3
+
+    def get_schedule(self, mentor_id, start, end):
+        """Return the windows and appointments of a mentor overlapping start to end in one query
+
+        Returns None for unknown mentors, else if the mentor published any
+        availability, then the (start, end) of the windows and appointments.
+        """
+        def kind(value):
+            return models.Value(value, output_field=models.IntegerField())
+
+        overlapping = {'mentor_id': mentor_id, 'start_datetime__lt': end, 'end_datetime__gt': start}
+        # Annotations come after fields in the SELECT, so kind goes last everywhere
+        windows = self.filter(**overlapping).order_by().annotate(kind=kind(self.WINDOW)). \
+            values_list('start_datetime', 'end_datetime', 'kind')
+        appointments = Appointment.objects.filter(**overlapping).order_by(). \
+            annotate(kind=kind(self.APPOINTMENT)).values_list('start_datetime', 'end_datetime', 'kind')
+        mentor = Mentor.objects.filter(pk=mentor_id).order_by().annotate(
+            start_datetime=models.Value(None, output_field=models.DateTimeField()),
+            end_datetime=models.Value(None, output_field=models.DateTimeField()),
+            kind=models.Case(
+                models.When(models.Exists(self.filter(mentor_id=models.OuterRef('pk'))),
+                            then=kind(self.MENTOR_WITH_WINDOWS)),
+                default=kind(self.MENTOR),
+            ),
+        ).values_list('start_datetime', 'end_datetime', 'kind')
+
+        rows = {self.WINDOW: [], self.APPOINTMENT: [], self.MENTOR: [], self.MENTOR_WITH_WINDOWS: []}
+        for row_start, row_end, row_kind in mentor.union(windows, appointments, all=True):
+            rows[row_kind].append((row_start, row_end))
+        if not rows[self.MENTOR] and not rows[self.MENTOR_WITH_WINDOWS]:
+            return None
+        return bool(rows[self.MENTOR_WITH_WINDOWS]), rows[self.WINDOW], rows[self.APPOINTMENT]
+
+    def get_free_slots(self, mentor_id, start, end, duration=None):
+        """Return the sorted (start, end) in start to end a mentor can be booked for
+
+        Mentors who never published availability can be booked any time.
+        Slots shorter than the duration timedelta are left out.
+        """
+        schedule = self.get_schedule(mentor_id, start, end)
+        if schedule is None:
+            return None
+        has_windows, windows, appointments = schedule
+
+        available = merge(
+            (max(window_start, start), min(window_end, end)) for window_start, window_end in windows
+        ) if has_windows else [(start, end)]
+        slots = subtract(available, appointments)
+        if duration is not None:
+            slots = [(slot_start, slot_end) for slot_start, slot_end in slots if slot_end - slot_start >= duration]
+        return slots
+
+    def is_free(self, mentor_id, start, end):
+        """Return if a mentor can be booked from start to end"""
+        return self.get_free_slots(mentor_id, start, end) == [(start, end)]
+
+
+class MentorAvailability(models.Model):
+    """A window of time in which students can book a mentor"""
+
+    id = models.UUIDField(primary_key=True, default=uuid4, editable=False)
+
+    start_datetime = models.DateTimeField()
+    end_datetime = models.DateTimeField()
+
+    mentor = models.ForeignKey(Mentor, on_delete=models.CASCADE)
+
+    objects = MentorAvailabilityManager()
+
+    class Meta:
+        app_label = 'core'
+        default_related_name = 'availabilities'
+        constraints = [
+            models.CheckConstraint(check=models.Q(end_datetime__gt=models.F('start_datetime')),
+                                   name='availability_ends_after_start'),
+        ]
+        indexes = [
+            models.Index(fields=['mentor', 'start_datetime'], name='availability_mentor_start_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.mentor.user.email} from {self.start_datetime} to {self.end_datetime}'
+
+
 class Notification(models.Model):
+
+    REMINDER = 'reminder'
+    FEEDBACK_PROMPT = 'feedback_prompt'
+
+    KIND_CHOICES = (
+        (REMINDER, 'Reminder'),
+        (FEEDBACK_PROMPT, 'Feedback prompt'),
+    )
+
     id = models.UUIDField(default=uuid4, editable=False, primary_key=True)
 
     feedback_form = models.ForeignKey(FeedbackForm, on_delete=models.CASCADE)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
+    # Set by the reminder scheduler; the unique constraint's index leads with it
+    appointment = models.ForeignKey(Appointment, on_delete=models.CASCADE, null=True, blank=True,
+                                    db_index=False)
 
     title = models.CharField(max_length=255,null=True, blank=True)
+    kind = models.CharField(max_length=31, choices=KIND_CHOICES, null=True, blank=True)
     is_seen = models.BooleanField(default=False)
 
     created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         app_label = 'core'
         default_related_name = 'notifications'
+        constraints = [
+            # Lets the reminder scheduler resend after a restart without duplicates
+            models.UniqueConstraint(fields=['appointment', 'user', 'kind'],
+                                    name='unique_appointment_notification'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id'], name='notification_created_at_idx'),
+        ]
 
     def __str__(self):
         return f'{self.title} for {self.user.name}'
+
+
+class MentorStatsManager(models.Manager):
+
+    FIELDS = ('session_count', 'revenue', 'rating_count', 'rating_total', 'report_count')
+
+    @staticmethod
+    def get_feedback_values(rating, is_reported):
+        """Return what the student side of a feedback form adds to the stats"""
+        rating = FeedbackForm._meta.get_field('student_satisfied_rating').to_python(rating)
+        is_reported = FeedbackForm._meta.get_field('has_student_reported').to_python(is_reported)
+        return {
+            'rating_count': int(rating is not None),
+            'rating_total': rating or 0,
+            'report_count': int(bool(is_reported)),
+        }
+
+    def apply(self, mentor_id, **deltas):
+        """Add deltas of FIELDS to the stats of a mentor
+
+        Should be called inside the transaction that writes the source.
+        """
+        deltas = {name: delta for name, delta in deltas.items() if delta}
+        if not deltas:
+            return
+        updated = self.filter(mentor_id=mentor_id).update(
+            **{name: models.F(name) + delta for name, delta in deltas.items()},
+            updated_at=timezone.now()
+        )
+        # Without a row there is nothing to take away from, as when the
+        # mentor is being deleted along with their sessions
+        if updated or not all(delta > 0 for delta in deltas.values()):
+            return
+        # A concurrent transaction may have created the row since the update
+        _, created = self.get_or_create(mentor_id=mentor_id, defaults=deltas)
+        if not created:
+            self.filter(mentor_id=mentor_id).update(
+                **{name: models.F(name) + delta for name, delta in deltas.items()},
+                updated_at=timezone.now()
+            )
+
+    def record_session(self, session, feedback_form, sign=1):
+        """Count a pair session or appointment in, or with sign -1 out of, its mentor's stats"""
+        values = {'session_count': 1, 'revenue': session.price}
+        if feedback_form is not None:
+            values.update(self.get_feedback_values(
+                feedback_form.student_satisfied_rating, feedback_form.has_student_reported
+            ))
+        self.apply(session.mentor_id, **{name: sign * value for name, value in values.items()})
+
+    def record_feedback(self, feedback_form, previous_rating, was_reported):
+        """Move the stats of the form's mentor from the previous student feedback to the current one"""
+        mentor_id = PairSession.objects.filter(feedback_session=feedback_form). \
+            values_list('mentor_id', flat=True).first() or \
+            Appointment.objects.filter(feedback_form=feedback_form).values_list('mentor_id', flat=True).first()
+        if mentor_id is None:
+            return
+        current = self.get_feedback_values(feedback_form.student_satisfied_rating,
+                                           feedback_form.has_student_reported)
+        previous = self.get_feedback_values(previous_rating, was_reported)
+        self.apply(mentor_id, **{name: current[name] - previous[name] for name in current})
+
+    def rebuild(self, batch_size=1000):
+        """Recompute the stats of every mentor from the whole session history"""
+        totals = {mentor_id: dict.fromkeys(self.FIELDS, 0) for mentor_id in
+                  Mentor.objects.values_list('id', flat=True).iterator()}
+        for model, feedback in ((PairSession, 'feedback_session'), (Appointment, 'feedback_form')):
+            rows = model.objects.order_by().values('mentor_id').annotate(
+                session_count=models.Count('id'),
+                revenue=models.Sum('price'),
+                rating_count=models.Count(f'{feedback}__student_satisfied_rating'),
+                rating_total=models.Sum(f'{feedback}__student_satisfied_rating'),
+                report_count=models.Count('id', filter=models.Q(**{f'{feedback}__has_student_reported': True})),
+            )
+            for row in rows:
+                stats = totals.get(row['mentor_id'])
+                if stats is not None:
+                    for name in self.FIELDS:
+                        stats[name] += row[name] or 0
+
+        with transaction.atomic():
+            self.all().delete()
+            self.bulk_create([
+                self.model(mentor_id=mentor_id, **stats) for mentor_id, stats in totals.items()
+            ], batch_size=batch_size)
+        return len(totals)
+
+
+class MentorStats(models.Model):
+    """Running totals of the sessions and student feedback of a mentor"""
+
+    id = models.UUIDField(primary_key=True, editable=False, default=uuid4)
+
+    session_count = models.PositiveIntegerField(default=0)
+    revenue = models.FloatField(default=0)
+    rating_count = models.PositiveIntegerField(default=0)
+    rating_total = models.PositiveIntegerField(default=0)
+    report_count = models.PositiveIntegerField(default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    mentor = models.OneToOneField(Mentor, on_delete=models.CASCADE)
+
+    objects = MentorStatsManager()
+
+    class Meta:
+        app_label = 'core'
+        default_related_name = 'stats'
+
+    def __str__(self):
+        return f'Stats of {self.mentor.user.email}'
+
+    @property
+    def average_rating(self):
+        return self.rating_total / self.rating_count if self.rating_count else None
+
+    @property
+    def report_rate(self):
+        return self.report_count / self.session_count if self.session_count else 0
+
+
+@receiver(post_save, sender=PairSession)
+@receiver(post_save, sender=Appointment)
+def count_session(sender, instance, created, **kwargs):
+    """Add new pair sessions and appointments to their mentor's stats"""
+    if created:
+        feedback_form = instance.feedback_session if sender is PairSession else instance.feedback_form
+        MentorStats.objects.record_session(instance, feedback_form)
+
+
+@receiver(post_delete, sender=PairSession)
+@receiver(post_delete, sender=Appointment)
+def uncount_session(sender, instance, **kwargs):
+    """Take deleted pair sessions and appointments out of their mentor's stats"""
+    feedback_form_id = instance.feedback_session_id if sender is PairSession else instance.feedback_form_id
+    MentorStats.objects.record_session(
+        instance, FeedbackForm.objects.filter(pk=feedback_form_id).first(), sign=-1
+    )
+
+
+class PointsEntryManager(models.Manager):
+
+    def award(self, mentor, reason, delta, **source):
+        """Append a ledger entry and apply it to the mentor's total
+
+        Should be called inside the transaction that writes the source.
+        Feedback forms are awarded once, so returns None without changing
+        anything for a form that already has its entry.
+        """
+        entry = self.model(mentor=mentor, reason=reason, delta=delta, **source)
+        if reason == self.model.FEEDBACK:
+            # Concurrent submissions of a form meet on unique_feedback_points
+            self.bulk_create([entry], ignore_conflicts=True)
+            if not self.filter(pk=entry.pk).exists():
+                return None
+        else:
+            entry.save(force_insert=True)
+        Mentor.objects.filter(pk=mentor.pk).update(
+            points=models.F('points') + delta, updated_at=timezone.now()
+        )
+        LeaderboardEntry.objects.update_mentor(mentor.pk)
+        return entry
+
+    def bulk_award(self, entries):
+        """Append several ledger entries and apply them with one update"""
+        entries = self.bulk_create(entries)
+
+        totals = {}
+        for entry in entries:
+            totals[entry.mentor_id] = totals.get(entry.mentor_id, 0) + entry.delta
+        totals = {mentor_id: delta for mentor_id, delta in totals.items() if delta != 0}
+
+        if totals:
+            Mentor.objects.filter(pk__in=totals).update(points=models.F('points') + models.Case(
+                *[models.When(pk=mentor_id, then=models.Value(delta)) for mentor_id, delta in totals.items()],
+                output_field=models.IntegerField()
+            ), updated_at=timezone.now())
+            LeaderboardEntry.objects.update_mentors(totals)
+        return entries
+
+
+class PointsEntry(models.Model):
+    """Append-only ledger of the points awarded to mentors"""
+
+    OPENING_BALANCE = 'opening_balance'
+    UPVOTE = 'upvote'
+    FEEDBACK = 'feedback'
+
+    REASON_CHOICES = (
+        (OPENING_BALANCE, 'Opening balance'),
+        (UPVOTE, 'Upvote'),
+        (FEEDBACK, 'Feedback'),
+    )
+
+    id = models.UUIDField(primary_key=True, editable=False, default=uuid4)
+
+    reason = models.CharField(max_length=31, choices=REASON_CHOICES)
+    delta = models.IntegerField()
+
+    created_at = models.DateTimeField(default=timezone.now)
+
+    mentor = models.ForeignKey(Mentor, on_delete=models.CASCADE)
+    question = models.ForeignKey(Question, on_delete=models.SET_NULL, null=True, blank=True)
+    answer = models.ForeignKey(Answer, on_delete=models.SET_NULL, null=True, blank=True)
+    feedback_form = models.ForeignKey(FeedbackForm, on_delete=models.SET_NULL, null=True, blank=True)
+
+    objects = PointsEntryManager()
+
+    class Meta:
+        app_label = 'core'
+        default_related_name = 'points_entries'
+        constraints = [
+            models.UniqueConstraint(fields=['feedback_form'], condition=models.Q(reason='feedback'),
+                                    name='unique_feedback_points'),
+        ]
+
+    def __str__(self):
+        return f'{self.delta} points for {self.mentor.user.email}'
+
+
+class LeaderboardEntryManager(models.Manager):
+
+    @staticmethod
+    def get_scopes(degree_id, university_id):
+        """Return the (degree, university) scopes a mentor is ranked in"""
+        scopes = {(None, None)}
+        if degree_id is not None:
+            scopes.add((degree_id, None))
+        if university_id is not None:
+            scopes.add((None, university_id))
+        if degree_id is not None and university_id is not None:
+            scopes.add((degree_id, university_id))
+        return scopes
+
+    def filter_scope(self, degree_id, university_id):
+        return self.filter(degree_id=degree_id, university_id=university_id)
+
+    def update_mentor(self, mentor_id):
+        """Move one mentor on every top-K board they belong to
+
+        Promotions only compare against the lowest entry on the board, while
+        demotions and scope changes refill the vacated slot from the mentor
+        table through the points indexes.
+        """
+        size = settings.LEADERBOARD_SIZE
+        mentor = Mentor.objects.filter(pk=mentor_id). \
+            values('id', 'points', 'degree_id', 'university_id').first()
+
+        old_points = dict(
+            ((degree_id, university_id), points) for degree_id, university_id, points in
+            self.filter(mentor_id=mentor_id).values_list('degree_id', 'university_id', 'points')
+        )
+        self.filter(mentor_id=mentor_id).delete()
+
+        new_scopes = set()
+        if mentor is not None and mentor['points'] > 0:
+            new_scopes = self.get_scopes(mentor['degree_id'], mentor['university_id'])
+
+        for scope in set(old_points) | new_scopes:
+            is_demoted = scope in old_points and (
+                scope not in new_scopes or mentor['points'] < old_points[scope]
+            )
+            if is_demoted:
+                self.refill(scope, size)
+                continue
+
+            board = self.filter_scope(*scope)
+            stats = board.aggregate(total=models.Count('id'), lowest=models.Min('points'))
+            if stats['total'] < size or mentor['points'] > stats['lowest']:
+                self.create(mentor_id=mentor_id, points=mentor['points'],
+                            degree_id=scope[0], university_id=scope[1])
+                if stats['total'] >= size:
+                    lowest = board.order_by('points', '-mentor_id'). \
+                        values_list('id', flat=True)[:stats['total'] + 1 - size]
+                    self.filter(id__in=list(lowest)).delete()
+
+    def update_mentors(self, mentor_ids):
+        """Move several mentors on their boards, visiting each board once
+
+        The mentors' entries are replaced by their current points, then every
+        board touched is topped up by as many rows as it lost, which is all a
+        demotion can let in from below, and trimmed back to size.
+        """
+        mentor_ids = list(mentor_ids)
+        if not mentor_ids:
+            return
+        size = settings.LEADERBOARD_SIZE
+        scopes = dict.fromkeys(self.filter(mentor_id__in=mentor_ids).values_list('degree_id', 'university_id'), 0)
+        self.filter(mentor_id__in=mentor_ids).delete()
+
+        entries = []
+        mentors = Mentor.objects.filter(pk__in=mentor_ids, points__gt=0). \
+            values_list('id', 'points', 'degree_id', 'university_id')
+        for mentor_id, points, degree_id, university_id in mentors:
+            for scope in self.get_scopes(degree_id, university_id):
+                scopes[scope] = scopes.get(scope, 0) + 1
+                entries.append(self.model(mentor_id=mentor_id, points=points,
+                                          degree_id=scope[0], university_id=scope[1]))
+        self.bulk_create(entries)
+
+        for scope, added in scopes.items():
+            excess = self.refill(scope, size + added) - size
+            if excess > 0:
+                lowest = self.filter_scope(*scope).order_by('points', '-mentor_id'). \
+                    values_list('id', flat=True)[:excess]
+                self.filter(id__in=list(lowest)).delete()
+
+    def refill(self, scope, size):
+        """Top up a board from the best mentors not already on it, returning its size"""
+        degree_id, university_id = scope
+        board = self.filter_scope(degree_id, university_id)
+        total = board.count()
+        if total >= size:
+            return total
+
+        mentors = Mentor.objects.filter(points__gt=0)
+        if degree_id is not None:
+            mentors = mentors.filter(degree_id=degree_id)
+        if university_id is not None:
+            mentors = mentors.filter(university_id=university_id)
+        mentors = mentors.exclude(id__in=board.values('mentor_id')). \
+            order_by('-points', 'id').values_list('id', 'points')[:size - total]
+
+        return total + len(self.bulk_create([
+            self.model(mentor_id=mentor_id, points=points,
+                       degree_id=degree_id, university_id=university_id)
+            for mentor_id, points in mentors
+        ]))
+
+    def rebuild(self, batch_size=1000):
+        """Recompute every board in a single pass over the ranked mentors"""
+        size = settings.LEADERBOARD_SIZE
+        boards = {}
+        mentors = Mentor.objects.filter(points__gt=0).order_by('-points', 'id'). \
+            values_list('id', 'points', 'degree_id', 'university_id')
+
+        for mentor_id, points, degree_id, university_id in mentors.iterator():
+            for scope in self.get_scopes(degree_id, university_id):
+                board = boards.setdefault(scope, [])
+                if len(board) < size:
+                    board.append(self.model(
+                        mentor_id=mentor_id, points=points,
+                        degree_id=scope[0], university_id=scope[1]
+                    ))
+
+        with transaction.atomic():
+            self.all().delete()
+            self.bulk_create(
+                [entry for board in boards.values() for entry in board],
+                batch_size=batch_size
+            )
+        return len(boards)
+
+
+class LeaderboardEntry(models.Model):
+    """Precomputed top mentors by points for a degree/university scope"""
+
+    id = models.UUIDField(primary_key=True, editable=False, default=uuid4)
+
+    points = models.PositiveIntegerField()
+
+    mentor = models.ForeignKey(Mentor, on_delete=models.CASCADE)
+    degree = models.ForeignKey(Degree, on_delete=models.CASCADE, null=True, blank=True)
+    university = models.ForeignKey(University, on_delete=models.CASCADE, null=True, blank=True)
+
+    objects = LeaderboardEntryManager()
+
+    class Meta:
+        app_label = 'core'
+        default_related_name = 'leaderboard_entries'
+        indexes = [
+            models.Index(fields=['degree', 'university', '-points'], name='leaderboard_scope_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.mentor.user.email} with {self.points} points'
+
+
+class QuestionFeedEntryManager(models.Manager):
+
+    def index_question(self, question, batch_size=1000):
+        """Score a question for every mentor sharing one of its keywords
+
+        A keyword matches a mentor when it is one of their own keywords or
+        belongs to their degree.
+        """
+        self.filter(question=question).delete()
+
+        keywords = set(question.keywords.values_list('id', flat=True))
+        if not keywords:
+            return
+
+        matches = {}
+        user_keywords = User.keywords.through.objects.filter(
+            keyword_id__in=keywords, user__mentor__isnull=False
+        ).values_list('user_id', 'keyword_id')
+        for user_id, keyword_id in user_keywords:
+            matches.setdefault(user_id, set()).add(keyword_id)
+
+        degree_keywords = {}
+        for degree_id, keyword_id in DegreeKeyword.objects.filter(keyword_id__in=keywords). \
+                values_list('degree_id', 'keyword_id'):
+            degree_keywords.setdefault(degree_id, set()).add(keyword_id)
+        mentors = User.objects.filter(mentor__degree_id__in=degree_keywords). \
+            values_list('id', 'mentor__degree_id')
+        for user_id, degree_id in mentors.iterator():
+            matches.setdefault(user_id, set()).update(degree_keywords[degree_id])
+
+        self.bulk_create([
+            self.model(user_id=user_id, question=question,
+                       score=len(keyword_ids), created_at=question.created_at)
+            for user_id, keyword_ids in matches.items()
+        ], batch_size=batch_size)
+
+    def index_mentor(self, user, batch_size=1000):
+        """Score every question sharing a keyword with a mentor"""
+        self.filter(user=user).delete()
+
+        if not user.is_mentor:
+            return
+
+        matches = Question.keywords.through.objects.filter(
+            models.Q(keyword_id__in=user.keywords.values('id')) |
+            models.Q(keyword_id__in=DegreeKeyword.objects.filter(
+                degree_id=user.mentor.degree_id
+            ).values('keyword_id'))
+        ).values('question_id').annotate(score=models.Count('keyword_id')). \
+            values_list('question_id', 'score', 'question__created_at')
+
+        entries = []
+        for question_id, score, created_at in matches.iterator():
+            entries.append(self.model(user=user, question_id=question_id,
+                                      score=score, created_at=created_at))
+            if len(entries) >= batch_size:
+                self.bulk_create(entries)
+                entries = []
+        self.bulk_create(entries)
+
+
+class QuestionFeedEntry(models.Model):
+    """Inverted index of questions by keyword overlap with each mentor
+
+    Rescored by core.feed jobs after question edits and changes to a
+    mentor's degree, keywords or degree keywords. Questions are tagged when
+    written, so vocabulary added later reaches them on their next edit.
+    """
+
+    id = models.UUIDField(primary_key=True, editable=False, default=uuid4)
+
+    score = models.PositiveSmallIntegerField()
+    created_at = models.DateTimeField()
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    question = models.ForeignKey(Question, on_delete=models.CASCADE)
+
+    objects = QuestionFeedEntryManager()
+
+    class Meta:
+        app_label = 'core'
+        default_related_name = 'feed_entries'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'question'],
+                                    name='unique_question_feed_entry'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-score', '-created_at', '-question'],
+                         name='question_feed_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.question.title} for {self.user.email}'
+
+
+class SearchDocumentManager(models.Manager):
+
+    def index(self, instance):
+        """Create or refresh the search document of a question, answer or comment"""
+        if isinstance(instance, Question):
+            lookup = {'kind': SearchDocument.QUESTION, 'question': instance}
+            defaults = {'title': instance.title, 'body': instance.text}
+        elif isinstance(instance, Answer):
+            lookup = {'kind': SearchDocument.ANSWER, 'answer': instance}
+            defaults = {'question_id': instance.question_id, 'body': instance.text}
+        else:
+            lookup = {'kind': SearchDocument.COMMENT, 'comment': instance}
+            defaults = {'question_id': instance.answer.question_id,
+                        'answer_id': instance.answer_id, 'body': instance.text}
+        defaults['title'] = strip_markers(defaults.get('title', ''))
+        defaults['body'] = strip_markers(defaults['body'])
+        defaults['created_at'] = instance.created_at
+        return self.update_or_create(**lookup, defaults=defaults)[0]
+
+
+class SearchDocument(models.Model):
+    """Searchable text of a question, answer or comment
+
+    The full-text index itself is backend specific and maintained by database
+    triggers, see core.search. The integer id is the FTS5 rowid on SQLite.
+    """
+
+    QUESTION = 'question'
+    ANSWER = 'answer'
+    COMMENT = 'comment'
+
+    KIND_CHOICES = (
+        (QUESTION, 'Question'),
+        (ANSWER, 'Answer'),
+        (COMMENT, 'Comment'),
+    )
+
+    id = models.BigAutoField(primary_key=True)
+
+    kind = models.CharField(max_length=15, choices=KIND_CHOICES)
+    title = models.CharField(max_length=255, blank=True)
+    body = models.TextField(blank=True)
+
+    created_at = models.DateTimeField()
+
+    question = models.ForeignKey(Question, on_delete=models.CASCADE)
+    answer = models.ForeignKey(Answer, on_delete=models.CASCADE, null=True, blank=True)
+    comment = models.OneToOneField(Comment, on_delete=models.CASCADE, null=True, blank=True)
+
+    objects = SearchDocumentManager()
+
+    class Meta:
+        app_label = 'core'
+        default_related_name = 'search_documents'
+
+    def __str__(self):
+        return f'{self.kind} {self.title or self.body[:50]}'
+
+
+class MentorMatchManager(models.Manager):
+
+    def get_waiting_students(self):
+        """Return the students with degrees not matched since they last changed
+
+        Students the engine found no mentor for wait for their next change
+        too, or for a run over everyone.
+        """
+        return Student.objects.filter(degree1__isnull=False, user__isnull=False).filter(
+            models.Q(matched_at__isnull=True) | models.Q(matched_at__lt=models.F('updated_at'))
+        )
+
+    def replace(self, student_ids, matches, matched_at, batch_size=1000):
+        """Swap the matches of students for new ones, found from their state at matched_at"""
+        with transaction.atomic():
+            self.filter(student_id__in=student_ids).delete()
+            self.bulk_create(matches, batch_size=batch_size)
+            # Leaves updated_at alone, as nothing the students show changed
+            Student.objects.filter(pk__in=student_ids).update(matched_at=matched_at)
+
+
+class MentorMatch(models.Model):
+    """Precomputed mentor for a student, from the batch matching engine"""
+
+    id = models.UUIDField(primary_key=True, editable=False, default=uuid4)
+
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+
+    created_at = models.DateTimeField(default=timezone.now)
+
+    student = models.ForeignKey(Student, on_delete=models.CASCADE)
+    mentor = models.ForeignKey(Mentor, on_delete=models.CASCADE)
+
+    objects = MentorMatchManager()
+
+    class Meta:
+        app_label = 'core'
+        default_related_name = 'mentor_matches'
+        constraints = [
+            models.UniqueConstraint(fields=['student', 'mentor'], name='unique_mentor_match'),
+        ]
+        indexes = [
+            models.Index(fields=['student', 'rank'], name='mentor_match_rank_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.mentor.user.email} matched with {self.student.user.email}'
@@ -0,0 +1,160 @@
+import json
+from base64 import b64decode, b64encode
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.db.models import FloatField, Q
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from .models import SearchDocument
+from .search import search
+
+
+class KeysetPagination(BasePagination):
+    """Keyset pagination over several descending fields
+
+    Unlike DRF's CursorPagination, which seeks on the first ordering field
+    only, the cursor holds the values of every field of the last row, so
+    ties on leading fields never fall back to an offset.
+    """
+
+    ordering = ()
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+
+        position = self.decode_cursor(request, self.get_cursor_fields(queryset))
+        if position is not None:
+            queryset = queryset.filter(self.get_position_filter(position))
+
+        rows = list(queryset.order_by(*self.ordering)[:page_size + 1])
+        self.has_next = len(rows) > page_size
+        self.page = rows[:page_size]
+        return self.page
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(page_size, self.max_page_size))
+
+    def get_position_filter(self, position):
+        """Rows strictly after position in descending field order"""
+        fields = [field.lstrip('-') for field in self.ordering]
+        query = Q()
+        for index, field in enumerate(fields):
+            equal = {fields[i]: position[i] for i in range(index)}
+            query |= Q(**equal, **{f'{field}__lt': position[index]})
+        return query
+
+    def get_cursor_fields(self, queryset):
+        """Model fields of the ordering, annotated or not, to read cursor values with"""
+        fields = []
+        for name in self.ordering:
+            name = name.lstrip('-')
+            annotation = queryset.query.annotations.get(name)
+            if annotation is not None:
+                fields.append(annotation.output_field)
+            else:
+                fields.append(queryset.model._meta.get_field(name))
+        return fields
+
+    def decode_cursor(self, request, fields):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            position = json.loads(b64decode(encoded.encode('ascii')).decode('utf-8'))
+        except (TypeError, ValueError):
+            raise NotFound('Invalid cursor')
+        if not isinstance(position, list) or len(position) != len(fields) or None in position:
+            raise NotFound('Invalid cursor')
+        try:
+            return [field.to_python(value) for field, value in zip(fields, position)]
+        except (ValidationError, TypeError, ValueError):
+            raise NotFound('Invalid cursor')
+
+    def encode_cursor(self, row):
+        # Rows are model instances, or dicts from querysets of values()
+        if isinstance(row, dict):
+            position = [row[field.lstrip('-')] for field in self.ordering]
+        else:
+            position = [getattr(row, field.lstrip('-')) for field in self.ordering]
+        encoded = json.dumps(position, default=str)
+        return b64encode(encoded.encode('utf-8')).decode('ascii')
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+
+class CreatedAtCursorPagination(KeysetPagination):
+    """Keyset pagination on (created_at, id), newest first"""
+
+    ordering = ('-created_at', '-id')
+    page_size = 20
+
+
+class QuestionPagination(CreatedAtCursorPagination):
+    page_size = 20
+
+
+class AnswerPagination(CreatedAtCursorPagination):
+    page_size = 20
+
+
+class NotificationPagination(CreatedAtCursorPagination):
+    page_size = 50
+
+
+class AppointmentPagination(CreatedAtCursorPagination):
+    page_size = 50
+
+
+class QuestionFeedPagination(KeysetPagination):
+    ordering = ('-feed_score', '-feed_created_at', '-id')
+    page_size = 20
+
+
+class SearchPagination(KeysetPagination):
+    """Keyset pagination over full-text search results, best match first"""
+
+    ordering = ('-score', '-id')
+    page_size = 20
+
+    def paginate_search(self, text, request):
+        self.request = request
+        page_size = self.get_page_size(request)
+
+        fields = (FloatField(), SearchDocument._meta.get_field('id'))
+        rows = search(text, self.decode_cursor(request, fields), page_size + 1)
+        self.has_next = len(rows) > page_size
+        rows = rows[:page_size]
+
+        documents = SearchDocument.objects.in_bulk([document_id for document_id, _, _ in rows])
+        self.page = []
+        for document_id, score, snippet in rows:
+            document = documents.get(document_id)
+            if document is not None:
+                document.score = score
+                document.snippet = snippet
+                self.page.append(document)
+        return self.page
@@ -0,0 +1,134 @@
+import random
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+
+from .keywords import MATCHER_VERSION_KEY, normalize
+
+
+class DegreeRecommender:
+    """TF-IDF model of degrees over the words of their keywords
+
+    Every degree is a document made of its keyword names, each word counted
+    with the weight of the keyword's association. Column d of weights is the
+    L2-normalized TF-IDF vector of degree d, so scoring a text against all
+    degrees is a single vector-matrix product.
+    """
+
+    def __init__(self, keywords):
+        self.vocabulary = {}
+        self.degree_ids = []
+        degree_index = {}
+        terms, degrees, frequencies = [], [], []
+
+        for degree_id, name, weight in keywords:
+            if degree_id not in degree_index:
+                degree_index[degree_id] = len(self.degree_ids)
+                self.degree_ids.append(degree_id)
+            for word in normalize(name).split():
+                terms.append(self.vocabulary.setdefault(word, len(self.vocabulary)))
+                degrees.append(degree_index[degree_id])
+                frequencies.append(weight)
+
+        counts = np.zeros((len(self.vocabulary), len(self.degree_ids)))
+        np.add.at(counts, (terms, degrees), frequencies)
+
+        # Smoothed inverse document frequency, as in scikit-learn
+        document_frequency = np.count_nonzero(counts, axis=1)
+        idf = np.log((1 + len(self.degree_ids)) / (1 + document_frequency)) + 1
+
+        weights = counts / np.maximum(counts.sum(axis=0), 1) * idf[:, np.newaxis]
+        self.weights = weights / np.maximum(np.linalg.norm(weights, axis=0), 1e-12)
+
+    def score(self, text):
+        """Return the cosine similarity of text with every degree"""
+        query = np.zeros(len(self.vocabulary))
+        for word in normalize(text).split():
+            index = self.vocabulary.get(word)
+            if index is not None:
+                query[index] += 1
+        return query @ self.weights
+
+    def recommend(self, text, count=3):
+        """Return the ids of the count degrees most similar to text, best first"""
+        scores = self.score(text)
+        # Stable sort so equal scores keep a deterministic order
+        ranking = np.argsort(-scores, kind='stable')
+        return [self.degree_ids[index] for index in ranking[:count] if scores[index] > 0]
+
+
+_lock = threading.Lock()
+_recommender = None
+_recommender_version = None
+_recommender_built_at = 0
+
+
+def get_recommender():
+    """Return this worker's recommender, rebuilt like the keyword matcher"""
+    global _recommender, _recommender_version, _recommender_built_at
+    from .models import DegreeKeyword
+
+    version = cache.get(MATCHER_VERSION_KEY)
+    is_expired = time.monotonic() - _recommender_built_at > settings.KEYWORD_MATCHER_TTL
+    if _recommender is not None and version == _recommender_version and not is_expired:
+        return _recommender
+
+    with _lock:
+        if _recommender is None or version != _recommender_version or \
+                time.monotonic() - _recommender_built_at > settings.KEYWORD_MATCHER_TTL:
+            _recommender = DegreeRecommender(DegreeKeyword.objects.get_weighted_names().iterator())
+            _recommender_version = version
+            _recommender_built_at = time.monotonic()
+        return _recommender
+
+
+def top_up(degree_ids, candidate_ids, count=3):
+    """Fill the places of degree_ids up to count with random other candidates"""
+    chosen = set(degree_ids)
+    others = [degree_id for degree_id in candidate_ids if degree_id not in chosen]
+    return list(degree_ids) + random.sample(others, min(count - len(degree_ids), len(others)))
+
+
+def recommend_degrees(text, count=3):
+    """Return count degrees for text, topping up unmatched places at random"""
+    from .models import Degree
+
+    degree_ids = get_recommender().recommend(text, count)
+    degrees = Degree.objects.in_bulk(degree_ids)
+    degree_ids = [degree_id for degree_id in degree_ids if degree_id in degrees]
+    if len(degree_ids) < count:
+        degree_ids = top_up(degree_ids, Degree.objects.values_list('id', flat=True), count)
+        degrees = Degree.objects.in_bulk(degree_ids)
+    return [degrees[degree_id] for degree_id in degree_ids]
+
+
+# Process pool workers score without touching the database, from the
+# keywords and degrees the parent hands over when starting them
+_worker_recommender = None
+_worker_degree_ids = None
+
+
+def init_worker(keywords, degree_ids):
+    global _worker_recommender, _worker_degree_ids
+    _worker_recommender = DegreeRecommender(keywords)
+    _worker_degree_ids = degree_ids
+
+
+def score_students(students):
+    """Return (student id, top 3 degree ids) for (student id, text, current degree ids) triples
+
+    Places nothing matched keep the student's current degrees before any
+    random ones, so a student whose answers score the same keeps their
+    degrees.
+    """
+    results = []
+    for student_id, text, current_ids in students:
+        degree_ids = _worker_recommender.recommend(text)
+        for degree_id in current_ids:
+            if degree_id is not None and degree_id not in degree_ids:
+                degree_ids.append(degree_id)
+        results.append((student_id, top_up(degree_ids[:3], _worker_degree_ids)))
+    return results
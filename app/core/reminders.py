@@ -0,0 +1,133 @@
+import heapq
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+# Appointments committed a little after the created_at they were given are
+# still caught by the next scan of late bookings
+CREATED_AT_SKEW = timedelta(seconds=30)
+
+
+class ReminderScheduler:
+    """Sends appointment reminders and feedback prompts from a min-heap of deadlines
+
+    Only deadlines up to REMINDER_LOOKAHEAD ahead are loaded, by range scans
+    of the start and end indexes that continue where the last one stopped.
+    Appointments booked since the last scan are checked for deadlines the
+    range scans already went past. Notifications are unique per appointment,
+    user and kind, so a restarted scheduler catches up REMINDER_CATCHUP back
+    and skips what was sent.
+    """
+
+    def __init__(self, now=None, lead=None, lookahead=None, catchup=None):
+        from .models import Notification
+
+        now = now or timezone.now()
+        self.lead = timedelta(seconds=settings.APPOINTMENT_REMINDER_LEAD if lead is None else lead)
+        self.lookahead = timedelta(seconds=settings.REMINDER_LOOKAHEAD if lookahead is None else lookahead)
+        catchup = timedelta(seconds=settings.REMINDER_CATCHUP if catchup is None else catchup)
+
+        self.kinds = {
+            Notification.REMINDER: ('start_datetime', self.lead),
+            Notification.FEEDBACK_PROMPT: ('end_datetime', timedelta(0)),
+        }
+        self.heap = []
+        self.queued = set()
+        self.loaded_until = now - catchup
+        self.booked_since = now - catchup
+
+    def __len__(self):
+        return len(self.heap)
+
+    def push(self, due, kind, appointment_id):
+        if (kind, appointment_id) not in self.queued:
+            self.queued.add((kind, appointment_id))
+            heapq.heappush(self.heap, (due, kind, appointment_id))
+
+    def refill(self, now=None):
+        """Queue the deadlines up to the lookahead and those of late bookings"""
+        from .models import Appointment
+
+        now = now or timezone.now()
+        until = now + self.lookahead
+        for kind, (field, lead) in self.kinds.items():
+            rows = Appointment.objects.filter(**{
+                f'{field}__gt': self.loaded_until + lead, f'{field}__lte': until + lead
+            }).order_by().values_list('pk', field)
+            for appointment_id, at in rows.iterator():
+                self.push(at - lead, kind, appointment_id)
+
+        rows = Appointment.objects.filter(created_at__gte=self.booked_since - CREATED_AT_SKEW). \
+            order_by().values_list('pk', *(field for field, _ in self.kinds.values()))
+        for appointment_id, *times in rows.iterator():
+            for (kind, (_, lead)), at in zip(self.kinds.items(), times):
+                if at - lead <= self.loaded_until:
+                    self.push(at - lead, kind, appointment_id)
+
+        self.loaded_until = until
+        self.booked_since = now
+
+    def pop_due(self, now=None):
+        """Return the (due, kind, appointment id) deadlines that passed"""
+        now = now or timezone.now()
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            entry = heapq.heappop(self.heap)
+            self.queued.discard(entry[1:])
+            due.append(entry)
+        return due
+
+    def next_due(self):
+        return self.heap[0][0] if self.heap else None
+
+    def get_notifications(self, deadlines, now=None):
+        """Return the notifications of deadlines still matching their appointments
+
+        Appointments may have moved or been deleted since they were queued,
+        and reminders of appointments that already started are dropped.
+        """
+        from .models import Appointment, Notification
+
+        now = now or timezone.now()
+        appointments = Appointment.objects.filter(pk__in={appointment_id for *_, appointment_id in deadlines}). \
+            select_related('mentor__user', 'student__user').in_bulk()
+
+        notifications = []
+        for due, kind, appointment_id in deadlines:
+            appointment = appointments.get(appointment_id)
+            if appointment is None or appointment.feedback_form_id is None:
+                continue
+            field, lead = self.kinds[kind]
+            at = getattr(appointment, field)
+            if at - lead != due or kind == Notification.REMINDER and at <= now:
+                continue
+
+            mentor, student = appointment.mentor.user, appointment.student.user
+            for user, other in ((mentor, student), (student, mentor)):
+                if user is None or other is None:
+                    continue
+                if kind == Notification.REMINDER:
+                    title = f'Appointment with {other.name} at ' \
+                            f'{timezone.localtime(appointment.start_datetime):%Y-%m-%d %H:%M}'
+                else:
+                    title = f'Give feedback form for appointment with {other.name}'
+                notifications.append(Notification(
+                    user=user, appointment=appointment, feedback_form_id=appointment.feedback_form_id,
+                    kind=kind, title=title
+                ))
+        return notifications
+
+    def send_due(self, now=None, batch_size=1000):
+        """Send the notifications of the deadlines that passed, returning how many were due"""
+        from .models import Notification
+
+        now = now or timezone.now()
+        deadlines = self.pop_due(now)
+        for offset in range(0, len(deadlines), batch_size):
+            # Conflicts are notifications sent before a restart
+            Notification.objects.bulk_create(
+                self.get_notifications(deadlines[offset:offset + batch_size], now),
+                ignore_conflicts=True
+            )
+        return len(deadlines)
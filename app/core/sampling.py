@@ -0,0 +1,149 @@
+import math
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+MENTOR_POOLS_VERSION_KEY = 'core:mentor_pools_version'
+
+
+class AliasTable:
+    """Vose's alias method: draw from a discrete distribution in O(1)"""
+
+    def __init__(self, weights):
+        count = len(weights)
+        total = sum(weights)
+        self.probability = [0.0] * count
+        self.alias = [0] * count
+
+        scaled = [weight * count / total for weight in weights]
+        small = [index for index, weight in enumerate(scaled) if weight < 1]
+        large = [index for index, weight in enumerate(scaled) if weight >= 1]
+        while small and large:
+            less, more = small.pop(), large.pop()
+            self.probability[less] = scaled[less]
+            self.alias[less] = more
+            scaled[more] -= 1 - scaled[less]
+            (small if scaled[more] < 1 else large).append(more)
+        # Whatever is left is 1 up to rounding errors
+        for index in small + large:
+            self.probability[index] = 1.0
+
+    def draw(self, rng=random):
+        index = rng.randrange(len(self.probability))
+        return index if rng.random() < self.probability[index] else self.alias[index]
+
+
+class MentorPool:
+    """The mentors of one degree, as user ids with their sampling weights"""
+
+    def __init__(self, user_ids, weights):
+        self.user_ids = user_ids
+        self.weights = weights
+        self._alias_table = None
+
+    def __len__(self):
+        return len(self.user_ids)
+
+    def pick(self, weighted=False, rng=random):
+        if not weighted:
+            return rng.choice(self.user_ids)
+        if self._alias_table is None:
+            self._alias_table = AliasTable(self.weights)
+        return self.user_ids[self._alias_table.draw(rng)]
+
+
+def get_weight(points, rating):
+    """Return the sampling weight of a mentor
+
+    Points grow without bound so they count logarithmically, while the mean
+    rating students gave scales the weight linearly.
+    """
+    if rating is None:
+        rating = settings.MENTOR_DEFAULT_RATING
+    return (1 + math.log1p(max(points, 0))) * max(rating, 1)
+
+
+def get_ratings():
+    """Return the mean satisfaction rating students gave to every rated mentor"""
+    from .models import MentorStats
+
+    return {
+        mentor_id: rating_total / rating_count for mentor_id, rating_total, rating_count in
+        MentorStats.objects.filter(rating_count__gt=0).values_list('mentor_id', 'rating_total', 'rating_count')
+    }
+
+
+def build_pools():
+    """Return a MentorPool by degree id of every mentor user, in two queries"""
+    from .models import User
+
+    ratings = get_ratings()
+    members = {}
+    rows = User.objects.filter(mentor__degree__isnull=False).order_by('id'). \
+        values_list('id', 'mentor_id', 'mentor__degree_id', 'mentor__points')
+    for user_id, mentor_id, degree_id, points in rows.iterator():
+        user_ids, weights = members.setdefault(degree_id, ([], []))
+        user_ids.append(user_id)
+        weights.append(get_weight(points, ratings.get(mentor_id)))
+    return {degree_id: MentorPool(*member) for degree_id, member in members.items()}
+
+
+_lock = threading.Lock()
+_pools = None
+_pools_version = None
+_pools_built_at = 0
+
+
+def invalidate_mentor_pools():
+    """Make every worker rebuild its mentor pools on next use"""
+    cache.set(MENTOR_POOLS_VERSION_KEY, time.time(), None)
+
+
+def get_pools():
+    """Return this worker's mentor pools, rebuilt like the keyword matcher
+
+    Points and ratings move with every upvote and feedback form, so they are
+    not announced and only refresh after MENTOR_POOLS_TTL.
+    """
+    global _pools, _pools_version, _pools_built_at
+
+    version = cache.get(MENTOR_POOLS_VERSION_KEY)
+    is_expired = time.monotonic() - _pools_built_at > settings.MENTOR_POOLS_TTL
+    if _pools is not None and version == _pools_version and not is_expired:
+        return _pools
+
+    with _lock:
+        if _pools is None or version != _pools_version or \
+                time.monotonic() - _pools_built_at > settings.MENTOR_POOLS_TTL:
+            _pools = build_pools()
+            _pools_version = version
+            _pools_built_at = time.monotonic()
+        return _pools
+
+
+def sample_mentors(degree_ids, weighted=False, rng=random):
+    """Return the user id of a different random mentor for each degree id
+
+    Unknown degrees and degrees whose mentors were all picked already are
+    skipped.
+    """
+    pools = get_pools()
+    picked = []
+    for degree_id in degree_ids:
+        pool = pools.get(degree_id)
+        if pool is None:
+            continue
+        # Degrees may repeat, so retry a few times before taking what is left
+        for _ in range(8):
+            user_id = pool.pick(weighted, rng)
+            if user_id not in picked:
+                picked.append(user_id)
+                break
+        else:
+            remaining = [user_id for user_id in pool.user_ids if user_id not in picked]
+            if remaining:
+                picked.append(rng.choice(remaining))
+    return picked
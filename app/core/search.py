@@ -0,0 +1,161 @@
+import html
+import re
+
+from django.db import connection
+
+HIGHLIGHT_START = '<mark>'
+HIGHLIGHT_STOP = '</mark>'
+
+# Private use characters bracket matches in the raw snippet, so the text can
+# be escaped before they become HTML tags
+MATCH_START = '\ue000'
+MATCH_STOP = '\ue001'
+
+_TERM = re.compile(r'\w+')
+_MATCH = re.compile(f'{MATCH_START}([^{MATCH_START}{MATCH_STOP}]*){MATCH_STOP}')
+
+POSTGRES_SETUP = (
+    'ALTER TABLE core_searchdocument ADD COLUMN search_vector tsvector',
+    '''
+    CREATE FUNCTION core_searchdocument_vector() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('english', coalesce(NEW.title, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(NEW.body, '')), 'B');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    ''',
+    '''
+    CREATE TRIGGER core_searchdocument_vector_update
+    BEFORE INSERT OR UPDATE OF title, body ON core_searchdocument
+    FOR EACH ROW EXECUTE PROCEDURE core_searchdocument_vector()
+    ''',
+    'CREATE INDEX core_searchdocument_vector_idx ON core_searchdocument USING gin (search_vector)',
+)
+
+SQLITE_SETUP = (
+    '''
+    CREATE VIRTUAL TABLE core_searchdocument_fts USING fts5(
+        title, body, content='core_searchdocument', content_rowid='id',
+        tokenize='porter unicode61'
+    )
+    ''',
+    '''
+    CREATE TRIGGER core_searchdocument_fts_insert AFTER INSERT ON core_searchdocument BEGIN
+        INSERT INTO core_searchdocument_fts (rowid, title, body)
+        VALUES (new.id, new.title, new.body);
+    END
+    ''',
+    '''
+    CREATE TRIGGER core_searchdocument_fts_delete AFTER DELETE ON core_searchdocument BEGIN
+        INSERT INTO core_searchdocument_fts (core_searchdocument_fts, rowid, title, body)
+        VALUES ('delete', old.id, old.title, old.body);
+    END
+    ''',
+    '''
+    CREATE TRIGGER core_searchdocument_fts_update AFTER UPDATE ON core_searchdocument BEGIN
+        INSERT INTO core_searchdocument_fts (core_searchdocument_fts, rowid, title, body)
+        VALUES ('delete', old.id, old.title, old.body);
+        INSERT INTO core_searchdocument_fts (rowid, title, body)
+        VALUES (new.id, new.title, new.body);
+    END
+    ''',
+)
+
+POSTGRES_TEARDOWN = (
+    'DROP TRIGGER IF EXISTS core_searchdocument_vector_update ON core_searchdocument',
+    'DROP FUNCTION IF EXISTS core_searchdocument_vector()',
+)
+
+SQLITE_TEARDOWN = (
+    'DROP TABLE IF EXISTS core_searchdocument_fts',
+)
+
+
+def get_setup_statements(vendor):
+    """SQL creating the full-text index of search documents on a backend"""
+    if vendor == 'postgresql':
+        return POSTGRES_SETUP
+    elif vendor == 'sqlite':
+        return SQLITE_SETUP
+    raise NotImplementedError(f'Full-text search is not supported on {vendor}')
+
+
+def get_teardown_statements(vendor):
+    """SQL dropping what get_setup_statements created outside the table"""
+    if vendor == 'postgresql':
+        return POSTGRES_TEARDOWN
+    elif vendor == 'sqlite':
+        return SQLITE_TEARDOWN
+    raise NotImplementedError(f'Full-text search is not supported on {vendor}')
+
+
+def strip_markers(text):
+    """Drop the match markers from text, so documents never bring their own"""
+    return text.replace(MATCH_START, '').replace(MATCH_STOP, '')
+
+
+def highlight(snippet):
+    """HTML-escape a raw snippet and wrap its matches in HIGHLIGHT_START and HIGHLIGHT_STOP"""
+    return strip_markers(_MATCH.sub(f'{HIGHLIGHT_START}\\1{HIGHLIGHT_STOP}', html.escape(snippet or '')))
+
+
+def search(text, position=None, limit=20):
+    """Return (document id, score, snippet) of the best matches for text
+
+    Rows are ordered by descending score then id, and position is the
+    (score, id) of the last row of the previous page. Snippets are HTML with
+    the document text escaped and matches highlighted.
+    """
+    if connection.vendor == 'postgresql':
+        rows = _search_postgres(text, position, limit)
+    elif connection.vendor == 'sqlite':
+        rows = _search_sqlite(text, position, limit)
+    else:
+        raise NotImplementedError(f'Full-text search is not supported on {connection.vendor}')
+    return [(document_id, score, highlight(snippet)) for document_id, score, snippet in rows]
+
+
+def _search_postgres(text, position, limit):
+    # Ranks are widened to double precision so cursor values round-trip exactly
+    after = 'AND (ts_rank(d.search_vector, q)::float8, d.id) < (%s, %s)' if position else ''
+    sql = f'''
+        SELECT page.id, page.score,
+               ts_headline('english', concat_ws(' ', page.title, page.body), page.q, %s)
+        FROM (
+            SELECT d.id, d.title, d.body, q, ts_rank(d.search_vector, q)::float8 AS score
+            FROM core_searchdocument d, websearch_to_tsquery('english', %s) q
+            WHERE d.search_vector @@ q {after}
+            ORDER BY score DESC, d.id DESC
+            LIMIT %s
+        ) page
+        ORDER BY page.score DESC, page.id DESC
+    '''
+    options = f'StartSel={MATCH_START}, StopSel={MATCH_STOP}, MaxFragments=1'
+    params = [options, text] + (list(position) if position else []) + [limit]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def _search_sqlite(text, position, limit):
+    terms = _TERM.findall(text)
+    if not terms:
+        return []
+    # Quoting every term keeps FTS5 query syntax out of user input
+    query = ' '.join(f'"{term}"' for term in terms)
+
+    after = 'AND (-bm25(core_searchdocument_fts, 10.0, 1.0), rowid) < (%s, %s)' if position else ''
+    sql = f'''
+        SELECT rowid, -bm25(core_searchdocument_fts, 10.0, 1.0) AS score,
+               snippet(core_searchdocument_fts, -1, %s, %s, '...', 16)
+        FROM core_searchdocument_fts
+        WHERE core_searchdocument_fts MATCH %s {after}
+        ORDER BY score DESC, rowid DESC
+        LIMIT %s
+    '''
+    params = [MATCH_START, MATCH_STOP, query] + (list(position) if position else []) + [limit]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
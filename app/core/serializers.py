@@ -1,10 +1,86 @@
+from datetime import timedelta
+
+from django.conf import settings
 from django.contrib.auth import authenticate
+from django.db.models import Manager, Prefetch, Q
 
 from rest_framework import serializers
 
 from .models import User, Mentor, Student, Degree, \
     University, Question, Answer, Comment, Upvote, \
-    PairSession, FeedbackForm, Appointment, Notification
+    PairSession, FeedbackForm, Appointment, Notification, LeaderboardEntry, \
+    SearchDocument, MentorAvailability, MentorStats
+from . import feed
+from .sampling import invalidate_mentor_pools
+
+
+def parse_expand(value):
+    """Turn 'answers.comments,user.mentor' into a tree of nested dicts"""
+    tree = {}
+    for path in value.split(','):
+        node = tree
+        for name in path.strip().split('.'):
+            if name:
+                node = node.setdefault(name, {})
+    return tree
+
+
+def is_expanded(expand, name):
+    """Return if relation name is rendered, everything is without an expand tree"""
+    return expand is None or name in expand
+
+
+def get_expansion(expand, name):
+    """Return the expand tree below relation name"""
+    return None if expand is None else expand.get(name, {})
+
+
+def validate_expand(expand, expansions, path=''):
+    """Raise for paths of expand missing from the tree of allowed expansions"""
+    for name, subtree in expand.items():
+        if name not in expansions:
+            raise serializers.ValidationError({'expand': f'Cannot expand {path}{name}'})
+        validate_expand(subtree, expansions[name], f'{path}{name}.')
+
+
+class SparseFieldsMixin:
+    """Render only the requested fields and expanded relations
+
+    fields limits the top-level fields, expand is a tree from parse_expand
+    naming the relations to nest. Without an expand tree every relation is
+    rendered, as before sparse fieldsets existed.
+    """
+
+    expandable_fields = ()
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        self.expand = kwargs.pop('expand', None)
+        super(SparseFieldsMixin, self).__init__(*args, **kwargs)
+
+        for name in list(self.fields):
+            if fields is not None and name not in fields:
+                self.fields.pop(name)
+            elif name in self.expandable_fields and not is_expanded(self.expand, name):
+                self.fields.pop(name)
+
+    @classmethod
+    def get_sparse_fieldset(cls, query_params):
+        """Return the validated fields and expand tree of query parameters"""
+        fields = query_params.get('fields', None)
+        if fields is not None:
+            fields = [name.strip() for name in fields.split(',') if name.strip()]
+            unknown = set(fields) - set(cls.Meta.fields)
+            if unknown:
+                raise serializers.ValidationError(
+                    {'fields': f'Unknown fields {", ".join(sorted(unknown))}'}
+                )
+
+        expand = query_params.get('expand', None)
+        if expand is not None:
+            expand = parse_expand(expand)
+            validate_expand(expand, cls.expansions)
+        return fields, expand
 
 
 class DegreeSerializer(serializers.ModelSerializer):
@@ -17,6 +93,13 @@ class DegreeSerializer(serializers.ModelSerializer):
 class UniversitySerializer(serializers.ModelSerializer):
     degrees = DegreeSerializer(many=True, read_only=True)
 
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """Prefetching the degrees of universities"""
+        return queryset.prefetch_related(
+            Prefetch('degrees', queryset=Degree.objects.order_by('name', 'id'))
+        )
+
     class Meta:
         model = University
         fields = ('id', 'name', 'location', 'degrees')
@@ -94,7 +177,7 @@ class StudentSerializer(serializers.ModelSerializer):
         read_only_fields = ('id',)
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     password = serializers.CharField(
         style={'input_type': 'password'},
         trim_whitespace=False,
@@ -105,6 +188,25 @@ class UserSerializer(serializers.ModelSerializer):
     mentor = MentorSerializer(required=False)
     student = StudentSerializer(required=False)
 
+    expandable_fields = ('mentor', 'student')
+    expansions = {'mentor': {}, 'student': {}}
+
+    @staticmethod
+    def setup_eager_loading(queryset, prefix='', expand=None):
+        """Loading the expanded mentor and student of users at prefix"""
+        if prefix:
+            queryset = queryset.select_related(prefix[:-len('__')])
+        if is_expanded(expand, 'mentor'):
+            queryset = queryset.select_related(f'{prefix}mentor__university').prefetch_related(Prefetch(
+                f'{prefix}mentor__university__degrees',
+                queryset=Degree.objects.order_by('name', 'id')
+            ))
+        if is_expanded(expand, 'student'):
+            queryset = queryset.select_related(
+                f'{prefix}student__degree1', f'{prefix}student__degree2', f'{prefix}student__degree3'
+            )
+        return queryset
+
     class Meta:
         model = User
         fields = ('id', 'email', 'password', 'mentor', 'student', 'is_mentor', 'name')
@@ -129,6 +231,10 @@ class UserSerializer(serializers.ModelSerializer):
 
         user.save()
 
+        if user.is_mentor:
+            feed.schedule_index(feed.MENTOR, [user.pk])
+            invalidate_mentor_pools()
+
         return user
 
     def update(self, instance, validated_data):
@@ -156,6 +262,15 @@ class UserSerializer(serializers.ModelSerializer):
         return user
 
 
+def serialize_user(user, context, expand=None):
+    """Return UserSerializer output for user, serializing each user once per context"""
+    users = context.setdefault('serialized_users', {})
+    key = (user.pk, is_expanded(expand, 'mentor'), is_expanded(expand, 'student'))
+    if key not in users:
+        users[key] = UserSerializer(user, expand=expand).data
+    return users[key]
+
+
 class AuthTokenSerializer(serializers.Serializer):
     """Custom token authentication serializer"""
 
@@ -184,13 +299,13 @@ class AuthTokenSerializer(serializers.Serializer):
         return attrs
 
 
-class MinQuestionSerializer(serializers.ModelSerializer):
+class MinQuestionSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Serializer for question model to be returned along answer"""
     user = serializers.SerializerMethodField('get_user')
 
     def get_user(self, obj):
         """Returning the related user"""
-        return UserSerializer(obj.user).data
+        return serialize_user(obj.user, self.context, get_expansion(self.expand, 'user'))
 
     class Meta:
         model = Question
@@ -203,7 +318,7 @@ class MinAnswerSerializer(serializers.ModelSerializer):
 
     def get_user(self, obj):
         """Returning the related user"""
-        return UserSerializer(obj.user).data
+        return serialize_user(obj.user, self.context)
 
     class Meta:
         model = Answer
@@ -211,31 +326,105 @@ class MinAnswerSerializer(serializers.ModelSerializer):
         read_only_fields = ('id',)
 
 
-class QuestionSerializer(serializers.ModelSerializer):
+def get_upvoted_ids(user, query):
+    """Return the ids of questions and answers upvoted by user among query"""
+    if not user.is_authenticated:
+        return set()
+    upvotes = Upvote.objects.filter(query, user=user, has_upvoted=True). \
+        values_list('question_id', 'answer_id')
+    return {question_id or answer_id for question_id, answer_id in upvotes}
+
+
+class UpvotedListSerializer(serializers.ListSerializer):
+    """List serializer resolving is_upvoted for the whole page at once"""
+
+    def to_representation(self, data):
+        iterable = data.all() if isinstance(data, Manager) else data
+        instances = list(iterable)
+        self.child.resolve_upvoted(instances)
+        return super(UpvotedListSerializer, self).to_representation(instances)
+
+
+class UpvotedSerializerMixin:
+    """Serve is_upvoted from a set of ids resolved once per response"""
+
+    def get_upvote_query(self, instances):
+        """Upvotes on the rendered instances, or None when is_upvoted is not rendered"""
+        if 'is_upvoted' not in self.fields:
+            return None
+        return Q(**{f'{self.Meta.model._meta.model_name}__in': instances})
+
+    def resolve_upvoted(self, instances):
+        """Fetch the current user's upvotes for instances in one query"""
+        if 'upvoted_ids' not in self.context:
+            query = self.get_upvote_query(instances)
+            self.context['upvoted_ids'] = set() if query is None else get_upvoted_ids(
+                self.context['request'].user, query
+            )
+
+    def to_representation(self, instance):
+        self.resolve_upvoted([instance])
+        return super(UpvotedSerializerMixin, self).to_representation(instance)
+
+    def get_is_upvoted(self, obj):
+        """Return if the current user has upvoted"""
+        return obj.pk in self.context['upvoted_ids']
+
+
+class QuestionSerializer(SparseFieldsMixin, UpvotedSerializerMixin, serializers.ModelSerializer):
     """Serializer for question model"""
     user = serializers.SerializerMethodField('get_user')
     answers = serializers.SerializerMethodField('get_answers')
     is_upvoted = serializers.SerializerMethodField('get_is_upvoted')
 
+    expandable_fields = ('answers',)
+    expansions = {
+        'user': UserSerializer.expansions,
+        'answers': {
+            'user': UserSerializer.expansions,
+            'question': {'user': UserSerializer.expansions},
+            'comments': {'user': UserSerializer.expansions},
+        },
+    }
+
+    @staticmethod
+    def setup_eager_loading(queryset, fields=None, expand=None):
+        """Loading the author and the nested answers of questions that are rendered"""
+        if fields is None or 'user' in fields:
+            queryset = UserSerializer.setup_eager_loading(
+                queryset, 'user__', get_expansion(expand, 'user')
+            )
+        if (fields is None or 'answers' in fields) and is_expanded(expand, 'answers'):
+            answers = AnswerSerializer.setup_eager_loading(
+                Answer.objects.order_by('created_at', 'id'), with_question=False,
+                expand=get_expansion(expand, 'answers')
+            )
+            queryset = queryset.prefetch_related(Prefetch('answers', queryset=answers))
+        return queryset
+
     def get_answers(self, obj):
         """Returning the related answers"""
-        answers = Answer.objects.filter(question=obj)
-        if answers.count() > 0:
-            return AnswerSerializer(answers, many=True, context={'request': self.context['request']}).data
+        answers = obj.answers.all()
+        if len(answers) > 0:
+            return AnswerSerializer(
+                answers, many=True, context=self.context, expand=get_expansion(self.expand, 'answers')
+            ).data
         else:
             return None
 
     def get_user(self, obj):
         """Returning the related user"""
-        return UserSerializer(obj.user).data
-
-    def get_is_upvoted(self, obj):
-        """Return if the current user has upvoted"""
-        user = self.context['request'].user
-        upvote_query = obj.upvotes.filter(user=user)
-        if not upvote_query.exists():
-            obj.upvotes.add(Upvote.objects.create(user=user, question=obj, has_upvoted=False))
-        return obj.upvotes.filter(user=user).first().has_upvoted
+        return serialize_user(obj.user, self.context, get_expansion(self.expand, 'user'))
+
+    def get_upvote_query(self, instances):
+        """Upvotes on the rendered questions and answers"""
+        query = None
+        if 'is_upvoted' in self.fields:
+            query = Q(question__in=instances)
+        if 'answers' in self.fields:
+            answers = Q(answer__question__in=instances)
+            query = answers if query is None else query | answers
+        return query
 
     # def get_keyword(self, obj):
     #     """Returning the list of associated keywords"""
@@ -246,48 +435,69 @@ class QuestionSerializer(serializers.ModelSerializer):
         fields = ('id', 'title', 'text', 'created_at',
                   'user', 'answers', 'upvotes_count',
                   'is_upvoted')
-        read_only_fields = ('id',)
+        read_only_fields = ('id', 'upvotes_count')
+        list_serializer_class = UpvotedListSerializer
 
 
-class AnswerSerializer(serializers.ModelSerializer):
+class AnswerSerializer(SparseFieldsMixin, UpvotedSerializerMixin, serializers.ModelSerializer):
     """Serializer for Answer model"""
     user = serializers.SerializerMethodField('get_user')
     question = serializers.SerializerMethodField('get_question')
     comments = serializers.SerializerMethodField('get_comments')
     is_upvoted = serializers.SerializerMethodField('get_is_upvoted')
 
+    expandable_fields = ('comments',)
+
+    @staticmethod
+    def setup_eager_loading(queryset, with_question=True, expand=None):
+        """Loading the author, question and expanded comments of answers"""
+        queryset = UserSerializer.setup_eager_loading(queryset, 'user__', get_expansion(expand, 'user'))
+        if with_question:
+            queryset = UserSerializer.setup_eager_loading(
+                queryset, 'question__user__', get_expansion(get_expansion(expand, 'question'), 'user')
+            )
+        if is_expanded(expand, 'comments'):
+            comments = MinCommentSerializer.setup_eager_loading(
+                Comment.objects.order_by('created_at', 'id'), get_expansion(expand, 'comments')
+            )
+            queryset = queryset.prefetch_related(Prefetch('comments', queryset=comments))
+        return queryset
+
     def get_comments(self, obj):
         """Returning associated comments"""
-        return MinCommentSerializer(Comment.objects.filter(answer=obj).all(), many=True).data
+        return MinCommentSerializer(
+            obj.comments.all(), many=True, context=self.context,
+            expand=get_expansion(self.expand, 'comments')
+        ).data
 
     def get_user(self, obj):
         """Returning the related user"""
-        return UserSerializer(obj.user).data
+        return serialize_user(obj.user, self.context, get_expansion(self.expand, 'user'))
 
     def get_question(self, obj):
         """Returning the related question"""
-        return MinQuestionSerializer(obj.question).data
-
-    def get_is_upvoted(self, obj):
-        """Return if the current user has upvoted"""
-        user = self.context['request'].user
-        upvote_query = obj.upvotes.filter(user=user)
-        if not upvote_query.exists():
-            obj.upvotes.add(Upvote.objects.create(user=user, answer=obj, has_upvoted=False))
-        return obj.upvotes.filter(user=user).first().has_upvoted
+        return MinQuestionSerializer(
+            obj.question, context=self.context, expand=get_expansion(self.expand, 'question')
+        ).data
 
     class Meta:
         model = Answer
         fields = ('id', 'text', 'created_at', 'user', 'question', 'comments', 'is_upvoted', 'upvotes_count')
-        read_only_fields = ('id',)
+        read_only_fields = ('id', 'upvotes_count')
+        list_serializer_class = UpvotedListSerializer
 
 
-class MinCommentSerializer(serializers.ModelSerializer):
+class MinCommentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Serializer for Comment model"""
     user = serializers.SerializerMethodField('get_user')
 
+    @staticmethod
+    def setup_eager_loading(queryset, expand=None):
+        """Loading the author of comments"""
+        return UserSerializer.setup_eager_loading(queryset, 'user__', get_expansion(expand, 'user'))
+
     def get_user(self, obj):
-        return UserSerializer(obj.user).data
+        return serialize_user(obj.user, self.context, get_expansion(self.expand, 'user'))
 
     class Meta:
         model = Comment
@@ -300,11 +510,17 @@ class CommentSerializer(serializers.ModelSerializer):
     user = serializers.SerializerMethodField('get_user')
     answer = serializers.SerializerMethodField('get_answer')
 
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """Loading the author and answer of comments"""
+        queryset = UserSerializer.setup_eager_loading(queryset, 'user__')
+        return UserSerializer.setup_eager_loading(queryset, 'answer__user__')
+
     def get_user(self, obj):
-        return UserSerializer(obj.user).data
+        return serialize_user(obj.user, self.context)
 
     def get_answer(self, obj):
-        return MinAnswerSerializer(obj.answer).data
+        return MinAnswerSerializer(obj.answer, context=self.context).data
 
     class Meta:
         model = Comment
@@ -325,6 +541,18 @@ class UpvoteSerializer(serializers.ModelSerializer):
         }
 
 
+class BulkUpvoteItemSerializer(serializers.Serializer):
+    """Serializer for one vote of a bulk upvote submission"""
+    question = serializers.UUIDField(required=False)
+    answer = serializers.UUIDField(required=False)
+    has_upvoted = serializers.BooleanField()
+
+    def validate(self, attrs):
+        if ('question' in attrs) == ('answer' in attrs):
+            raise serializers.ValidationError('Provide answer or question')
+        return attrs
+
+
 class PairSessionSerializer(serializers.ModelSerializer):
     """Serializer for Paired Session"""
     mentor = serializers.SerializerMethodField('get_mentor')
@@ -332,11 +560,11 @@ class PairSessionSerializer(serializers.ModelSerializer):
 
     def get_student(self, obj):
         """Return the related student user"""
-        return UserSerializer(obj.student.user).data
+        return serialize_user(obj.student.user, self.context)
 
     def get_mentor(self, obj):
         """Return the related mentor user"""
-        return UserSerializer(obj.mentor.user).data
+        return serialize_user(obj.mentor.user, self.context)
 
     class Meta:
         model = PairSession
@@ -371,13 +599,90 @@ class AppointmentSerializer(serializers.ModelSerializer):
 
         }
 
+    def validate(self, attrs):
+        if attrs['end_datetime'] <= attrs['start_datetime']:
+            raise serializers.ValidationError({'end_datetime': 'Must be after start_datetime'})
+        return attrs
+
+
+class MentorAvailabilitySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = MentorAvailability
+        fields = ('id', 'mentor', 'start_datetime', 'end_datetime')
+        read_only_fields = ('id', 'mentor')
+
+    def validate(self, attrs):
+        if attrs['end_datetime'] <= attrs['start_datetime']:
+            raise serializers.ValidationError({'end_datetime': 'Must be after start_datetime'})
+        return attrs
+
+
+class FreeSlotQuerySerializer(serializers.Serializer):
+    """Query parameters of a free slot search"""
+    mentor = serializers.UUIDField()
+    start = serializers.DateTimeField()
+    end = serializers.DateTimeField()
+    duration = serializers.IntegerField(min_value=1, required=False, help_text='Minutes')
+
+    def validate(self, attrs):
+        if attrs['end'] <= attrs['start']:
+            raise serializers.ValidationError({'end': 'Must be after start'})
+        if attrs['end'] - attrs['start'] > timedelta(days=settings.FREE_SLOTS_MAX_DAYS):
+            raise serializers.ValidationError({'end': f'Search at most {settings.FREE_SLOTS_MAX_DAYS} days'})
+        return attrs
+
+
+class FreeSlotSerializer(serializers.Serializer):
+    start_datetime = serializers.DateTimeField()
+    end_datetime = serializers.DateTimeField()
+
+
+class MentorStatsSerializer(serializers.ModelSerializer):
+    average_rating = serializers.FloatField(read_only=True)
+    report_rate = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = MentorStats
+        fields = ('mentor', 'session_count', 'revenue', 'rating_count', 'average_rating',
+                  'report_count', 'report_rate', 'updated_at')
+        read_only_fields = fields
+
 
 class NotificationSerializer(serializers.ModelSerializer):
     feedback_form = FeedbackFormSerializer()
     user = UserSerializer()
 
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """Loading the feedback form and user of notifications"""
+        return UserSerializer.setup_eager_loading(queryset, 'user__'). \
+            select_related('feedback_form')
+
     class Meta:
         model = Notification
         fields = ('id', 'title', 'feedback_form', 'user',
                   'is_seen', 'created_at')
         read_only_fields = ('id', 'created_at')
+
+
+class LeaderboardEntrySerializer(serializers.ModelSerializer):
+    """Serializer for a ranked mentor on the leaderboard"""
+    rank = serializers.IntegerField(read_only=True)
+    name = serializers.CharField(source='mentor.user.name', read_only=True)
+
+    class Meta:
+        model = LeaderboardEntry
+        fields = ('rank', 'mentor', 'name', 'points', 'degree', 'university')
+        read_only_fields = fields
+
+
+class SearchDocumentSerializer(serializers.ModelSerializer):
+    """Serializer for a full-text search hit"""
+    score = serializers.FloatField(read_only=True)
+    snippet = serializers.CharField(read_only=True)
+
+    class Meta:
+        model = SearchDocument
+        fields = ('kind', 'question', 'answer', 'comment', 'title',
+                  'snippet', 'score', 'created_at')
+        read_only_fields = fields
@@ -1,3 +1,1797 @@
-from django.test import TestCase
+import itertools
+import json
+import os
+import random
+import tempfile
+import uuid
+from base64 import b64encode
+from datetime import timedelta
+from io import StringIO
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase
+
+from . import feed, flat, ical, ingestion, keywords, matching, reminders, sampling, search, serializers
+from .recommender import DegreeRecommender, get_recommender
+from .models import User, Mentor, Student, Degree, University, Question, \
+    Answer, Comment, FeedbackForm, Appointment, Notification, Upvote, Keyword, DegreeKeyword, MentorMatch, \
+    MentorAvailability, MentorStats, PairSession, PointsEntry, LeaderboardEntry, QuestionFeedEntry, SearchDocument
+
+
+class CoreTestCase(APITestCase):
+    """Shared fixtures of users, posts and sessions"""
+
+    def setUp(self):
+        self.degree = Degree.objects.create(name='Computer Science')
+        self.university = University.objects.create(name='NUST', location='Islamabad')
+        self.university.degrees.add(self.degree)
+
+        self.student = self.create_student('student@connectu.ml')
+        self.mentor = self.create_mentor('mentor@connectu.ml')
+
+        self.client.force_authenticate(self.student)
+
+    def create_student(self, email):
+        student = Student.objects.create(
+            degree1=self.degree, degree2=self.degree, degree3=self.degree
+        )
+        return User.objects.create_user(email, 'password', name=email, student=student)
+
+    def create_mentor(self, email, university=None):
+        mentor = Mentor.objects.create(
+            degree=self.degree, university=university or self.university
+        )
+        return User.objects.create_user(email, 'password', name=email, mentor=mentor)
+
+    def create_keywords(self):
+        """Create three more degrees and keywords for all four"""
+        self.medicine = Degree.objects.create(name='Medicine')
+        self.law = Degree.objects.create(name='Law')
+        self.physics = Degree.objects.create(name='Physics')
+        for degree, names in ((self.degree, ['programming', 'algorithms', 'machine learning', 'software']),
+                              (self.medicine, ['anatomy', 'surgery', 'biology', 'patients']),
+                              (self.law, ['courts', 'contracts', 'justice']),
+                              (self.physics, ['quantum mechanics', 'relativity', 'machine'])):
+            ingestion.ingest_keywords({degree.pk: names})
+
+    def create_rows(self, count):
+        """Create count questions, answers, comments, notifications and appointments"""
+        start = Comment.objects.count() // 2
+        for index in range(start, start + count):
+            university = University.objects.create(name=f'University {index}', location='Lahore')
+            university.degrees.add(self.degree, Degree.objects.create(name=f'Degree {index}'))
+            author = self.create_student(f'author{index}@connectu.ml')
+            mentor = self.create_mentor(f'mentor{index}@connectu.ml', university)
+            question = Question.objects.create(title=f'Question {index}', user=author, upvotes_count=1)
+            Question.objects.create(title=f'Unanswered {index}', text='Text', user=self.mentor)
+            answer = Answer.objects.create(text='Answer', user=mentor, question=question,
+                                           upvotes_count=int(index % 2 == 0))
+            Answer.objects.create(text='Other answer', user=self.student, question=question)
+            Comment.objects.create(text='Comment', user=author, answer=answer)
+            Comment.objects.create(text='Reply', user=mentor, answer=answer)
+            Upvote.objects.create(user=self.student, question=question, has_upvoted=True)
+            Upvote.objects.create(user=self.student, answer=answer, has_upvoted=index % 2 == 0)
+            Notification.objects.create(
+                user=self.student, title='Notification',
+                feedback_form=FeedbackForm.objects.create()
+            )
+            Appointment.objects.create(
+                student=self.student.student, mentor=mentor.mentor,
+                start_datetime=timezone.now(),
+                end_datetime=timezone.now() + timedelta(hours=1)
+            )
+
+
+class UpvoteToggleTests(CoreTestCase):
+    """Votes are stored sparsely and toggled with a single upsert"""
+
+    def setUp(self):
+        super(UpvoteToggleTests, self).setUp()
+        self.question = Question.objects.create(title='Question', user=self.mentor)
+        self.answer = Answer.objects.create(text='Answer', user=self.mentor, question=self.question)
+
+    def votes(self):
+        return list(Upvote.objects.order_by('user__email').values_list('user_id', 'has_upvoted'))
+
+    def test_toggle(self):
+        # Un-upvoting what was never upvoted stores nothing
+        self.assertFalse(Upvote.objects.toggle(self.student, False, question=self.question))
+        self.assertEqual(self.votes(), [])
+
+        with CaptureQueriesContext(connection) as context:
+            self.assertTrue(Upvote.objects.toggle(self.student, True, question=self.question))
+        self.assertEqual(len(context.captured_queries), 1)
+        self.assertFalse(Upvote.objects.toggle(self.student, True, question=self.question))
+        self.assertEqual(self.votes(), [(self.student.pk, True)])
+
+        self.assertTrue(Upvote.objects.toggle(self.student, False, question=self.question))
+        self.assertFalse(Upvote.objects.toggle(self.student, False, question=self.question))
+        self.assertTrue(Upvote.objects.toggle(self.student, True, question=self.question))
+        self.assertEqual(self.votes(), [(self.student.pk, True)])
+
+    def test_targets(self):
+        self.assertTrue(Upvote.objects.toggle(self.student, True, answer=self.answer))
+        self.assertTrue(Upvote.objects.toggle(self.mentor, True, answer=self.answer))
+        self.assertTrue(Upvote.objects.toggle(self.student, True, question=self.question))
+        self.assertEqual(Upvote.objects.filter(answer=self.answer, has_upvoted=True).count(), 2)
+        self.assertEqual(Upvote.objects.filter(question=self.question, has_upvoted=True).count(), 1)
+
+        with self.assertRaises(ValueError):
+            Upvote.objects.toggle(self.student, True)
+        with self.assertRaises(ValueError):
+            Upvote.objects.toggle(self.student, True, question=self.question, answer=self.answer)
+
+    def test_endpoint(self):
+        response = self.client.post('/api/core/upvote/', {'answer': self.answer.pk, 'has_upvoted': True})
+        self.assertEqual(response.status_code, 200)
+        self.client.post('/api/core/upvote/', {'answer': self.answer.pk, 'has_upvoted': True})
+        self.assertEqual(self.votes(), [(self.student.pk, True)])
+
+        response = self.client.post('/api/core/upvote/', {'has_upvoted': True})
+        self.assertEqual(response.status_code, 400)
+
+
+class UpvoteCountTests(CoreTestCase):
+    """Stored upvote counters follow vote changes and match a rebuild"""
+
+    def setUp(self):
+        super(UpvoteCountTests, self).setUp()
+        self.question = Question.objects.create(title='Question', user=self.mentor)
+        self.answer = Answer.objects.create(text='Answer', user=self.mentor, question=self.question)
+
+    def vote(self, user, has_upvoted, **target):
+        self.client.force_authenticate(user)
+        response = self.client.post('/api/core/upvote/', {**target, 'has_upvoted': has_upvoted})
+        self.assertEqual(response.status_code, 200)
+
+    def counts(self):
+        self.question.refresh_from_db()
+        self.answer.refresh_from_db()
+        return self.question.upvotes_count, self.answer.upvotes_count
+
+    def test_counters(self):
+        self.vote(self.student, True, question=self.question.pk)
+        self.vote(self.student, True, question=self.question.pk)
+        self.vote(self.mentor, True, question=self.question.pk)
+        self.vote(self.student, True, answer=self.answer.pk)
+        self.assertEqual(self.counts(), (2, 1))
+
+        self.vote(self.student, False, question=self.question.pk)
+        self.vote(self.student, False, question=self.question.pk)
+        self.vote(self.mentor, False, answer=self.answer.pk)
+        self.assertEqual(self.counts(), (1, 1))
+
+    def test_rebuild(self):
+        self.vote(self.student, True, question=self.question.pk)
+        self.vote(self.mentor, True, answer=self.answer.pk)
+        Question.objects.update(upvotes_count=7, updated_at=timezone.now())
+        Answer.objects.update(upvotes_count=0, updated_at=timezone.now())
+
+        call_command('rebuild_upvote_counts', '--batch-size', '1', stdout=StringIO())
+        self.assertEqual(self.counts(), (1, 1))
+
+
+class UpvotedSerializerTests(CoreTestCase):
+    """is_upvoted is resolved for a whole page with one upvote query"""
+
+    def setUp(self):
+        super(UpvotedSerializerTests, self).setUp()
+        self.create_rows(3)
+
+    def serialize(self, serializer_class, instances, user=None, **kwargs):
+        context = {'request': SimpleNamespace(user=user or self.student)}
+        with CaptureQueriesContext(connection) as context_queries:
+            data = serializer_class(instances, many=True, context=context, **kwargs).data
+        queries = [query for query in context_queries.captured_queries if 'core_upvote' in query['sql']]
+        return data, len(queries)
+
+    def upvoted_ids(self):
+        return set(Upvote.objects.filter(user=self.student, has_upvoted=True).
+                   values_list('question_id', flat=True)) | \
+            set(Upvote.objects.filter(user=self.student, has_upvoted=True).values_list('answer_id', flat=True))
+
+    def test_questions(self):
+        questions = list(serializers.QuestionSerializer.setup_eager_loading(Question.objects.all()))
+        data, queries = self.serialize(serializers.QuestionSerializer, questions)
+        self.assertEqual(queries, 1)
+
+        upvoted_ids = self.upvoted_ids()
+        for question in data:
+            self.assertEqual(question['is_upvoted'], uuid.UUID(question['id']) in upvoted_ids)
+            for answer in question['answers'] or []:
+                self.assertEqual(answer['is_upvoted'], uuid.UUID(answer['id']) in upvoted_ids)
+        self.assertTrue(any(question['is_upvoted'] for question in data))
+
+    def test_answers(self):
+        answers = list(serializers.AnswerSerializer.setup_eager_loading(Answer.objects.all()))
+        data, queries = self.serialize(serializers.AnswerSerializer, answers)
+        self.assertEqual(queries, 1)
+        upvoted_ids = self.upvoted_ids()
+        self.assertEqual([answer['is_upvoted'] for answer in data],
+                         [answer.pk in upvoted_ids for answer in answers])
+
+        # Nothing to resolve when is_upvoted is not rendered
+        _, queries = self.serialize(serializers.AnswerSerializer, answers, fields=('id', 'text'))
+        self.assertEqual(queries, 0)
+
+    def test_anonymous(self):
+        answers = list(serializers.AnswerSerializer.setup_eager_loading(Answer.objects.all()))
+        data, queries = self.serialize(serializers.AnswerSerializer, answers, user=AnonymousUser())
+        self.assertEqual(queries, 0)
+        self.assertFalse(any(answer['is_upvoted'] for answer in data))
+
+
+class PointsLedgerTests(CoreTestCase):
+    """Mentor points mirror an append-only ledger of awards and reversals"""
+
+    def setUp(self):
+        super(PointsLedgerTests, self).setUp()
+        question = Question.objects.create(title='Question', user=self.student)
+        self.answer = Answer.objects.create(text='Answer', user=self.mentor, question=question)
+
+    def vote(self, has_upvoted):
+        response = self.client.post('/api/core/upvote/', {'answer': self.answer.pk, 'has_upvoted': has_upvoted})
+        self.assertEqual(response.status_code, 200)
+
+    def ledger(self):
+        return list(PointsEntry.objects.filter(mentor=self.mentor.mentor).
+                    order_by('created_at', 'id').values_list('reason', 'delta'))
+
+    def points(self):
+        return Mentor.objects.get(pk=self.mentor.mentor_id).points
+
+    def test_upvotes(self):
+        self.vote(True)
+        self.vote(True)
+        self.vote(False)
+        self.assertEqual(self.ledger(), [(PointsEntry.UPVOTE, 5), (PointsEntry.UPVOTE, -5)])
+        self.assertEqual(self.points(), 0)
+
+        self.vote(True)
+        self.assertEqual(self.points(), sum(delta for _, delta in self.ledger()))
+        call_command('rebuild_mentor_points', stdout=StringIO())
+        self.assertEqual(self.points(), 5)
+
+    def test_reversal_below_zero(self):
+        self.vote(True)
+        Mentor.objects.filter(pk=self.mentor.mentor_id).update(points=0, updated_at=timezone.now())
+        self.vote(False)
+        self.assertEqual(self.points(), -5)
+        self.assertFalse(LeaderboardEntry.objects.filter(mentor=self.mentor.mentor).exists())
+
+    def test_feedback_once(self):
+        session = PairSession.objects.create(student=self.student.student, mentor=self.mentor.mentor,
+                                             url='meet.jit.si/session')
+        self.client.force_authenticate(self.mentor)
+        for rating in (4, 5):
+            response = self.client.post('/api/core/feedback/', {
+                'feedback_form': session.feedback_session.pk, 'mentor_satisfied_rating': rating
+            })
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.ledger(), [(PointsEntry.FEEDBACK, 50)])
+        self.assertEqual(self.points(), 50)
+
+        with transaction.atomic():
+            self.assertIsNone(PointsEntry.objects.award(
+                self.mentor.mentor, PointsEntry.FEEDBACK, 50, feedback_form=session.feedback_session
+            ))
+        self.assertEqual(self.points(), 50)
+
+
+@override_settings(LEADERBOARD_SIZE=2)
+class LeaderboardTests(CoreTestCase):
+    """Top-K boards per scope follow points and scope changes and match a rebuild"""
+
+    def setUp(self):
+        super(LeaderboardTests, self).setUp()
+        self.law = Degree.objects.create(name='Law')
+        self.other_university = University.objects.create(name='LUMS', location='Lahore')
+        self.mentors = [self.mentor.mentor]
+        for index, (degree, university) in enumerate(((self.law, self.university),
+                                                      (self.degree, self.other_university),
+                                                      (self.law, self.other_university))):
+            mentor = self.create_mentor(f'mentor{index}@connectu.ml', university).mentor
+            mentor.degree = degree
+            mentor.save()
+            self.mentors.append(mentor)
+        for mentor, points in zip(self.mentors, (40, 30, 20, 10)):
+            self.award(mentor, points)
+
+    def award(self, mentor, points):
+        with transaction.atomic():
+            PointsEntry.objects.award(mentor, PointsEntry.UPVOTE, points)
+
+    def board(self, **params):
+        response = self.client.get('/api/core/leaderboard/', params)
+        self.assertEqual(response.status_code, 200)
+        return [(entry['rank'], entry['mentor'], entry['points']) for entry in response.data]
+
+    def assertRebuildMatches(self):
+        def entries():
+            return sorted(LeaderboardEntry.objects.values_list('degree_id', 'university_id', 'mentor_id', 'points'),
+                          key=str)
+
+        incremental = entries()
+        call_command('rebuild_leaderboard', stdout=StringIO())
+        self.assertEqual(entries(), incremental)
+
+    def test_scopes(self):
+        first, second, third, fourth = self.mentors
+        self.assertEqual(self.board(), [(1, first.pk, 40), (2, second.pk, 30)])
+        self.assertEqual(self.board(degree=self.law.pk), [(1, second.pk, 30), (2, fourth.pk, 10)])
+        self.assertEqual(self.board(university=self.other_university.pk),
+                         [(1, third.pk, 20), (2, fourth.pk, 10)])
+        self.assertEqual(self.board(degree=self.law.pk, university=self.university.pk), [(1, second.pk, 30)])
+        self.assertRebuildMatches()
+
+        with CaptureQueriesContext(connection) as context:
+            self.board(degree=self.degree.pk)
+        self.assertEqual(len(context.captured_queries), 1)
+
+    def test_points(self):
+        first, second, third, fourth = self.mentors
+        # Promotion past the lowest entry, then a demotion refilled from the mentor table
+        self.award(fourth, 25)
+        self.assertEqual(self.board(degree=self.law.pk), [(1, fourth.pk, 35), (2, second.pk, 30)])
+        self.award(first, -35)
+        self.assertEqual(self.board(), [(1, fourth.pk, 35), (2, second.pk, 30)])
+        self.assertEqual(self.board(degree=self.degree.pk), [(1, third.pk, 20), (2, first.pk, 5)])
+        self.award(first, -5)
+        self.assertEqual(self.board(degree=self.degree.pk), [(1, third.pk, 20)])
+        self.assertRebuildMatches()
+
+    def test_scope_changes(self):
+        first, second, third, fourth = self.mentors
+        first.refresh_from_db()
+        first.degree = self.law
+        first.save()
+        self.assertEqual(self.board(degree=self.law.pk), [(1, first.pk, 40), (2, second.pk, 30)])
+        self.assertEqual(self.board(degree=self.degree.pk), [(1, third.pk, 20)])
+        self.assertRebuildMatches()
+
+        second.delete()
+        self.assertEqual(self.board(), [(1, first.pk, 40), (2, third.pk, 20)])
+        self.assertRebuildMatches()
+
+    def test_rebuild_mentor_points(self):
+        first, second, third, fourth = self.mentors
+        # Entries written behind the ledger's back only show up after the rebuild
+        PointsEntry.objects.create(mentor=fourth, reason=PointsEntry.UPVOTE, delta=100)
+        call_command('rebuild_mentor_points', stdout=StringIO())
+        self.assertEqual(self.board(), [(1, fourth.pk, 110), (2, first.pk, 40)])
+
+    def test_invalid_scope(self):
+        self.assertEqual(self.client.get('/api/core/leaderboard/?degree=notauuid').status_code, 400)
+        self.assertEqual(self.client.get('/api/core/leaderboard/?university=1').status_code, 400)
+        self.assertEqual(self.board(degree=uuid.uuid4()), [])
+
+
+class BulkUpvoteTests(CoreTestCase):
+    """Batches of votes apply the last vote per target once and report each item"""
+
+    def setUp(self):
+        super(BulkUpvoteTests, self).setUp()
+        self.question = Question.objects.create(title='Question', user=self.student)
+        self.answer = Answer.objects.create(text='Answer', user=self.mentor, question=self.question)
+        self.other_answer = Answer.objects.create(text='Other answer', user=self.mentor, question=self.question)
+
+    def bulk(self, votes):
+        response = self.client.post('/api/core/upvote/bulk/', votes, format='json')
+        self.assertEqual(response.status_code, 200)
+        return [result['status'] for result in response.data]
+
+    def counts(self):
+        return [model.objects.get(pk=instance.pk).upvotes_count
+                for model, instance in ((Question, self.question), (Answer, self.answer),
+                                        (Answer, self.other_answer))]
+
+    def points(self):
+        return Mentor.objects.get(pk=self.mentor.mentor_id).points
+
+    def test_statuses(self):
+        statuses = self.bulk([
+            {'answer': str(self.answer.pk), 'has_upvoted': False},
+            {'question': str(self.question.pk), 'has_upvoted': True},
+            {'answer': str(self.answer.pk), 'has_upvoted': True},
+            {'answer': str(uuid.uuid4()), 'has_upvoted': True},
+            {'has_upvoted': True},
+            {'answer': str(self.other_answer.pk), 'has_upvoted': False},
+        ])
+        self.assertEqual(statuses, ['superseded', 'updated', 'updated', 'not_found', 'invalid', 'unchanged'])
+        self.assertEqual(self.counts(), [1, 1, 0])
+        self.assertEqual(self.points(), 5)
+
+        # Repeating the batch changes nothing, and the last vote still wins
+        statuses = self.bulk([
+            {'answer': str(self.answer.pk), 'has_upvoted': True},
+            {'answer': str(self.answer.pk), 'has_upvoted': True},
+            {'question': str(self.question.pk), 'has_upvoted': False},
+            {'question': str(self.question.pk), 'has_upvoted': True},
+        ])
+        self.assertEqual(statuses, ['superseded', 'unchanged', 'superseded', 'unchanged'])
+        self.assertEqual(self.counts(), [1, 1, 0])
+        self.assertEqual(self.points(), 5)
+
+        statuses = self.bulk([
+            {'answer': str(self.answer.pk), 'has_upvoted': False},
+            {'answer': str(self.other_answer.pk), 'has_upvoted': True},
+        ])
+        self.assertEqual(statuses, ['updated', 'updated'])
+        self.assertEqual(self.counts(), [1, 0, 1])
+        self.assertEqual(self.points(), 5)
+        self.assertEqual(Upvote.objects.filter(user=self.student).count(), 3)
+
+    def test_concurrent_upvote(self):
+        # A toggle committed after the locked read inserted the vote first
+        Upvote.objects.toggle(self.student, True, answer=self.answer)
+        Answer.objects.filter(pk=self.answer.pk).update(upvotes_count=1, updated_at=timezone.now())
+        with mock.patch('core.views.UpvotesViewSet.get_existing_votes', return_value={}):
+            statuses = self.bulk([
+                {'answer': str(self.answer.pk), 'has_upvoted': True},
+                {'answer': str(self.other_answer.pk), 'has_upvoted': True},
+            ])
+        self.assertEqual(statuses, ['unchanged', 'updated'])
+        self.assertEqual(self.counts(), [0, 1, 1])
+        self.assertEqual(list(PointsEntry.objects.values_list('answer_id', 'delta')),
+                         [(self.other_answer.pk, 5)])
+
+    @override_settings(LEADERBOARD_SIZE=2)
+    def test_leaderboard(self):
+        other = self.create_mentor('other@connectu.ml').mentor
+        answers = [Answer.objects.create(text=f'Answer {index}', user=other.user, question=self.question)
+                   for index in range(3)]
+        votes = [{'answer': str(answer.pk), 'has_upvoted': True} for answer in answers + [self.answer]]
+        with CaptureQueriesContext(connection) as context:
+            self.bulk(votes)
+        fewer = len(context.captured_queries)
+        self.assertEqual(list(LeaderboardEntry.objects.filter(degree=None, university=None).
+                              order_by('-points').values_list('mentor_id', 'points')),
+                         [(other.pk, 15), (self.mentor.mentor_id, 5)])
+
+        # The boards shared by both mentors are refreshed once per batch
+        more_answers = [Answer.objects.create(text='Answer', user=other.user, question=self.question)
+                        for index in range(3)]
+        with CaptureQueriesContext(connection) as context:
+            self.bulk([{'answer': str(answer.pk), 'has_upvoted': True} for answer in more_answers])
+        self.assertLessEqual(len(context.captured_queries), fewer)
+
+
+class CreatedAtPaginationTests(CoreTestCase):
+    """List endpoints page newest first on (created_at, id) without skipping ties"""
+
+    def setUp(self):
+        super(CreatedAtPaginationTests, self).setUp()
+        self.create_rows(4)
+        # Rows sharing a created_at only stay in order through the id tie-break
+        created_at = timezone.now()
+        for model in (Question, Answer, Notification, Appointment):
+            model.objects.update(created_at=created_at)
+            model.objects.filter(pk__in=list(model.objects.values_list('pk', flat=True)[:2])). \
+                update(created_at=created_at - timedelta(days=1))
+
+    def assertPages(self, url, queryset):
+        ids = []
+        while url is not None:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.data['results']), 3)
+            ids += [str(row['id']) for row in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(ids, [str(pk) for pk in queryset.order_by('-created_at', '-id').values_list('pk', flat=True)])
+
+    def test_endpoints(self):
+        for url, queryset in (('/api/core/question/', Question.objects.all()),
+                              ('/api/core/answer/', Answer.objects.all()),
+                              ('/api/core/notification/', Notification.objects.filter(user=self.student)),
+                              ('/api/core/appointment/', Appointment.objects.all())):
+            with self.subTest(url=url):
+                self.assertPages(f'{url}?page_size=3', queryset)
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get('/api/core/question/?cursor=bm90IGpzb24=').status_code, 404)
+        self.assertEqual(self.client.get('/api/core/answer/?cursor=W10=').status_code, 404)
+        # Well-formed cursors with values the fields cannot hold
+        for position in (['garbage', 'x'], [None, None], [1, 2], [str(timezone.now()), 'x']):
+            cursor = b64encode(json.dumps(position).encode('utf-8')).decode('ascii')
+            for url in ('/api/core/question/', '/api/core/answer/', '/api/core/notification/'):
+                with self.subTest(url=url, position=position):
+                    self.assertEqual(self.client.get(url, {'cursor': cursor}).status_code, 404)
+
+
+@override_settings(QUESTION_FEED_ASYNC=False)
+class QuestionFeedTests(CoreTestCase):
+    """Mentors see questions ranked by keyword overlap, kept in step with writes"""
+
+    def setUp(self):
+        super(QuestionFeedTests, self).setUp()
+        self.create_keywords()
+        self.doctor = self.create_mentor('doctor@connectu.ml')
+        self.doctor.mentor.degree = self.medicine
+        self.doctor.mentor.save()
+
+    def ask(self, title):
+        response = self.client.post('/api/core/question/', {'title': title})
+        self.assertEqual(response.status_code, 201)
+        return response.data['id']
+
+    def feed(self, user, page_size=20):
+        self.client.force_authenticate(user)
+        ids, url = [], f'/api/core/question/feed/?page_size={page_size}'
+        while url is not None:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids += [item['id'] for item in response.data['results']]
+            url = response.data['next']
+        return ids
+
+    def test_ordering(self):
+        one = self.ask('Programming help')
+        two = self.ask('Programming algorithms')
+        newer = self.ask('Software jobs')
+        self.ask('Anatomy books')
+        self.assertEqual(self.feed(self.mentor), [two, newer, one])
+        self.assertEqual(self.feed(self.mentor, page_size=1), [two, newer, one])
+
+    def test_cursor_stability(self):
+        ids = [self.ask(f'Programming question {index}') for index in range(5)]
+        self.client.force_authenticate(self.mentor)
+        response = self.client.get('/api/core/question/feed/?page_size=2')
+        first = [item['id'] for item in response.data['results']]
+
+        # Questions asked while paging sort before the cursor and shift nothing
+        self.client.force_authenticate(self.student)
+        self.ask('Programming question 5')
+        self.client.force_authenticate(self.mentor)
+        rest = []
+        url = response.data['next']
+        while url is not None:
+            response = self.client.get(url)
+            rest += [item['id'] for item in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(first + rest, ids[::-1])
+
+    def test_scoping(self):
+        programming = self.ask('Programming help')
+        anatomy = self.ask('Anatomy of surgery')
+        self.assertEqual(self.feed(self.mentor), [programming])
+        self.assertEqual(self.feed(self.doctor), [anatomy])
+
+        self.client.force_authenticate(self.student)
+        self.assertEqual(self.client.get('/api/core/question/feed/').status_code, 403)
+
+    def test_invalid_cursor(self):
+        self.ask('Programming help')
+        self.client.force_authenticate(self.mentor)
+        for position in (['x', 'y', 'z'], [1, None, 'x'], [1, str(timezone.now()), 'x'], [1, 2]):
+            cursor = b64encode(json.dumps(position).encode('utf-8')).decode('ascii')
+            with self.subTest(position=position):
+                self.assertEqual(self.client.get('/api/core/question/feed/', {'cursor': cursor}).status_code, 404)
+
+    def test_reindexing(self):
+        programming = self.ask('Programming help')
+        courts = self.ask('Courts and surgery')
+        self.assertEqual(self.feed(self.doctor), [courts])
+
+        # Edits retag the question
+        self.client.force_authenticate(self.student)
+        response = self.client.patch(f'/api/core/question/{courts}/', {'title': 'Courts'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.feed(self.doctor), [])
+
+        # Degree and keyword changes rescore the mentor
+        self.doctor.mentor.degree = self.law
+        self.doctor.mentor.save()
+        self.assertEqual(self.feed(self.doctor), [courts])
+        self.doctor.keywords.add(Keyword.objects.get(name='programming'))
+        self.assertEqual(self.feed(self.doctor), [courts, programming])
+        self.doctor.keywords.clear()
+        self.assertEqual(self.feed(self.doctor), [courts])
+
+        # New degree keywords rescore the degree's mentors
+        ingestion.ingest_keywords({self.law.pk: ['programming']})
+        self.assertEqual(self.feed(self.doctor), [courts, programming])
+
+    @override_settings(QUESTION_FEED_ASYNC=True)
+    def test_background_jobs(self):
+        with mock.patch.object(feed, '_executor') as executor:
+            with mock.patch.object(feed.transaction, 'on_commit', side_effect=lambda callback: callback()):
+                question = self.ask('Programming help')
+            executor.submit.assert_called_once_with(feed._run_index, feed.QUESTION, uuid.UUID(question))
+            self.assertFalse(QuestionFeedEntry.objects.exists())
+
+            # Jobs already queued are not queued twice
+            feed._submit_index(feed.QUESTION, uuid.UUID(question))
+            self.assertEqual(executor.submit.call_count, 1)
+            with mock.patch.object(feed, 'connections'):
+                feed._run_index(feed.QUESTION, uuid.UUID(question))
+        feed._pending.clear()
+        self.assertEqual(self.feed(self.mentor), [question])
+
+
+class KeywordMatcherTests(CoreTestCase):
+    """Keywords match whole words of normalized text, from a matcher rebuilt on change"""
+
+    def setUp(self):
+        super(KeywordMatcherTests, self).setUp()
+        keywords.invalidate_matcher()
+
+    def test_normalize(self):
+        self.assertEqual(keywords.normalize('C++, C# and C!'), 'c++ c# and c')
+        self.assertEqual(keywords.normalize('#Python / snake_case'), 'python snake case')
+        self.assertEqual(keywords.normalize('a + b'), 'a b')
+        names = [Keyword.objects.create(name=name).name for name in ('C++', 'C#', 'C')]
+        self.assertEqual(names, ['c++', 'c#', 'c'])
+
+    def test_word_boundaries(self):
+        matcher = keywords.KeywordMatcher([(1, 'art'), (2, 'Machine Learning'), (3, 'C'),
+                                           (4, 'C++'), (5, 'C#')])
+        self.assertEqual(matcher.match('Start with the ART of C++'), {1, 4})
+        self.assertEqual(matcher.match('c#, then c'), {3, 5})
+        self.assertEqual(matcher.match('machine-learning'), {2})
+        self.assertEqual(matcher.match('machines learning artists'), set())
+
+    def test_overlapping_matches(self):
+        matcher = keywords.KeywordMatcher([(1, 'machine'), (2, 'machine learning'), (3, 'learning'),
+                                           (4, 'deep learning'), (5, 'learning machine')])
+        self.assertEqual(matcher.match('deep machine learning'), {1, 2, 3})
+        self.assertEqual(matcher.match('deep learning machine learning'), {1, 2, 3, 4, 5})
+        self.assertEqual(matcher.match(''), set())
+
+    def test_invalidate_matcher(self):
+        matcher = keywords.get_matcher()
+        self.assertIs(keywords.get_matcher(), matcher)
+
+        # Writes that bypass save leave the matcher alone until invalidated
+        Keyword.objects.bulk_create([Keyword(name='compilers')])
+        self.assertIs(keywords.get_matcher(), matcher)
+        self.assertEqual(matcher.match('compilers'), set())
+        keywords.invalidate_matcher()
+        self.assertEqual(keywords.get_matcher().match('compilers'),
+                         {Keyword.objects.get(name='compilers').pk})
+
+        keyword = Keyword.objects.create(name='Rust')
+        self.assertEqual(keywords.get_matcher().match('rust'), {keyword.pk})
+        keyword.delete()
+        self.assertEqual(keywords.get_matcher().match('rust'), set())
+
+        with override_settings(KEYWORD_MATCHER_TTL=-1):
+            self.assertIsNot(keywords.get_matcher(), keywords.get_matcher())
+
+
+class SearchTests(CoreTestCase):
+    """Search documents follow their posts through the index triggers and page by rank"""
+
+    def setUp(self):
+        super(SearchTests, self).setUp()
+        self.question = Question.objects.create(title='Compilers course', text='Which book first?',
+                                                user=self.student)
+
+    def hits(self, text):
+        return [SearchDocument.objects.get(pk=document_id).kind for document_id, _, _ in search.search(text)]
+
+    def get(self, params):
+        response = self.client.get('/api/core/search/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_triggers(self):
+        self.assertEqual(self.hits('compilers'), [SearchDocument.QUESTION])
+
+        answer = Answer.objects.create(text='The dragon book on compilers', user=self.mentor,
+                                       question=self.question)
+        Comment.objects.create(text='Seconded, the dragon book', user=self.student, answer=answer)
+        self.assertEqual(sorted(self.hits('dragon')), [SearchDocument.ANSWER, SearchDocument.COMMENT])
+
+        self.question.title = 'Interpreters course'
+        self.question.save()
+        self.assertEqual(self.hits('interpreters'), [SearchDocument.QUESTION])
+        self.assertEqual(self.hits('compilers'), [SearchDocument.ANSWER])
+
+        answer.delete()
+        self.assertEqual(self.hits('dragon'), [])
+        self.question.delete()
+        self.assertEqual(self.hits('interpreters'), [])
+        self.assertFalse(SearchDocument.objects.exists())
+
+    def test_ranking(self):
+        Answer.objects.create(text='Compilers are fun', user=self.mentor, question=self.question)
+        Answer.objects.create(text='Compilers, compilers and more compilers', user=self.mentor,
+                              question=self.question)
+        results = self.get({'q': 'compilers'})['results']
+        # Title matches weigh most, then more frequent matches
+        self.assertEqual([result['kind'] for result in results],
+                         [SearchDocument.QUESTION, SearchDocument.ANSWER, SearchDocument.ANSWER])
+        self.assertEqual(results[1]['snippet'], '<mark>Compilers</mark>, <mark>compilers</mark> and more '
+                                                '<mark>compilers</mark>')
+        self.assertEqual([result['score'] for result in results],
+                         sorted((result['score'] for result in results), reverse=True))
+
+    def test_pagination(self):
+        for index in range(5):
+            Answer.objects.create(text=f'Compilers answer {index}', user=self.mentor, question=self.question)
+        expected = [(result['kind'], result['answer']) for result in self.get({'q': 'compilers'})['results']]
+
+        results, url = [], '/api/core/search/?q=compilers&page_size=2'
+        while url is not None:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.data['results']), 2)
+            results += [(result['kind'], result['answer']) for result in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(results, expected)
+        self.assertEqual(len(results), 6)
+
+        self.assertEqual(self.client.get('/api/core/search/', {'q': 'compilers', 'cursor': 'W10='}).status_code, 404)
+        self.assertEqual(self.client.get('/api/core/search/', {'q': ' '}).status_code, 400)
+        self.assertEqual(self.get({'q': '"*'})['results'], [])
+
+    def test_snippets_are_escaped(self):
+        Answer.objects.create(text='<script>alert("compilers")</script> & <b>compilers</b> \ue000\ue001',
+                              user=self.mentor, question=self.question)
+        snippet = self.get({'q': 'alert'})['results'][0]['snippet']
+        self.assertEqual(snippet, '&lt;script&gt;<mark>alert</mark>(&quot;compilers&quot;)&lt;/script&gt; '
+                                  '&amp; &lt;b&gt;compilers&lt;/b&gt; ')
+        self.assertFalse(SearchDocument.objects.filter(body__contains='\ue000').exists())
+        self.assertEqual(search.highlight('\ue000a\ue000<b>\ue001'), 'a<mark>&lt;b&gt;</mark>')
+
+
+class QueryBudgetTests(CoreTestCase):
+    """List endpoints run a fixed number of queries whatever the page size"""
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def assertQueryBudget(self, url, budget):
+        self.create_rows(2)
+        self.assertEqual(self.count_queries(url), budget)
+        self.create_rows(8)
+        self.assertEqual(self.count_queries(url), budget)
+
+    def test_question_list(self):
+        self.assertQueryBudget('/api/core/question/', 8)
+
+    def test_answer_list(self):
+        self.assertQueryBudget('/api/core/answer/', 5)
+
+    def test_comment_list(self):
+        self.assertQueryBudget('/api/core/comment/', 3)
+
+    def test_notification_list(self):
+        self.assertQueryBudget('/api/core/notification/', 4)
+
+    def test_appointment_list(self):
+        self.assertQueryBudget('/api/core/appointment/', 1)
+
+    def test_user_list(self):
+        self.assertQueryBudget('/api/core/user/', 2)
+
+    def test_university_list(self):
+        self.assertQueryBudget('/api/core/university/', 3)
+
+
+class FlatSerializerParityTests(CoreTestCase):
+    """The flat list path renders exactly what the nested serializers render"""
+
+    def setUp(self):
+        super(FlatSerializerParityTests, self).setUp()
+        self.create_rows(6)
+
+    def assertParity(self, url, serializer_class, queryset):
+        rendered = []
+        while url is not None:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            results = response.data['results']
+            ids = [row['id'] for row in results]
+            instances = queryset.in_bulk(ids)
+            expected = serializer_class(
+                [instances[uuid.UUID(id)] for id in ids], many=True, context=self.get_context()
+            ).data
+            self.assertEqual(JSONRenderer().render(results), JSONRenderer().render(expected))
+            rendered += ids
+            url = response.data['next']
+        self.assertEqual(len(rendered), queryset.count())
+
+    def get_context(self):
+        return {'request': SimpleNamespace(user=self.student)}
+
+    def test_question_list(self):
+        self.assertParity(
+            '/api/core/question/?page_size=4', serializers.QuestionSerializer,
+            serializers.QuestionSerializer.setup_eager_loading(Question.objects.all())
+        )
+
+    def test_answer_list(self):
+        self.assertParity(
+            '/api/core/answer/?page_size=4', serializers.AnswerSerializer,
+            serializers.AnswerSerializer.setup_eager_loading(Answer.objects.all())
+        )
+
+    def test_notification_list(self):
+        self.assertParity(
+            '/api/core/notification/?page_size=4', serializers.NotificationSerializer,
+            serializers.NotificationSerializer.setup_eager_loading(
+                Notification.objects.filter(user=self.student)
+            )
+        )
+
+    def test_query_counts(self):
+        def count_queries(render):
+            with CaptureQueriesContext(connection) as context:
+                render()
+            return len(context.captured_queries)
+
+        questions = Question.objects.order_by('-created_at', '-id')
+        answers = Answer.objects.order_by('-created_at', '-id')
+        counts = []
+        for size in (3, 12):
+            counts.append((
+                count_queries(lambda: serializers.QuestionSerializer(
+                    list(serializers.QuestionSerializer.setup_eager_loading(questions)[:size]),
+                    many=True, context=self.get_context()
+                ).data),
+                count_queries(lambda: flat.serialize_questions(
+                    list(questions.values(*flat.QUESTION_FIELDS)[:size]), self.student
+                )),
+                count_queries(lambda: serializers.AnswerSerializer(
+                    list(serializers.AnswerSerializer.setup_eager_loading(answers)[:size]),
+                    many=True, context=self.get_context()
+                ).data),
+                count_queries(lambda: flat.serialize_answers(
+                    list(answers.values(*flat.ANSWER_FIELDS)[:size]), self.student
+                )),
+            ))
+        # Neither path grows with the page, and the flat one adds at most its user load
+        self.assertEqual(counts[0], counts[1])
+        nested_questions, flat_questions, nested_answers, flat_answers = counts[0]
+        self.assertLessEqual(flat_questions, nested_questions + 1)
+        self.assertLessEqual(flat_answers, nested_answers + 1)
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command('bench_serializers', '--questions', '3', '--page-sizes', '2', '--runs', '1', stdout=out)
+        self.assertEqual([line.split()[0] for line in out.getvalue().splitlines()],
+                         ['question', 'answer', 'notification'])
+        # The generated rows are rolled back
+        self.assertFalse(Degree.objects.filter(name='Benchmark').exists())
+
+
+class ConditionalRequestTests(CoreTestCase):
+    """Polled list endpoints answer 304 until something in their payload changes"""
+
+    def setUp(self):
+        super(ConditionalRequestTests, self).setUp()
+        self.create_rows(2)
+
+    def assertNotModified(self, url, **headers):
+        response = self.client.get(url, **headers)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+    def assertChanged(self, url, change):
+        etag = self.client.get(url)['ETag']
+        self.assertNotModified(url, HTTP_IF_NONE_MATCH=etag)
+        change()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_validators(self):
+        for url in ('/api/core/question/', '/api/core/notification/', '/api/core/university/'):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotModified(url, HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertNotModified(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+
+    def test_question_list(self):
+        url = '/api/core/question/'
+        question = Upvote.objects.filter(user=self.student, has_upvoted=True).exclude(question=None). \
+            first().question
+        self.assertChanged(url, lambda: Answer.objects.create(text='New', user=self.mentor, question=question))
+        self.assertChanged(url, lambda: self.client.post(
+            '/api/core/upvote/', {'question': question.pk, 'has_upvoted': False}
+        ))
+        self.assertChanged(url, lambda: Comment.objects.first().delete())
+
+        def rename_degree():
+            self.degree.name = 'Renamed'
+            self.degree.save()
+        self.assertChanged(url, rename_degree)
+
+    def test_page_scope(self):
+        url = '/api/core/question/?page_size=1'
+        newest = Question.objects.order_by('-created_at', '-id').first()
+        older = Question.objects.exclude(pk=newest.pk).filter(answers__isnull=False).first()
+        etag = self.client.get(url)['ETag']
+
+        # Rows behind other pages leave this one alone
+        Answer.objects.create(text='New', user=self.mentor, question=older)
+        Comment.objects.create(text='New', user=self.mentor, answer=older.answers.first())
+        self.assertNotModified(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertChanged(url, lambda: Answer.objects.create(text='New', user=self.mentor, question=newest))
+        self.assertChanged(url, lambda: Question.objects.create(title='Newer', user=self.student))
+        self.assertChanged(url, lambda: Question.objects.order_by('-created_at', '-id').first().delete())
+
+    def test_sparse_fieldsets(self):
+        url = '/api/core/question/'
+        etags = {query: self.client.get(url + query)['ETag']
+                 for query in ('', '?fields=id,title', '?fields=title,id', '?expand=answers', '?expand=user')}
+        self.assertEqual(etags['?fields=id,title'], etags['?fields=title,id'])
+        self.assertEqual(len(set(etags.values())), 4)
+        self.assertNotModified(url + '?fields=title,%20id', HTTP_IF_NONE_MATCH=etags['?fields=id,title'])
+        self.assertEqual(self.client.get(url + '?fields=id', HTTP_IF_NONE_MATCH=etags['']).status_code, 200)
+
+    def test_question_list_is_per_user(self):
+        url = '/api/core/question/'
+        etag = self.client.get(url)['ETag']
+        self.client.force_authenticate(self.mentor)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_notification_list(self):
+        url = '/api/core/notification/'
+        notification = Notification.objects.filter(user=self.student).first()
+        self.assertChanged(url, lambda: self.client.patch(
+            f'/api/core/notification/{notification.pk}/', {'is_seen': True}
+        ))
+        self.assertChanged(url, lambda: notification.delete())
+
+    def test_university_list(self):
+        url = '/api/core/university/'
+        degree = Degree.objects.create(name='Physics')
+        self.assertChanged(url, lambda: self.university.degrees.add(degree))
+        self.assertChanged(url, lambda: degree.universities.clear())
+
+
+class UserIdentityMapTests(CoreTestCase):
+    """Nested serializers serialize each user once per response"""
+
+    def setUp(self):
+        super(UserIdentityMapTests, self).setUp()
+        self.create_rows(3)
+
+    def count_serialized_users(self, serialize):
+        to_representation = serializers.UserSerializer.to_representation
+        with mock.patch.object(serializers.UserSerializer, 'to_representation',
+                               autospec=True, side_effect=to_representation) as patched:
+            data = serialize()
+        return patched.call_count, data
+
+    def test_question_list(self):
+        questions = serializers.QuestionSerializer.setup_eager_loading(Question.objects.all())
+        authors = set(Question.objects.values_list('user_id', flat=True)) | \
+            set(Answer.objects.values_list('user_id', flat=True)) | \
+            set(Comment.objects.values_list('user_id', flat=True))
+
+        count, data = self.count_serialized_users(lambda: serializers.QuestionSerializer(
+            questions, many=True, context={'request': SimpleNamespace(user=self.student)}
+        ).data)
+        self.assertEqual(count, len(authors))
+        self.assertEqual(len(data), Question.objects.count())
+
+    def test_answer_retrieve(self):
+        answer = Answer.objects.filter(comments__isnull=False).first()
+
+        count, response = self.count_serialized_users(
+            lambda: self.client.get(f'/api/core/answer/{answer.pk}/')
+        )
+        self.assertEqual(response.status_code, 200)
+        # The mentor answered and replied, the author asked and commented
+        self.assertEqual(count, 2)
+        self.assertEqual(response.data['user'], response.data['comments'][1]['user'])
+
+
+class SparseFieldsetTests(CoreTestCase):
+    """?fields= and ?expand= select what question endpoints render and query"""
+
+    def setUp(self):
+        super(SparseFieldsetTests, self).setUp()
+        self.create_rows(3)
+
+    def get(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, len(context.captured_queries)
+
+    def serialize(self, questions, fields=None, expand=None):
+        questions = serializers.QuestionSerializer.setup_eager_loading(questions, fields, expand)
+        return JSONRenderer().render(serializers.QuestionSerializer(
+            questions, many=True, fields=fields, expand=expand,
+            context={'request': SimpleNamespace(user=self.student)}
+        ).data)
+
+    def test_fields(self):
+        response, queries = self.get('/api/core/question/?fields=id,title')
+        self.assertEqual(list(response.data['results'][0]), ['id', 'title'])
+        # The ETag page and aggregate, then the page, no users, answers or upvotes
+        self.assertEqual(queries, 3)
+
+    def test_empty_expand(self):
+        response, queries = self.get('/api/core/question/?expand=')
+        for question in response.data['results']:
+            self.assertNotIn('answers', question)
+            self.assertEqual(list(question['user']), ['id', 'email', 'is_mentor', 'name'])
+        # The ETag page and aggregate, then the page, users and upvotes
+        self.assertEqual(queries, 5)
+
+    def test_expand(self):
+        response, _ = self.get('/api/core/question/?expand=answers.comments,user.mentor')
+        question = [question for question in response.data['results'] if question['answers']][0]
+        self.assertEqual(list(question['user']), ['id', 'email', 'mentor', 'is_mentor', 'name'])
+        self.assertIn('comments', question['answers'][0])
+        self.assertNotIn('mentor', question['answers'][0]['user'])
+
+        response, _ = self.get('/api/core/question/?expand=answers')
+        for question in response.data['results']:
+            for answer in question['answers'] or []:
+                self.assertNotIn('comments', answer)
+
+    def test_list_matches_serializer(self):
+        for query in ('fields=id,user,answers', 'expand=answers.user.mentor,user.student',
+                      'fields=title,is_upvoted&expand=answers', 'fields=answers&expand=answers.comments'):
+            response, _ = self.get(f'/api/core/question/?page_size=100&{query}')
+            fields, expand = serializers.QuestionSerializer.get_sparse_fieldset(
+                dict(item.split('=') for item in query.split('&'))
+            )
+            questions = Question.objects.order_by('-created_at', '-id')
+            self.assertEqual(JSONRenderer().render(response.data['results']),
+                             self.serialize(questions, fields, expand), query)
+
+    def test_retrieve(self):
+        question = Question.objects.filter(answers__isnull=False).first()
+        response, queries = self.get(f'/api/core/question/{question.pk}/?fields=id,title')
+        self.assertEqual(response.data, {'id': str(question.pk), 'title': question.title})
+        self.assertEqual(queries, 1)
+
+        response, _ = self.get(f'/api/core/question/{question.pk}/?expand=answers')
+        self.assertNotIn('mentor', response.data['user'])
+        self.assertNotIn('comments', response.data['answers'][0])
+
+    def test_invalid(self):
+        self.assertEqual(self.client.get('/api/core/question/?fields=id,secret').status_code, 400)
+        self.assertEqual(self.client.get('/api/core/question/?expand=answers.votes').status_code, 400)
+
+
+class DegreeRecommenderTests(CoreTestCase):
+    """About me answers are ranked against degrees by TF-IDF similarity"""
+
+    def setUp(self):
+        super(DegreeRecommenderTests, self).setUp()
+        self.create_keywords()
+
+    def test_ranking(self):
+        recommender = DegreeRecommender(DegreeKeyword.objects.get_weighted_names())
+        self.assertEqual(
+            recommender.recommend('I love Programming, machine learning and biology!'),
+            [self.degree.id, self.medicine.id, self.physics.id]
+        )
+        # A word shared by two degrees counts for less than one only one has
+        physics = recommender.degree_ids.index(self.physics.id)
+        self.assertGreater(recommender.score('relativity')[physics], recommender.score('machine')[physics])
+        self.assertEqual(recommender.recommend('nothing known here'), [])
+
+    def test_about_me(self):
+        url = f'/api/core/about_me/{self.student.student.pk}/'
+        response = self.client.put(url, {
+            'answer_1': 'I want to help patients', 'answer_2': 'surgery and anatomy',
+            'answer_3': 'contracts'
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([degree['id'] for degree in response.data][:2],
+                         [str(self.medicine.id), str(self.law.id)])
+        student = Student.objects.get(pk=self.student.student.pk)
+        self.assertEqual((student.degree1, student.degree2), (self.medicine, self.law))
+
+        # New keywords are picked up without restarting the worker
+        ingestion.ingest_keywords({self.law.pk: ['rhetoric']})
+        response = self.client.put(url, {'answer_1': 'rhetoric', 'answer_2': '', 'answer_3': ''})
+        self.assertEqual(response.data[0]['id'], str(self.law.id))
+
+        self.assertEqual(self.client.put(url, {'answer_1': 'only one'}).status_code, 400)
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command('bench_recommender', '--degrees', '4', '--keywords', '50', '--words', '10', '--runs', '1',
+                     stdout=out)
+        self.assertIn('Per-word queries:', out.getvalue())
+        self.assertIn('Recommender:', out.getvalue())
+        # The generated degrees are rolled back, and not recommended afterwards
+        self.assertFalse(Degree.objects.filter(name__startswith='Benchmark').exists())
+        recommender = get_recommender()
+        self.assertEqual(set(recommender.degree_ids), set(DegreeKeyword.objects.values_list('degree_id', flat=True)))
+
+
+class RescoreStudentsTests(CoreTestCase):
+    """rescore_students recomputes degrees from the stored about me answers"""
+
+    def setUp(self):
+        super(RescoreStudentsTests, self).setUp()
+        self.create_keywords()
+        self.students = []
+        for index in range(5):
+            student = self.create_student(f'rescored{index}@connectu.ml').student
+            student.about_me_answer_1 = 'surgery' if index % 2 else 'courts'
+            student.about_me_answer_2 = 'anatomy' if index % 2 else 'justice'
+            student.save()
+            self.students.append(student)
+
+    def rescore(self, **options):
+        out = StringIO()
+        call_command('rescore_students', batch_size=2, stdout=out, **options)
+        return out.getvalue()
+
+    def assertRescored(self, students):
+        for index, student in enumerate(students):
+            student.refresh_from_db()
+            self.assertEqual(student.degree1, self.medicine if index % 2 else self.law)
+            self.assertEqual(len({student.degree1_id, student.degree2_id, student.degree3_id}), 3)
+
+    def test_rescore(self):
+        output = self.rescore(workers=1)
+        self.assertIn('Re-scored 5 students in', output)
+        self.assertRescored(self.students)
+        # Students without answers keep their degrees
+        self.assertEqual(Student.objects.get(pk=self.student.student.pk).degree1, self.degree)
+
+    def test_process_pool(self):
+        self.assertIn('Re-scored 5 students in', self.rescore(workers=2))
+        self.assertRescored(self.students)
+
+    def test_resume(self):
+        students = sorted(self.students, key=lambda student: student.pk)
+        output = self.rescore(workers=1, after=str(students[1].pk))
+        self.assertIn('Re-scored 3 students in', output)
+        self.assertEqual(Student.objects.get(pk=students[0].pk).degree1, self.degree)
+
+    def test_unchanged_students_are_not_touched(self):
+        self.assertIn('5 changed', self.rescore(workers=1))
+        updated_at = dict(Student.objects.values_list('pk', 'updated_at'))
+
+        self.assertIn('Re-scored 5 students in', self.rescore(workers=1))
+        self.assertIn('0 changed', self.rescore(workers=1))
+        self.assertEqual(dict(Student.objects.values_list('pk', 'updated_at')), updated_at)
+        self.assertRescored(self.students)
+
+
+class KeywordIngestionTests(CoreTestCase):
+    """Keywords are fetched from a source, normalized and upserted once"""
+
+    def setUp(self):
+        super(KeywordIngestionTests, self).setUp()
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.json_path = self.write('keywords.json', json.dumps({
+            'computer science': ['Programming', 'programming!', 'Machine  Learning', '--'],
+            'Medicine': ['Anatomy', 'Surgery'],
+        }))
+        self.csv_path = self.write('keywords.csv', 'degree,keyword\nComputer Science,Compilers\nLaw,Courts\n')
+
+    def write(self, name, content):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'w') as file:
+            file.write(content)
+        return path
+
+    def keywords(self, degree):
+        return sorted(degree.keywords.values_list('name', flat=True))
+
+    def test_ingest(self):
+        terms = ingestion.FileSource(self.json_path).fetch('Computer Science')
+        self.assertEqual(ingestion.ingest_keywords({self.degree.pk: terms}), 2)
+        self.assertEqual(self.keywords(self.degree), ['machine learning', 'programming'])
+        self.assertEqual(ingestion.ingest_keywords({self.degree.pk: terms + ['Compilers']}), 1)
+
+    def test_admin_ingestion(self):
+        from django.contrib.admin.sites import site
+        from django.test import RequestFactory
+
+        request = RequestFactory().post('/admin/core/degree/add/')
+        request.user = User.objects.create_superuser('admin@connectu.ml', 'password')
+        request._messages = mock.MagicMock()
+        degree = Degree(name='Law')
+        with override_settings(KEYWORD_SOURCE='core.ingestion.FileSource',
+                               KEYWORD_SOURCE_OPTIONS={'path': self.csv_path},
+                               KEYWORD_INGESTION_ASYNC=False):
+            site._registry[Degree].save_model(request, degree, None, False)
+        self.assertEqual(self.keywords(degree), ['courts'])
+
+    def test_background_jobs_are_deduplicated(self):
+        with mock.patch.object(ingestion, '_executor') as executor:
+            ingestion._submit_ingestion(self.degree.pk)
+            ingestion._submit_ingestion(self.degree.pk)
+            executor.submit.assert_called_once_with(ingestion._run_ingestion, self.degree.pk)
+
+            with mock.patch.object(ingestion, 'ingest_degree'), mock.patch.object(ingestion, 'connections'):
+                ingestion._run_ingestion(self.degree.pk)
+            ingestion._submit_ingestion(self.degree.pk)
+            self.assertEqual(executor.submit.call_count, 2)
+        ingestion._pending.clear()
+
+    def test_import_keywords(self):
+        out, err = StringIO(), StringIO()
+        call_command('import_keywords', self.json_path, self.csv_path, stdout=out, stderr=err)
+        self.assertIn('Imported or reweighted 3 keywords for 1 degrees', out.getvalue())
+        self.assertIn('Skipping unknown degree law', err.getvalue())
+        self.assertEqual(self.keywords(self.degree), ['compilers', 'machine learning', 'programming'])
+
+        call_command('import_keywords', self.json_path, self.csv_path, '--create-degrees', stdout=out)
+        self.assertEqual(self.keywords(Degree.objects.get(name='Medicine')), ['anatomy', 'surgery'])
+        self.assertEqual(self.keywords(Degree.objects.get(name='Law')), ['courts'])
+
+
+class KeywordVocabularyTests(CoreTestCase):
+    """Keywords are stored once and linked to degrees with a weight"""
+
+    def setUp(self):
+        super(KeywordVocabularyTests, self).setUp()
+        self.physics = Degree.objects.create(name='Physics')
+        ingestion.ingest_keywords({
+            self.degree.pk: ['Machine Learning', 'programming'],
+            self.physics.pk: [('machine learning', 0.5), ('machines', 1.0)],
+        })
+
+    def test_shared_terms(self):
+        self.assertEqual(Keyword.objects.count(), 3)
+        self.assertEqual(DegreeKeyword.objects.count(), 4)
+        link = DegreeKeyword.objects.get(degree=self.physics, keyword__name='machine learning')
+        self.assertEqual(link.weight, 0.5)
+
+    def test_reweighting(self):
+        with mock.patch.object(ingestion, 'invalidate_matcher') as invalidate_matcher, \
+                mock.patch.object(feed, 'schedule_index') as schedule_index:
+            self.assertEqual(ingestion.ingest_keywords({self.physics.pk: [('machine learning', 0.5)]}), 0)
+            invalidate_matcher.assert_not_called()
+            schedule_index.assert_not_called()
+
+            self.assertEqual(ingestion.ingest_keywords({self.physics.pk: [('machine learning', 2.0)]}), 1)
+            invalidate_matcher.assert_called_once_with()
+            schedule_index.assert_called_once()
+        link = DegreeKeyword.objects.get(degree=self.physics, keyword__name='machine learning')
+        self.assertEqual(link.weight, 2.0)
+        self.assertEqual(DegreeKeyword.objects.count(), 4)
+
+    def test_truncated_terms(self):
+        # Cut at 255 characters, the name would end in a space
+        term = 'a' * 254 + ' programming'
+        self.assertEqual(ingestion.ingest_keywords({self.physics.pk: [term]}), 1)
+        self.assertTrue(Keyword.objects.filter(name='a' * 254).exists())
+
+    def test_lookup(self):
+        def names(queryset):
+            return sorted(queryset.values_list('name', flat=True))
+
+        self.assertEqual(names(Keyword.objects.lookup(['MACHINE learning!'])), ['machine learning'])
+        self.assertEqual(names(Keyword.objects.lookup(['machine'])), [])
+        self.assertEqual(names(Keyword.objects.lookup(['Machine'], prefix=True)),
+                         ['machine learning', 'machines'])
+        self.assertEqual(names(Keyword.objects.lookup(['', '?'], prefix=True)), [])
+
+    @override_settings(QUESTION_FEED_ASYNC=False)
+    def test_question_feed(self):
+        response = self.client.post('/api/core/question/', {'title': 'Where do I start with programming?'})
+        self.assertEqual(response.status_code, 201)
+        question = Question.objects.get(pk=response.data['id'])
+        self.assertEqual(list(question.keywords.values_list('name', flat=True)), ['programming'])
+
+        self.client.force_authenticate(self.mentor)
+        response = self.client.get('/api/core/question/feed/')
+        self.assertEqual([item['id'] for item in response.data['results']], [str(question.pk)])
+
+
+class MentorSamplingTests(CoreTestCase):
+    """Mentor pairs are drawn from cached per-degree pools"""
+
+    def setUp(self):
+        super(MentorSamplingTests, self).setUp()
+        self.law = Degree.objects.create(name='Law')
+        self.lawyer = User.objects.create_user(
+            'lawyer@connectu.ml', 'password', name='Lawyer',
+            mentor=Mentor.objects.create(degree=self.law, points=100)
+        )
+        self.student.student.degree2 = self.law
+        self.student.student.save()
+
+    def pair(self, **params):
+        response = self.client.get('/api/core/mentor_pair/', params)
+        self.assertEqual(response.status_code, 200)
+        return [user['id'] for user in response.data]
+
+    def test_pairs_a_mentor_per_degree(self):
+        self.assertEqual(self.pair(degree1=self.law.pk, degree2=self.degree.pk),
+                         [str(self.lawyer.pk), str(self.mentor.pk)])
+        self.assertEqual(self.pair(degree1=self.degree.pk), [str(self.mentor.pk)])
+        self.assertEqual(self.pair(degree3=uuid.uuid4()), [])
+
+    def test_defaults_to_student_degrees(self):
+        self.assertEqual(self.pair(), [str(self.mentor.pk), str(self.lawyer.pk)])
+
+    def test_invalid_degree(self):
+        response = self.client.get('/api/core/mentor_pair/', {'degree1': 'law'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_mentor(self):
+        self.client.force_authenticate(self.mentor)
+        self.assertEqual(self.pair(degree1=self.degree.pk), [])
+
+    def test_new_mentor_joins_pool(self):
+        self.pair()
+        self.mentor.mentor.degree = self.law
+        self.mentor.mentor.save()
+        self.assertEqual(self.pair(degree1=self.degree.pk), [])
+
+    def test_query_budget(self):
+        def count_queries():
+            self.pair()
+            with CaptureQueriesContext(connection) as context:
+                self.pair()
+            return len(context.captured_queries)
+
+        # Precomputed matches, the student's degrees, the mentors and their universities
+        self.assertEqual(count_queries(), 4)
+        for index in range(5):
+            self.create_mentor(f'other{index}@connectu.ml')
+        self.assertEqual(count_queries(), 4)
+
+    def test_weighted_draws(self):
+        table = sampling.AliasTable([1, 2, 7])
+        rng = random.Random(20)
+        draws = [table.draw(rng) for _ in range(10000)]
+        for index, share in enumerate((0.1, 0.2, 0.7)):
+            self.assertAlmostEqual(draws.count(index) / len(draws), share, delta=0.02)
+
+    def test_weights(self):
+        feedback_form = FeedbackForm.objects.create(student_satisfied_rating=5)
+        Appointment.objects.create(
+            student=self.student.student, mentor=self.mentor.mentor, feedback_form=feedback_form,
+            start_datetime=timezone.now(), end_datetime=timezone.now() + timedelta(hours=1)
+        )
+        pools = sampling.build_pools()
+        self.assertEqual(pools[self.degree.pk].weights, [sampling.get_weight(0, 5)])
+        self.assertEqual(pools[self.law.pk].weights, [sampling.get_weight(100, None)])
+        self.assertEqual(self.pair(degree1=self.law.pk, weighted='true'), [str(self.lawyer.pk)])
+
+
+class MentorMatchingTests(CoreTestCase):
+    """Students are matched in batches without exceeding mentor capacity"""
+
+    def setUp(self):
+        super(MentorMatchingTests, self).setUp()
+        self.law = Degree.objects.create(name='Law')
+        self.elsewhere = University.objects.create(name='LUMS', location='Lahore')
+        self.elsewhere.degrees.add(self.law)
+        self.star = self.create_mentor('star@connectu.ml')
+        Mentor.objects.filter(pk=self.star.mentor_id).update(points=1000)
+        self.lawyer = User.objects.create_user(
+            'lawyer@connectu.ml', 'password', name='Lawyer',
+            mentor=Mentor.objects.create(degree=self.law, university=self.elsewhere)
+        )
+
+    def matches(self, student):
+        return list(MentorMatch.objects.filter(student=student.student).
+                    order_by('rank').values_list('mentor__user__email', flat=True))
+
+    def test_solver(self):
+        rng = random.Random(21)
+        for _ in range(50):
+            rows, columns = rng.randint(1, 4), rng.randint(4, 6)
+            cost = np.array([[rng.randint(-9, 9) for _ in range(columns)] for _ in range(rows)], dtype=float)
+            assignment = matching.solve_assignment(cost)
+            self.assertEqual(len(set(assignment)), rows)
+            self.assertEqual(cost[range(rows), assignment].sum(), min(
+                sum(cost[row, column] for row, column in enumerate(columns_of_rows))
+                for columns_of_rows in itertools.permutations(range(columns), rows)
+            ))
+
+    @override_settings(MENTOR_MATCH_CAPACITY=2, MENTOR_MATCHES_PER_STUDENT=1)
+    def test_capacity(self):
+        students = [self.student] + [self.create_student(f'other{index}@connectu.ml') for index in range(3)]
+        call_command('match_mentors', stdout=StringIO())
+        self.assertEqual([len(self.matches(student)) for student in students], [1, 1, 1, 1])
+        self.assertEqual(sorted(email for student in students for email in self.matches(student)),
+                         ['mentor@connectu.ml'] * 2 + ['star@connectu.ml'] * 2)
+
+    def test_open_appointments_use_capacity(self):
+        for index in range(settings.MENTOR_MATCH_CAPACITY):
+            Appointment.objects.create(
+                student=self.student.student, mentor=self.star.mentor,
+                start_datetime=timezone.now() + timedelta(hours=index),
+                end_datetime=timezone.now() + timedelta(hours=index + 1)
+            )
+        call_command('match_mentors', stdout=StringIO())
+        self.assertEqual(self.matches(self.student), ['mentor@connectu.ml'])
+
+    def test_ranking(self):
+        self.elsewhere.degrees.add(self.degree)
+        call_command('match_mentors', stdout=StringIO())
+        self.assertEqual(self.matches(self.student),
+                         ['star@connectu.ml', 'mentor@connectu.ml', 'lawyer@connectu.ml'])
+
+    def test_pair_serves_matches(self):
+        call_command('match_mentors', stdout=StringIO())
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/core/mentor_pair/')
+        self.assertEqual([user['email'] for user in response.data], ['star@connectu.ml', 'mentor@connectu.ml'])
+        self.assertEqual(len(context.captured_queries), 2)
+
+    def test_changed_degrees_wait_again(self):
+        call_command('match_mentors', stdout=StringIO())
+        self.assertFalse(MentorMatch.objects.get_waiting_students().exists())
+
+        student = self.student.student
+        student.degree1 = student.degree2 = student.degree3 = self.law
+        student.save()
+        self.assertEqual(list(MentorMatch.objects.get_waiting_students()), [student])
+        response = self.client.get('/api/core/mentor_pair/')
+        self.assertEqual([user['email'] for user in response.data], ['lawyer@connectu.ml'])
+
+        call_command('match_mentors', stdout=StringIO())
+        self.assertEqual(self.matches(self.student), ['lawyer@connectu.ml'])
+
+    def test_pair_and_engine_agree_on_stale_matches(self):
+        call_command('match_mentors', stdout=StringIO())
+        student = Student.objects.get(pk=self.student.student_id)
+        # The degrees changed after the engine read them but before it stored the matches
+        MentorMatch.objects.filter(student=student).update(created_at=student.matched_at + timedelta(seconds=2))
+        Student.objects.filter(pk=student.pk).update(
+            degree1=self.law, degree2=self.law, degree3=self.law, updated_at=student.matched_at + timedelta(seconds=1)
+        )
+        self.assertEqual(list(MentorMatch.objects.get_waiting_students()), [student])
+        response = self.client.get('/api/core/mentor_pair/')
+        self.assertEqual([user['email'] for user in response.data], ['lawyer@connectu.ml'])
+
+    def test_unmatched_students_wait_for_a_change(self):
+        physics = Degree.objects.create(name='Physics')
+        student = self.create_student('physicist@connectu.ml').student
+        student.degree1 = student.degree2 = student.degree3 = physics
+        student.save()
+
+        out = StringIO()
+        call_command('match_mentors', stdout=out)
+        self.assertIn('Matched 1 of 2 students', out.getvalue())
+        self.assertEqual(self.matches(student.user), [])
+        # Tried once, so later runs skip the student until their degrees change
+        self.assertFalse(MentorMatch.objects.get_waiting_students().exists())
+        call_command('match_mentors', stdout=out)
+        self.assertIn('Matched 0 of 0 students', out.getvalue())
+
+        student.degree1 = self.law
+        student.save()
+        self.assertEqual(list(MentorMatch.objects.get_waiting_students()), [student])
+
+
+class MentorAvailabilityTests(CoreTestCase):
+    """Appointments are booked into free slots of the mentor's availability"""
+
+    def setUp(self):
+        super(MentorAvailabilityTests, self).setUp()
+        Mentor.objects.filter(pk=self.mentor.mentor_id).update(is_professional=True)
+        self.day = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+        for start, end in ((9, 12), (14, 17), (16, 18)):
+            MentorAvailability.objects.create(mentor=self.mentor.mentor, start_datetime=self.at(start),
+                                              end_datetime=self.at(end))
+        self.book(10, 11)
+
+    def at(self, hour):
+        return self.day + timedelta(hours=hour)
+
+    def book(self, start, end, mentor=None):
+        return Appointment.objects.create(student=self.student.student, mentor=mentor or self.mentor.mentor,
+                                          start_datetime=self.at(start), end_datetime=self.at(end))
+
+    def free_slots(self, start, end, **params):
+        response = self.client.get('/api/core/availability/free_slots/', {
+            'mentor': self.mentor.mentor_id, 'start': self.at(start).isoformat(),
+            'end': self.at(end).isoformat(), **params
+        })
+        self.assertEqual(response.status_code, 200)
+        return [(item['start_datetime'], item['end_datetime']) for item in response.data]
+
+    def slots(self, *hours):
+        field = serializers.serializers.DateTimeField()
+        return [(field.to_representation(self.at(start)), field.to_representation(self.at(end)))
+                for start, end in hours]
+
+    def test_free_slots(self):
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(self.free_slots(8, 20), self.slots((9, 10), (11, 12), (14, 18)))
+        self.assertEqual(len(context.captured_queries), 1)
+        self.assertEqual(self.free_slots(11, 15), self.slots((11, 12), (14, 15)))
+        self.assertEqual(self.free_slots(8, 20, duration=90), self.slots((14, 18)))
+
+    def test_free_slots_without_availability(self):
+        MentorAvailability.objects.all().delete()
+        self.assertEqual(self.free_slots(8, 20), self.slots((8, 10), (11, 20)))
+
+    def test_free_slots_errors(self):
+        response = self.client.get('/api/core/availability/free_slots/', {
+            'mentor': uuid.uuid4(), 'start': self.at(8).isoformat(), 'end': self.at(9).isoformat()
+        })
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get('/api/core/availability/free_slots/', {
+            'mentor': self.mentor.mentor_id, 'start': self.at(9).isoformat(), 'end': self.at(8).isoformat()
+        })
+        self.assertEqual(response.status_code, 400)
+
+    def test_booking(self):
+        def post(start, end):
+            return self.client.post('/api/core/appointment/', {
+                'mentor': self.mentor.mentor_id, 'start_datetime': self.at(start).isoformat(),
+                'end_datetime': self.at(end).isoformat()
+            }).status_code
+
+        self.assertEqual(post(11, 12), 201)
+        self.assertEqual(post(9, 10), 201)
+        self.assertEqual(post(14, 18), 201)
+        self.assertEqual(post(9, 10), 409)
+        self.assertEqual(post(12, 13), 409)
+        self.assertEqual(post(20, 19), 400)
+
+    def test_database_rejects_overlaps(self):
+        other = self.create_mentor('other@connectu.ml')
+        self.book(10, 11, mentor=other.mentor)
+        for start, end in ((9, 11), (10, 11), (10.5, 10.75), (10.5, 12)):
+            with self.assertRaises(IntegrityError), transaction.atomic():
+                self.book(start, end)
+
+        appointment = self.book(11, 12)
+        appointment.start_datetime = self.at(10.5)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            appointment.save()
+
+    def test_mentor_windows(self):
+        data = {'start_datetime': self.at(20).isoformat(), 'end_datetime': self.at(21).isoformat()}
+        self.assertEqual(self.client.post('/api/core/availability/', data).status_code, 403)
+
+        self.client.force_authenticate(self.mentor)
+        response = self.client.post('/api/core/availability/', data)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['mentor'], self.mentor.mentor_id)
+        self.assertEqual(len(self.client.get('/api/core/availability/').data), 4)
+
+
+class MentorStatsTests(CoreTestCase):
+    """Mentor stats follow sessions and feedback and match a rebuild"""
+
+    def setUp(self):
+        super(MentorStatsTests, self).setUp()
+        self.appointment = Appointment.objects.create(
+            student=self.student.student, mentor=self.mentor.mentor, price=100,
+            start_datetime=timezone.now(), end_datetime=timezone.now() + timedelta(hours=1)
+        )
+        self.session = PairSession.objects.create(
+            student=self.student.student, mentor=self.mentor.mentor, price=50, url='meet.jit.si/session'
+        )
+
+    def stats(self, mentor_id=None, user=None):
+        self.client.force_authenticate(user or self.mentor)
+        response = self.client.get(f'/api/core/mentor/{mentor_id or self.mentor.mentor_id}/stats/')
+        self.client.force_authenticate(self.student)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def give_feedback(self, feedback_form, **data):
+        response = self.client.post('/api/core/feedback/', {'feedback_form': feedback_form.pk, **data})
+        self.assertEqual(response.status_code, 200)
+
+    def assertRebuildMatches(self):
+        def values():
+            return list(MentorStats.objects.order_by('mentor_id').values_list(
+                'mentor_id', *MentorStats.objects.FIELDS
+            ))
+
+        incremental = values()
+        call_command('rebuild_mentor_stats', stdout=StringIO())
+        self.assertEqual(values(), incremental)
+
+    def test_sessions_and_feedback(self):
+        self.give_feedback(self.appointment.feedback_form, student_satisfied_rating=4, has_student_reported=True)
+        self.give_feedback(self.session.feedback_session, student_satisfied_rating=5)
+        self.give_feedback(self.appointment.feedback_form, student_satisfied_rating=1)
+
+        with CaptureQueriesContext(connection) as context:
+            stats = self.stats()
+        self.assertEqual(len(context.captured_queries), 1)
+        self.assertEqual((stats['session_count'], stats['revenue'], stats['rating_count'], stats['average_rating'],
+                          stats['report_count'], stats['report_rate']), (2, 150, 2, 3, 1, 0.5))
+        self.assertRebuildMatches()
+
+    def test_deleted_sessions(self):
+        self.give_feedback(self.session.feedback_session, student_satisfied_rating=5, has_student_reported=True)
+        self.session.delete()
+        stats = self.stats()
+        self.assertEqual((stats['session_count'], stats['revenue'], stats['rating_count'], stats['report_count']),
+                         (1, 100, 0, 0))
+        self.assertRebuildMatches()
+
+        self.mentor.mentor.delete()
+        self.assertFalse(MentorStats.objects.exists())
+
+    def test_missing_stats(self):
+        other = self.create_mentor('other@connectu.ml')
+        self.assertEqual(self.stats(other.mentor_id)['session_count'], 0)
+        self.assertEqual(self.client.get(f'/api/core/mentor/{uuid.uuid4()}/stats/').status_code, 404)
+        self.assertEqual(self.client.get('/api/core/mentor/mentor/stats/').status_code, 404)
+
+    def test_revenue_for_mentor_and_staff(self):
+        self.assertEqual(self.stats()['revenue'], 150)
+        self.assertNotIn('revenue', self.stats(user=self.student))
+        self.assertNotIn('revenue', self.stats(user=self.create_mentor('other@connectu.ml')))
+        admin = User.objects.create_superuser('admin@connectu.ml', 'password')
+        self.assertEqual(self.stats(user=admin)['revenue'], 150)
+
+    def test_row_created_concurrently(self):
+        MentorStats.objects.all().delete()
+        # The update finds no row, then another transaction creates it before ours does
+        original_filter = MentorStats.objects.filter
+
+        def filter(*args, **kwargs):
+            queryset = original_filter(*args, **kwargs)
+            if not MentorStats.objects.exists():
+                MentorStats.objects.create(mentor=self.mentor.mentor, session_count=1, revenue=100)
+                queryset = original_filter(pk__in=[])
+            return queryset
+
+        with mock.patch.object(MentorStats.objects, 'filter', side_effect=filter):
+            with transaction.atomic():
+                MentorStats.objects.apply(self.mentor.mentor_id, session_count=1, revenue=50)
+        self.assertEqual(self.stats()['session_count'], 2)
+        self.assertEqual(self.stats()['revenue'], 150)
+
+    def test_resubmitted_feedback(self):
+        feedback_form = self.appointment.feedback_form
+        for rating, reported in ((2, True), (4, False), (5, True), (3, False)):
+            self.give_feedback(feedback_form, student_satisfied_rating=rating, has_student_reported=reported)
+        stats = self.stats()
+        self.assertEqual((stats['rating_count'], stats['average_rating'], stats['report_count']), (1, 3, 0))
+        self.assertRebuildMatches()
+
+
+class ReminderSchedulerTests(CoreTestCase):
+    """Reminders and feedback prompts are sent once each, even across restarts"""
+
+    def setUp(self):
+        super(ReminderSchedulerTests, self).setUp()
+        self.now = timezone.now()
+        self.soon = self.book(10, 50)
+        self.ended = self.book(-70, -10)
+        self.later = self.book(180, 240)
+
+    def book(self, start, end, mentor=None):
+        return Appointment.objects.create(
+            student=self.student.student, mentor=mentor or self.mentor.mentor,
+            start_datetime=self.now + timedelta(minutes=start), end_datetime=self.now + timedelta(minutes=end)
+        )
+
+    def sent(self):
+        return sorted(Notification.objects.filter(appointment__isnull=False).
+                      values_list('appointment_id', 'kind', 'user_id'))
+
+    def expected(self, *deadlines):
+        return sorted((appointment.pk, kind, user.pk) for appointment, kind in deadlines
+                      for user in (appointment.mentor.user, self.student))
+
+    def test_due_and_restart(self):
+        scheduler = reminders.ReminderScheduler(self.now)
+        scheduler.refill(self.now)
+        # The ended appointment's reminder is due too, but dropped as it started
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(scheduler.send_due(self.now), 3)
+        self.assertEqual(len(context.captured_queries), 2)
+        self.assertEqual(self.sent(), self.expected((self.soon, Notification.REMINDER),
+                                                    (self.ended, Notification.FEEDBACK_PROMPT)))
+
+        # The soon appointment ends within the lookahead, the later one starts after it
+        self.assertEqual(len(scheduler), 1)
+        self.assertEqual(scheduler.next_due(), self.soon.end_datetime)
+
+        call_command('send_reminders', '--once', stdout=StringIO())
+        self.assertEqual(len(self.sent()), 4)
+
+    def test_late_and_moved_bookings(self):
+        scheduler = reminders.ReminderScheduler(self.now)
+        scheduler.refill(self.now)
+        scheduler.send_due(self.now)
+
+        other = self.create_mentor('other@connectu.ml').mentor
+        moved = self.book(30, 40, other)
+        late = self.book(5, 8, other)
+        scheduler.refill(self.now)
+        Appointment.objects.filter(pk=moved.pk).update(
+            start_datetime=self.now + timedelta(minutes=300), end_datetime=self.now + timedelta(minutes=310),
+            updated_at=timezone.now()
+        )
+        late.delete()
+
+        scheduler.send_due(self.now + timedelta(minutes=20))
+        self.assertEqual(self.sent(), self.expected((self.soon, Notification.REMINDER),
+                                                    (self.ended, Notification.FEEDBACK_PROMPT)))
+
+        scheduler.refill(self.now + timedelta(minutes=150))
+        scheduler.send_due(self.now + timedelta(minutes=170))
+        scheduler.refill(self.now + timedelta(minutes=240))
+        scheduler.send_due(self.now + timedelta(minutes=290))
+        self.assertEqual(self.sent(), self.expected(
+            (self.soon, Notification.REMINDER), (self.soon, Notification.FEEDBACK_PROMPT),
+            (self.ended, Notification.FEEDBACK_PROMPT),
+            (self.later, Notification.REMINDER), (self.later, Notification.FEEDBACK_PROMPT),
+            (moved, Notification.REMINDER),
+        ))
+
+
+class CalendarFeedTests(CoreTestCase):
+    """Calendar clients poll a streamed, conditional feed from a secret URL"""
+
+    def setUp(self):
+        super(CalendarFeedTests, self).setUp()
+        self.client.force_authenticate(self.mentor)
+        now = timezone.now()
+        self.appointments = [
+            Appointment.objects.create(
+                student=self.student.student, mentor=self.mentor.mentor, url=f'meet.jit.si/{hours}',
+                start_datetime=now + timedelta(hours=hours), end_datetime=now + timedelta(hours=hours + 1)
+            )
+            for hours in (-24 * 365, 2, 26)
+        ]
+        self.url = self.client.get('/api/core/appointment/calendar/').data['url']
+        self.path = self.url[len('http://testserver'):]
+        self.client.force_authenticate(None)
+
+    def fetch(self, **headers):
+        response = self.client.get(self.path, **headers)
+        content = b''.join(response.streaming_content) if response.status_code == 200 else b''
+        return response, content.decode('utf-8')
+
+    def test_feed(self):
+        with CaptureQueriesContext(connection) as context:
+            response, content = self.fetch()
+        self.assertEqual(len(context.captured_queries), 3)
+        self.assertEqual(response['Content-Type'], 'text/calendar; charset=utf-8')
+        lines = content.split('\r\n')
+        self.assertEqual((lines[0], lines[-2], lines[-1]), ('BEGIN:VCALENDAR', 'END:VCALENDAR', ''))
+        # Appointments that ended long ago are left out
+        self.assertEqual([line for line in lines if line.startswith('UID:')],
+                         [f'UID:{appointment.pk}@connectu' for appointment in self.appointments[1:]])
+        self.assertIn(f'SUMMARY:Appointment with {self.student.name}', lines)
+
+    def test_conditional_get(self):
+        response, _ = self.fetch()
+        self.assertEqual(self.fetch(HTTP_IF_NONE_MATCH=response['ETag'])[0].status_code, 304)
+
+        self.appointments[1].url = 'meet.jit.si/moved'
+        self.appointments[1].save()
+        response, content = self.fetch(HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('LOCATION:meet.jit.si/moved', content)
+
+    def test_tokens(self):
+        self.client.force_authenticate(self.mentor)
+        self.assertEqual(self.client.get('/api/core/appointment/calendar/').data['url'], self.url)
+        url = self.client.post('/api/core/appointment/calendar/').data['url']
+        self.assertNotEqual(url, self.url)
+        self.client.force_authenticate(None)
+
+        self.assertEqual(self.fetch()[0].status_code, 404)
+        self.assertEqual(self.client.get(url[len('http://testserver'):]).status_code, 200)
+        self.assertEqual(self.client.post(url[len('http://testserver'):]).status_code, 405)
+
+    def test_fold(self):
+        line = 'SUMMARY:' + 'é' * 100
+        folded = ical.fold(line)
+        self.assertTrue(all(len(part) <= 75 for part in folded.split(b'\r\n')))
+        self.assertEqual(folded.replace(b'\r\n ', b'').decode('utf-8'), line + '\r\n')
+        self.assertEqual(ical.escape('a;b,c\\d\ne'), 'a\\;b\\,c\\\\d\\ne')
@@ -15,13 +15,18 @@ router.register(r'upvote', views.UpvotesViewSet, basename='upvote')
 router.register(r'session', views.PairSessionViewSet, basename='session')
 router.register(r'feedback', views.FeedbackFormViewSet, basename='feedback')
 router.register(r'appointment', views.AppointmentViewSet, basename='appointment')
+router.register(r'availability', views.MentorAvailabilityViewSet, basename='availability')
 router.register(r'about_me', views.AboutMeViewSet, basename='about_me')
+router.register(r'mentor', views.MentorViewSet, basename='mentor')
 router.register(r'mentor_pair', views.MentorPairStudentViewSet, basename='mentor_pair')
 router.register(r'notification', views.NotificationViewSet, basename='notification')
+router.register(r'leaderboard', views.LeaderboardViewSet, basename='leaderboard')
+router.register(r'search', views.SearchViewSet, basename='search')
 
 app_name = 'core'
 
 urlpatterns = [
     path('token/', views.AuthTokenViewSet.as_view(), name='auth-token'),
+    path('calendar/<str:token>.ics', views.appointment_calendar, name='appointment-calendar'),
     path('core/', include(router.urls)),
 ]
@@ -1,19 +1,36 @@
+from django.conf import settings
 from django.contrib.auth.models import AnonymousUser
-from django.db.models import Count
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q, Case, When, Value, IntegerField
+from django.http import Http404, StreamingHttpResponse
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition, require_safe
 
 from rest_framework.authtoken.views import ObtainAuthToken
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework.settings import api_settings
 
 from rest_framework.authentication import TokenAuthentication
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, SAFE_METHODS
 from rest_framework import viewsets, mixins, status
 
-from . import serializers
+from . import serializers, pagination, flat, ical, feed
+from .conditional import conditional_list, get_validators, get_question_list_querysets, \
+    get_notification_list_querysets, get_university_list_querysets, get_calendar_querysets
+from .keywords import get_matcher
+from .recommender import recommend_degrees
+from .sampling import sample_mentors
 from .models import Question, Answer, Comment, Upvote, \
-    User, PairSession, Mentor, FeedbackForm, Appointment, Degree, Student, Keyword, University, Notification
+    User, PairSession, Mentor, FeedbackForm, Appointment, Degree, Student, University, Notification, \
+    PointsEntry, LeaderboardEntry, SearchDocument, MentorAvailability, \
+    MentorStats
 
 import uuid
+from datetime import timedelta
 
 
 class UniversityViewSet(viewsets.GenericViewSet,
@@ -25,7 +42,11 @@ class UniversityViewSet(viewsets.GenericViewSet,
 
     serializer_class = serializers.UniversitySerializer
 
-    queryset = University.objects.all()
+    queryset = serializers.UniversitySerializer.setup_eager_loading(University.objects.all())
+
+    @conditional_list(get_university_list_querysets)
+    def list(self, request, *args, **kwargs):
+        return super(UniversityViewSet, self).list(request, *args, **kwargs)
 
 
 class AuthTokenViewSet(ObtainAuthToken):
@@ -60,7 +81,7 @@ class UserDetailViewSet(viewsets.ModelViewSet):
 
     serializer_class = serializers.UserSerializer
 
-    queryset = User.objects.all()
+    queryset = serializers.UserSerializer.setup_eager_loading(User.objects.all())
 
     def get_serializer_context(self):
         """Returning context"""
@@ -92,6 +113,8 @@ class QuestionDetailViewSet(viewsets.ModelViewSet):
 
     queryset = Question.objects.all()
 
+    pagination_class = pagination.QuestionPagination
+
     def get_serializer_context(self):
         """Returning context"""
         return {
@@ -104,18 +127,68 @@ class QuestionDetailViewSet(viewsets.ModelViewSet):
         """Enforcing Scope"""
         user = self.request.user
         queryset = super(QuestionDetailViewSet, self).get_queryset()
-        if user.is_mentor:
-            queryset.all()
-            # TODO: filtering on the basis of keywords
-        elif not user.is_mentor:
+        if not user.is_mentor:
             queryset.filter(user=user).all()
-        return queryset.order_by('-created_at')
+        return serializers.QuestionSerializer.setup_eager_loading(
+            queryset.order_by('-created_at', '-id'), *self.get_sparse_fieldset()
+        )
+
+    def get_sparse_fieldset(self):
+        """Returning the fields and expand tree requested for reads"""
+        if self.request.method not in SAFE_METHODS:
+            return None, None
+        return serializers.QuestionSerializer.get_sparse_fieldset(self.request.query_params)
+
+    def get_serializer(self, *args, **kwargs):
+        """Rendering only the requested fields"""
+        kwargs['fields'], kwargs['expand'] = self.get_sparse_fieldset()
+        return super(QuestionDetailViewSet, self).get_serializer(*args, **kwargs)
+
+    @conditional_list(get_question_list_querysets, per_user=True)
+    def list(self, request, *args, **kwargs):
+        """Serving the list from flat rows instead of nested serializers"""
+        queryset = self.get_queryset().prefetch_related(None).values(*flat.QUESTION_FIELDS)
+        page = self.paginate_queryset(queryset)
+        return self.get_paginated_response(
+            flat.serialize_questions(page, request.user, *self.get_sparse_fieldset())
+        )
+
+    def tag_keywords(self, question):
+        """Tagging keywords found in the question and rescoring its feed entries"""
+        keyword_ids = get_matcher().match(f'{question.title} {question.text}')
+        Question.keywords.through.objects.filter(question_id=question.id).delete()
+        Question.keywords.through.objects.bulk_create([
+            Question.keywords.through(question_id=question.id, keyword_id=keyword_id)
+            for keyword_id in keyword_ids
+        ])
+        feed.schedule_index(feed.QUESTION, [question.pk])
 
     def perform_create(self, serializer):
-        """Updating keywords"""
-        text = self.request.data.get('text')
-        # TODO: use this text for converting to keywords
-        serializer.save(user=self.request.user)
+        """Tagging keywords found in the question"""
+        self.tag_keywords(serializer.save(user=self.request.user))
+
+    def perform_update(self, serializer):
+        """Retagging keywords after editing the question"""
+        self.tag_keywords(serializer.save())
+
+    @action(detail=False, methods=['get'])
+    def feed(self, request, *args, **kwargs):
+        """Questions ranked by keyword overlap with the mentor, then recency"""
+        user = self.request.user
+        if not user.is_mentor:
+            return Response('Only mentors have a question feed', status=status.HTTP_403_FORBIDDEN)
+
+        queryset = Question.objects.filter(feed_entries__user=user).annotate(
+            feed_score=F('feed_entries__score'),
+            feed_created_at=F('feed_entries__created_at')
+        )
+        paginator = pagination.QuestionFeedPagination()
+        page = paginator.paginate_queryset(
+            serializers.QuestionSerializer.setup_eager_loading(queryset, *self.get_sparse_fieldset()),
+            request, view=self
+        )
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
 
 
 class AnswerDetailViewSet(viewsets.ModelViewSet):
@@ -129,6 +202,8 @@ class AnswerDetailViewSet(viewsets.ModelViewSet):
 
     queryset = Answer.objects.all()
 
+    pagination_class = pagination.AnswerPagination
+
     def get_serializer_context(self):
         """Returning context"""
         return {
@@ -145,7 +220,15 @@ class AnswerDetailViewSet(viewsets.ModelViewSet):
             queryset.filter(user=user)
         elif not user.is_mentor:
             queryset.filter(question__user=user).all()
-        return queryset.order_by('-created_at')
+        return serializers.AnswerSerializer.setup_eager_loading(
+            queryset.order_by('-created_at', '-id')
+        )
+
+    def list(self, request, *args, **kwargs):
+        """Serving the list from flat rows instead of nested serializers"""
+        queryset = self.get_queryset().prefetch_related(None).values(*flat.ANSWER_FIELDS)
+        page = self.paginate_queryset(queryset)
+        return self.get_paginated_response(flat.serialize_answers(page, request.user))
 
     def perform_create(self, serializer):
         """Updating user"""
@@ -172,7 +255,9 @@ class CommentDetailViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(user=user) | queryset.filter(answer__user=user)
         elif not user.is_mentor:
             queryset.filter(user=user) | queryset.filter(answer__question__user=user)
-        return queryset.order_by('-create_at')
+        return serializers.CommentSerializer.setup_eager_loading(
+            queryset.order_by('-created_at')
+        )
 
     def perform_create(self, serializer):
         """Updating user"""
@@ -191,7 +276,7 @@ class UpvotesViewSet(viewsets.GenericViewSet,
 
     queryset = Upvote.objects.all()
 
-    is_answer = False
+    max_bulk_size = 500
 
     def get_queryset(self):
         """Getting required viewset"""
@@ -199,38 +284,149 @@ class UpvotesViewSet(viewsets.GenericViewSet,
         return super(UpvotesViewSet, self).get_queryset().filter(user=user)
 
     def get_object(self):
-        """Getting the object to update"""
-        queryset = self.get_queryset()
+        """Getting the question or answer being voted on"""
         answer_id = self.request.data.get('answer', None)
         question_id = self.request.data.get('question', None)
         if answer_id is not None:
-            self.is_answer = True
-            queryset = queryset.filter(answer__id=answer_id)
+            return Answer.objects.select_related('user__mentor'). \
+                filter(id=answer_id).first()
         elif question_id is not None:
-            queryset = queryset.filter(question__id=question_id)
+            return Question.objects.select_related('user__mentor'). \
+                filter(id=question_id).first()
         else:
             return None
-        return queryset.first()
 
     def create(self, request, *args, **kwargs):
-        upvote = self.get_object()
-        if upvote is not None:
-            upvote.has_upvoted = self.request.data.get('has_upvoted')
-            if self.is_answer:
-                user = upvote.answer.user
-            else:
-                user = upvote.question.user
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        has_upvoted = serializer.validated_data.get('has_upvoted', False)
 
-            if upvote.has_upvoted:
-                if user.is_mentor:
-                    user.mentor.points += 5
-                    user.mentor.save()
+        target = self.get_object()
+        if target is not None:
+            with transaction.atomic():
+                if isinstance(target, Answer):
+                    changed = Upvote.objects.toggle(request.user, has_upvoted, answer=target)
+                else:
+                    changed = Upvote.objects.toggle(request.user, has_upvoted, question=target)
+
+                if changed:
+                    delta = 1 if has_upvoted else -1
+                    type(target).objects.filter(pk=target.pk).update(
+                        upvotes_count=F('upvotes_count') + delta, updated_at=timezone.now()
+                    )
+
+                user = target.user
+                if changed and user.is_mentor:
+                    PointsEntry.objects.award(
+                        user.mentor, PointsEntry.UPVOTE, 5 if has_upvoted else -5,
+                        **{target._meta.model_name: target}
+                    )
 
-            upvote.save()
             return Response('Upvote updated', status=status.HTTP_200_OK)
         else:
             return Response('Provide answer or question', status=status.HTTP_400_BAD_REQUEST)
 
+    def get_existing_votes(self, targets):
+        """Lock and return the (id, has_upvoted) by target of the user's stored votes on targets"""
+        existing = {}
+        upvotes = Upvote.objects.select_for_update().filter(
+            Q(question_id__in=[target_id for field, target_id in targets if field == 'question']) |
+            Q(answer_id__in=[target_id for field, target_id in targets if field == 'answer']),
+            user=self.request.user
+        ).values_list('id', 'question_id', 'answer_id', 'has_upvoted')
+        for upvote_id, question_id, answer_id, has_upvoted in upvotes:
+            target = ('question', question_id) if question_id is not None else ('answer', answer_id)
+            existing[target] = (upvote_id, has_upvoted)
+        return existing
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request, *args, **kwargs):
+        """Apply a batch of votes in one transaction, with queries per model and leaderboard rather than per vote"""
+        if not isinstance(request.data, list):
+            return Response('Provide a list of votes', status=status.HTTP_400_BAD_REQUEST)
+        if len(request.data) > self.max_bulk_size:
+            return Response(f'Provide at most {self.max_bulk_size} votes',
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        results = [{'index': index, 'status': 'invalid'} for index in range(len(request.data))]
+
+        # The last vote on a target decides its final state
+        votes = {}
+        for index, item in enumerate(request.data):
+            item_serializer = serializers.BulkUpvoteItemSerializer(data=item)
+            if not item_serializer.is_valid():
+                continue
+            data = item_serializer.validated_data
+            target = ('answer', data['answer']) if 'answer' in data else ('question', data['question'])
+            if target in votes:
+                results[votes[target][0]]['status'] = 'superseded'
+            votes[target] = (index, data['has_upvoted'])
+
+        with transaction.atomic():
+            authors = {}
+            for model in (Question, Answer):
+                target_field = model._meta.model_name
+                ids = [target_id for field, target_id in votes if field == target_field]
+                for target_id, mentor_id in model.objects.filter(id__in=ids). \
+                        values_list('id', 'user__mentor_id'):
+                    authors[(target_field, target_id)] = mentor_id
+
+            existing = self.get_existing_votes(authors)
+            created, set_true, set_false, changes = [], [], [], []
+            for target, (index, has_upvoted) in votes.items():
+                if target not in authors:
+                    results[index]['status'] = 'not_found'
+                    continue
+
+                upvote_id, was_upvoted = existing.get(target, (None, False))
+                if has_upvoted == was_upvoted:
+                    results[index]['status'] = 'unchanged'
+                    continue
+
+                if upvote_id is None:
+                    upvote = Upvote(user=request.user, has_upvoted=True, **{target[0] + '_id': target[1]})
+                    created.append(upvote)
+                    upvote_id = upvote.id
+                elif has_upvoted:
+                    set_true.append(upvote_id)
+                else:
+                    set_false.append(upvote_id)
+                changes.append((target, index, has_upvoted, upvote_id))
+
+            # Rows that did not exist could not be locked, so a concurrent
+            # upvote may have inserted one since; it already counted that vote
+            Upvote.objects.bulk_create(created, ignore_conflicts=True)
+            inserted = set(Upvote.objects.filter(id__in=[upvote.id for upvote in created]).
+                           values_list('id', flat=True))
+            lost = {upvote.id for upvote in created} - inserted
+
+            now = timezone.now()
+            Upvote.objects.filter(id__in=set_true).update(has_upvoted=True, updated_at=now)
+            Upvote.objects.filter(id__in=set_false).update(has_upvoted=False, updated_at=now)
+
+            counts, points = {}, []
+            for target, index, has_upvoted, upvote_id in changes:
+                if upvote_id in lost:
+                    results[index]['status'] = 'unchanged'
+                    continue
+                delta = 1 if has_upvoted else -1
+                counts.setdefault((target[0], delta), []).append(target[1])
+                if authors[target] is not None:
+                    points.append(PointsEntry(
+                        mentor_id=authors[target], reason=PointsEntry.UPVOTE,
+                        delta=5 * delta, **{target[0] + '_id': target[1]}
+                    ))
+                results[index]['status'] = 'updated'
+
+            for (target_field, delta), ids in counts.items():
+                model = Answer if target_field == 'answer' else Question
+                model.objects.filter(id__in=ids).update(
+                    upvotes_count=F('upvotes_count') + delta, updated_at=now
+                )
+            PointsEntry.objects.bulk_award(points)
+
+        return Response(results, status=status.HTTP_200_OK)
+
 
 class PairSessionViewSet(viewsets.GenericViewSet,
                          mixins.CreateModelMixin):
@@ -275,51 +471,59 @@ class FeedbackFormViewSet(viewsets.GenericViewSet,
     queryset = FeedbackForm.objects.all()
 
     def get_object(self):
-        """Getting the object to update"""
+        """Getting the object to update, locked until the transaction ends"""
         feedback_form_id = self.request.data.get('feedback_form')
         if feedback_form_id is not None:
-            return FeedbackForm.objects.get(id=feedback_form_id)
+            return FeedbackForm.objects.select_for_update().get(id=feedback_form_id)
         else:
             return None
 
     def create(self, request, *args, **kwargs):
-        feedback_obj = self.get_object()
-        if feedback_obj is not None:
-
-            student_satisfied_rating = self.request.data.get('student_satisfied_rating', None)
-            mentor_satisfied_rating = self.request.data.get('mentor_satisfied_rating', None)
-            has_student_reported = self.request.data.get('has_student_reported', None)
-            has_mentor_reported = self.request.data.get('has_mentor_reported', None)
-            student_comment = self.request.data.get('student_comment', None)
-            mentor_comment = self.request.data.get('mentor_comment', None)
-            if student_satisfied_rating is not None:
-                feedback_obj.student_satisfied_rating = student_satisfied_rating
-            if mentor_satisfied_rating is not None:
-                feedback_obj.mentor_satisfied_rating = mentor_satisfied_rating
-            if has_student_reported is not None:
-                feedback_obj.has_student_reported = has_student_reported
-            if has_mentor_reported is not None:
-                feedback_obj.has_mentor_reported = has_mentor_reported
-            if student_comment is not None:
-                feedback_obj.student_comment = student_comment
-            if mentor_comment is not None:
-                feedback_obj.mentor_comment = mentor_comment
-
-            user = self.request.user
-            if user.is_mentor:
-                pair_session = PairSession.objects.filter(feedback_session=feedback_obj).first()
-                Notification.objects.create(
-                    user=pair_session.student.user,
-                    title=f'Give feedback form for mentoring session with {user.name}',
-                    feedback_form=feedback_obj
-                )
-                user.mentor.points += 50
-                user.mentor.save()
-
-            feedback_obj.save()
-            return Response('Feedback form updated', status=status.HTTP_200_OK)
-        else:
-            return Response('Provide feedback form id', status=status.HTTP_400_BAD_REQUEST)
+        # Concurrent submissions of a form wait for the lock in get_object, so
+        # each one moves the stats from the feedback the previous one saved
+        with transaction.atomic():
+            feedback_obj = self.get_object()
+            if feedback_obj is not None:
+                previous_rating = feedback_obj.student_satisfied_rating
+                was_reported = feedback_obj.has_student_reported
+
+                student_satisfied_rating = self.request.data.get('student_satisfied_rating', None)
+                mentor_satisfied_rating = self.request.data.get('mentor_satisfied_rating', None)
+                has_student_reported = self.request.data.get('has_student_reported', None)
+                has_mentor_reported = self.request.data.get('has_mentor_reported', None)
+                student_comment = self.request.data.get('student_comment', None)
+                mentor_comment = self.request.data.get('mentor_comment', None)
+                if student_satisfied_rating is not None:
+                    feedback_obj.student_satisfied_rating = student_satisfied_rating
+                if mentor_satisfied_rating is not None:
+                    feedback_obj.mentor_satisfied_rating = mentor_satisfied_rating
+                if has_student_reported is not None:
+                    feedback_obj.has_student_reported = has_student_reported
+                if has_mentor_reported is not None:
+                    feedback_obj.has_mentor_reported = has_mentor_reported
+                if student_comment is not None:
+                    feedback_obj.student_comment = student_comment
+                if mentor_comment is not None:
+                    feedback_obj.mentor_comment = mentor_comment
+
+                user = self.request.user
+                if user.is_mentor:
+                    pair_session = PairSession.objects.filter(feedback_session=feedback_obj).first()
+                    Notification.objects.create(
+                        user=pair_session.student.user,
+                        title=f'Give feedback form for mentoring session with {user.name}',
+                        feedback_form=feedback_obj
+                    )
+                    PointsEntry.objects.award(
+                        user.mentor, PointsEntry.FEEDBACK, 50,
+                        feedback_form=feedback_obj
+                    )
+
+                feedback_obj.save()
+                MentorStats.objects.record_feedback(feedback_obj, previous_rating, was_reported)
+                return Response('Feedback form updated', status=status.HTTP_200_OK)
+            else:
+                return Response('Provide feedback form id', status=status.HTTP_400_BAD_REQUEST)
 
 
 class AppointmentViewSet(viewsets.GenericViewSet,
@@ -335,6 +539,8 @@ class AppointmentViewSet(viewsets.GenericViewSet,
 
     queryset = Appointment.objects.all()
 
+    pagination_class = pagination.AppointmentPagination
+
     def get_queryset(self):
         """Enforcing scope"""
         user = self.request.user
@@ -343,7 +549,7 @@ class AppointmentViewSet(viewsets.GenericViewSet,
             queryset.filter(mentor=user.mentor).all()
         else:
             queryset.filter(student=user.mentor).all()
-        return queryset.order_by('-created_at')
+        return queryset.order_by('-created_at', '-id')
 
     def create(self, request, *args, **kwargs):
         """Overriding create method for custom response"""
@@ -353,10 +559,21 @@ class AppointmentViewSet(viewsets.GenericViewSet,
         mentor = Mentor.objects.filter(id=mentor_id).first()
         if mentor is not None:
             if mentor.is_professional:
-                serializer.save(
-                    student=self.request.user.student,
-                    mentor=mentor, url=f'meet.jit.si/connectu.ml/{str(uuid.uuid4())}',
-                )
+                start = serializer.validated_data['start_datetime']
+                end = serializer.validated_data['end_datetime']
+                if not MentorAvailability.objects.is_free(mentor.pk, start, end):
+                    return Response({'Message': 'Mentor is not free then'},
+                                    status=status.HTTP_409_CONFLICT)
+                # The database rejects overlaps that slipped in since the check
+                try:
+                    with transaction.atomic():
+                        serializer.save(
+                            student=self.request.user.student,
+                            mentor=mentor, url=f'meet.jit.si/connectu.ml/{str(uuid.uuid4())}',
+                        )
+                except IntegrityError:
+                    return Response({'Message': 'Mentor is not free then'},
+                                    status=status.HTTP_409_CONFLICT)
                 return Response(serializer.data, status=status.HTTP_201_CREATED)
             else:
                 return Response({'Message': 'Cannot register appointment'},
@@ -365,6 +582,116 @@ class AppointmentViewSet(viewsets.GenericViewSet,
             return Response({'Message': 'Provide mentor id'},
                             status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=False, methods=['get', 'post'])
+    def calendar(self, request, *args, **kwargs):
+        """URL of the user's appointment calendar feed, posting replaces it to revoke the old one"""
+        user = self.request.user
+        if user.calendar_token is None or request.method == 'POST':
+            user.calendar_token = ical.generate_token()
+            user.save(update_fields=['calendar_token'])
+        return Response({'url': request.build_absolute_uri(
+            reverse('core:appointment-calendar', args=[user.calendar_token])
+        )})
+
+
+def get_calendar_feed(request, token):
+    """Return the user and appointments of a calendar token, once per request, or None"""
+    if not hasattr(request, '_calendar_feed'):
+        user = User.objects.filter(calendar_token=token).only('id', 'name', 'mentor_id', 'student_id').first()
+        if user is None:
+            request._calendar_feed = None
+        else:
+            appointments = Appointment.objects.filter(
+                end_datetime__gte=timezone.now() - timedelta(days=settings.CALENDAR_FEED_PAST_DAYS)
+            )
+            if user.is_mentor:
+                appointments = appointments.filter(mentor_id=user.mentor_id)
+            else:
+                appointments = appointments.filter(student_id=user.student_id)
+            request._calendar_feed = user, appointments, get_validators(get_calendar_querysets(appointments), user)
+    return request._calendar_feed
+
+
+def calendar_etag(request, token):
+    feed = get_calendar_feed(request, token)
+    return feed and feed[2][0]
+
+
+def calendar_last_modified(request, token):
+    feed = get_calendar_feed(request, token)
+    return feed and feed[2][1]
+
+
+@require_safe
+@condition(etag_func=calendar_etag, last_modified_func=calendar_last_modified)
+def appointment_calendar(request, token):
+    """iCalendar feed of a user's appointments, streamed for calendar clients polling its secret URL
+
+    A plain Django view: clients cannot send API tokens, and the document
+    is streamed rather than rendered.
+    """
+    feed = get_calendar_feed(request, token)
+    if feed is None:
+        raise Http404
+    user, appointments, _ = feed
+    rows = appointments.order_by('start_datetime', 'id').values_list(*ical.EVENT_FIELDS). \
+        iterator(chunk_size=500)
+    response = StreamingHttpResponse(
+        ical.stream_calendar(rows, f'ConnectU appointments of {user.name}', user.is_mentor),
+        content_type='text/calendar; charset=utf-8'
+    )
+    response['Content-Disposition'] = 'inline; filename="appointments.ics"'
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+class MentorAvailabilityViewSet(viewsets.GenericViewSet,
+                                mixins.CreateModelMixin,
+                                mixins.ListModelMixin,
+                                mixins.DestroyModelMixin):
+    """View set for the availability windows of mentors"""
+
+    authentication_classes = [TokenAuthentication, ]
+
+    permission_classes = [IsAuthenticated, ]
+
+    serializer_class = serializers.MentorAvailabilitySerializer
+
+    queryset = MentorAvailability.objects.all()
+
+    def get_queryset(self):
+        """Enforcing scope"""
+        user = self.request.user
+        queryset = super(MentorAvailabilityViewSet, self).get_queryset()
+        if not user.is_mentor:
+            return queryset.none()
+        return queryset.filter(mentor_id=user.mentor_id).order_by('start_datetime', 'id')
+
+    def create(self, request, *args, **kwargs):
+        if not request.user.is_mentor:
+            return Response('Only mentors have availability', status=status.HTTP_403_FORBIDDEN)
+        return super(MentorAvailabilityViewSet, self).create(request, *args, **kwargs)
+
+    def perform_create(self, serializer):
+        serializer.save(mentor_id=self.request.user.mentor_id)
+
+    @action(detail=False, methods=['get'])
+    def free_slots(self, request, *args, **kwargs):
+        """Open slots of a mentor between start and end, optionally at least duration minutes long"""
+        query = serializers.FreeSlotQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        duration = query.validated_data.get('duration', None)
+
+        slots = MentorAvailability.objects.get_free_slots(
+            query.validated_data['mentor'], query.validated_data['start'], query.validated_data['end'],
+            None if duration is None else timedelta(minutes=duration)
+        )
+        if slots is None:
+            return Response('Mentor not found', status=status.HTTP_404_NOT_FOUND)
+        return Response(serializers.FreeSlotSerializer([
+            {'start_datetime': start, 'end_datetime': end} for start, end in slots
+        ], many=True).data)
+
 
 class AboutMeViewSet(viewsets.GenericViewSet,
                      mixins.UpdateModelMixin):
@@ -385,41 +712,16 @@ class AboutMeViewSet(viewsets.GenericViewSet,
 
     def update(self, request, *args, **kwargs):
         """Updating student model for the required degrees"""
-        about_me_text_1 = self.request.data.get('answer_1').split(' ')
-        about_me_text_2 = self.request.data.get('answer_2').split(' ')
-        about_me_text_3 = self.request.data.get('answer_3').split(' ')
-        result = {}
-        for word in about_me_text_1:
-            keywords = Keyword.objects.filter(name__icontains=word). \
-                           values('degree').annotate(total=Count('id')).order_by('-total')[:3]
-            for k in keywords:
-                if str(k['degree']) not in result:
-                    result[str(k['degree'])] = k['total']
-                else:
-                    result[str(k['degree'])] += k['total']
-        for word in about_me_text_2:
-            keywords = Keyword.objects.filter(name__icontains=word). \
-                           values('degree').annotate(total=Count('id')).order_by('-total')[:3]
-            for k in keywords:
-                if str(k['degree']) not in result:
-                    result[str(k['degree'])] = k['total']
-                else:
-                    result[str(k['degree'])] += k['total']
-        for word in about_me_text_3:
-            keywords = Keyword.objects.filter(name__icontains=word). \
-                           values('degree').annotate(total=Count('id')).order_by('-total')[:3]
-            for k in keywords:
-                if str(k['degree']) not in result:
-                    result[str(k['degree'])] = k['total']
-                else:
-                    result[str(k['degree'])] += k['total']
-        sorted(result.values())
-        degrees_id_list = list(result.keys())
-        deg = Degree.objects.filter(id__in=degrees_id_list).all()[:3]
-        if len(degrees_id_list) < 3:
-            deg = Degree.objects.all().order_by('?')[:3]
+        answers = [self.request.data.get(f'answer_{index}', None) for index in range(1, 4)]
+        if not all(isinstance(answer, str) for answer in answers):
+            return Response('Provide answer_1, answer_2 and answer_3', status=status.HTTP_400_BAD_REQUEST)
+
+        deg = recommend_degrees(' '.join(answers))
+        if len(deg) < 3:
+            return Response('Not enough degrees to recommend', status=status.HTTP_400_BAD_REQUEST)
         serializer = self.get_serializer(deg, many=True)
         student = self.get_queryset().first()
+        student.about_me_answer_1, student.about_me_answer_2, student.about_me_answer_3 = answers
         student.degree1 = deg[0]
         student.degree2 = deg[1]
         student.degree3 = deg[2]
@@ -427,6 +729,38 @@ class AboutMeViewSet(viewsets.GenericViewSet,
         return Response(serializer.data)
 
 
+class MentorViewSet(viewsets.GenericViewSet):
+    """View set for public figures of mentors"""
+
+    authentication_classes = [TokenAuthentication, ]
+
+    permission_classes = [IsAuthenticated, ]
+
+    serializer_class = serializers.MentorStatsSerializer
+
+    queryset = Mentor.objects.all()
+
+    @action(detail=True, methods=['get'])
+    def stats(self, request, pk=None, *args, **kwargs):
+        """Sessions, ratings and reports of a mentor from their stats row, with revenue for the mentor"""
+        try:
+            mentor_id = uuid.UUID(pk)
+        except ValueError:
+            return Response('Mentor not found', status=status.HTTP_404_NOT_FOUND)
+
+        stats = MentorStats.objects.filter(mentor_id=mentor_id).first()
+        if stats is None:
+            # Mentors created in bulk have no row until the stats are rebuilt
+            if not Mentor.objects.filter(pk=mentor_id).exists():
+                return Response('Mentor not found', status=status.HTTP_404_NOT_FOUND)
+            stats = MentorStats(mentor_id=mentor_id)
+        data = self.get_serializer(stats).data
+        # Revenue is only for the mentor and staff
+        if request.user.mentor_id != mentor_id and not request.user.is_staff:
+            del data['revenue']
+        return Response(data)
+
+
 class MentorPairStudentViewSet(viewsets.GenericViewSet,
                                mixins.ListModelMixin):
     """Return a mentor pair for student"""
@@ -438,25 +772,69 @@ class MentorPairStudentViewSet(viewsets.GenericViewSet,
 
     queryset = User.objects.filter(mentor__isnull=False)
 
+    def get_requested_degree_ids(self):
+        """Returning the degree ids asked for, None when none were"""
+        values = [
+            self.request.query_params.get(name, self.request.data.get(name, None))
+            for name in ('degree1', 'degree2', 'degree3')
+        ]
+        if all(value is None for value in values):
+            return None
+
+        degree_ids = []
+        for value in values:
+            if value is not None:
+                try:
+                    degree_ids.append(uuid.UUID(str(value)))
+                except ValueError:
+                    raise ValidationError({'degree': f'Invalid degree id {value}'})
+        return degree_ids
+
+    def get_degree_ids(self):
+        """Returning the requested degree ids, the student's own degrees by default"""
+        degree_ids = self.get_requested_degree_ids()
+        if degree_ids is None:
+            return list(Student.objects.filter(pk=self.request.user.student_id).
+                        values_list('degree1_id', 'degree2_id', 'degree3_id').first() or [])
+        return degree_ids
+
+    def get_matched_queryset(self):
+        """Returning the precomputed mentors of the student, unless their degrees changed since"""
+        queryset = super(MentorPairStudentViewSet, self).get_queryset().filter(
+            mentor__mentor_matches__student_id=self.request.user.student_id,
+            mentor__mentor_matches__student__matched_at__gte=F('mentor__mentor_matches__student__updated_at')
+        ).order_by('mentor__mentor_matches__rank')
+        return serializers.UserSerializer.setup_eager_loading(queryset)
+
     def get_queryset(self):
         """Enforcing scope"""
         user = self.request.user
         queryset = super(MentorPairStudentViewSet, self).get_queryset()
         if user.is_mentor:
-            return None
-        else:
-            degree_id_1 = self.request.data.get('degree1', None)
-            degree_id_2 = self.request.data.get('degree2', None)
-            degree_id_3 = self.request.data.get('degree3', None)
-            if degree_id_1 is not None:
-                mentor_1 = queryset.filter(mentor__degree__id=degree_id_1).all().order_by('?')[:1]
-            if degree_id_2 is not None:
-                mentor_2 = queryset.filter(mentor__degree__id=degree_id_2).all().order_by('?')[:1]
-            if degree_id_3 is not None:
-                mentor_3 = queryset.filter(mentor__degree__id=degree_id_3).all().order_by('?')[:1]
-            queryset = mentor_1 | mentor_2 | mentor_3
-
-            return queryset
+            return queryset.none()
+
+        weighted = self.request.query_params.get('weighted', None)
+        weighted = settings.MENTOR_PAIR_WEIGHTED if weighted is None else weighted.lower() in ('1', 'true')
+        user_ids = sample_mentors([degree_id for degree_id in self.get_degree_ids() if degree_id is not None],
+                                  weighted=weighted)
+        if not user_ids:
+            return queryset.none()
+
+        # Keep the mentors in the order of the degrees they were picked for
+        queryset = queryset.filter(pk__in=user_ids).order_by(Case(
+            *[When(pk=user_id, then=Value(index)) for index, user_id in enumerate(user_ids)],
+            output_field=IntegerField()
+        ))
+        return serializers.UserSerializer.setup_eager_loading(queryset)
+
+    def list(self, request, *args, **kwargs):
+        """Serving the matches of the student, random mentors of their degrees until matched"""
+        user = request.user
+        if not user.is_mentor and user.student_id is not None and self.get_requested_degree_ids() is None:
+            mentors = list(self.get_matched_queryset())
+            if mentors:
+                return Response(self.get_serializer(mentors, many=True).data)
+        return super(MentorPairStudentViewSet, self).list(request, *args, **kwargs)
 
 
 class NotificationViewSet(viewsets.GenericViewSet,
@@ -472,13 +850,85 @@ class NotificationViewSet(viewsets.GenericViewSet,
 
     queryset = Notification.objects.all()
 
+    pagination_class = pagination.NotificationPagination
+
     def get_queryset(self):
         user = self.request.user
         queryset = super(NotificationViewSet, self).get_queryset(). \
             filter(user=user). \
-            order_by('-created_at', 'is_seen')
-        return queryset
+            order_by('-created_at', '-id')
+        return serializers.NotificationSerializer.setup_eager_loading(queryset)
+
+    @conditional_list(get_notification_list_querysets, per_user=True)
+    def list(self, request, *args, **kwargs):
+        """Serving the list from flat rows instead of nested serializers"""
+        queryset = self.get_queryset().prefetch_related(None).values(*flat.NOTIFICATION_FIELDS)
+        page = self.paginate_queryset(queryset)
+        return self.get_paginated_response(flat.serialize_notifications(page))
 
     def update(self, request, *args, **kwargs):
         kwargs['partial'] = True
         return super(NotificationViewSet, self).update(request, *args, **kwargs)
+
+
+class LeaderboardViewSet(viewsets.GenericViewSet,
+                         mixins.ListModelMixin):
+    """Ranking of mentors by points, optionally by degree and university"""
+
+    authentication_classes = [TokenAuthentication, ]
+
+    permission_classes = [IsAuthenticated, ]
+
+    serializer_class = serializers.LeaderboardEntrySerializer
+
+    queryset = LeaderboardEntry.objects.all()
+
+    def get_scope(self):
+        """Returning the requested (degree id, university id), None for the ones not asked for"""
+        scope = []
+        for name in ('degree', 'university'):
+            value = self.request.query_params.get(name, None)
+            if value is not None:
+                try:
+                    value = uuid.UUID(str(value))
+                except ValueError:
+                    raise ValidationError({name: f'Invalid {name} id {value}'})
+            scope.append(value)
+        return scope
+
+    def get_queryset(self):
+        """Reading the precomputed board of the requested scope"""
+        degree_id, university_id = self.get_scope()
+        return super(LeaderboardViewSet, self).get_queryset(). \
+            filter(degree_id=degree_id, university_id=university_id). \
+            select_related('mentor__user'). \
+            order_by('-points', 'mentor_id')
+
+    def list(self, request, *args, **kwargs):
+        entries = list(self.get_queryset())
+        for rank, entry in enumerate(entries, start=1):
+            entry.rank = rank
+        serializer = self.get_serializer(entries, many=True)
+        return Response(serializer.data)
+
+
+class SearchViewSet(viewsets.GenericViewSet):
+    """Ranked full-text search over questions, answers and comments"""
+
+    authentication_classes = [TokenAuthentication, ]
+
+    permission_classes = [IsAuthenticated, ]
+
+    serializer_class = serializers.SearchDocumentSerializer
+
+    pagination_class = pagination.SearchPagination
+
+    queryset = SearchDocument.objects.all()
+
+    def list(self, request, *args, **kwargs):
+        text = self.request.GET.get('q', '').strip()
+        if not text:
+            return Response('Provide a search query', status=status.HTTP_400_BAD_REQUEST)
+        page = self.paginator.paginate_search(text, request)
+        serializer = self.get_serializer(page, many=True)
+        return self.paginator.get_paginated_response(serializer.data)